@@ -0,0 +1,56 @@
+"""
+Times encoding and decoding a QUERY with a 24 byte payload, relaying one as a node does and creating a new message.
+
+Run from the repository root: `python benchmarks/codec.py [TREE]`
+
+`TREE` is the root of another checkout to measure instead, e.g. one made with `git worktree add` of a commit from
+before `Message.from_frame`, which relays by decoding the payload and encoding the message again.
+"""
+import os
+import sys
+import timeit
+
+TREE = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TREE)
+os.chdir(TREE)
+
+from p2p_messenger.protocol import Header, Message, types
+
+COUNT = 200000
+# payloads were strings before messages carried bytes
+BYTES = hasattr(Message, 'text')
+PAYLOAD = b'Ck1Bb0NBd0NtWVFJREFRQUIK' if BYTES else 'Ck1Bb0NBd0NtWVFJREFRQUIK'
+MESSAGE = Message(types.MsgType.QUERY, ('10.1.2.3', 1337), payload=PAYLOAD)
+FRAME = bytes(MESSAGE.bytes())
+HEAD = FRAME[:16]
+
+
+def relay():
+	msg = Message.from_frame(Header.from_bytes(HEAD), memoryview(FRAME))
+	msg.forward()
+	msg.bytes()
+
+
+def relay_decoded():
+	header = Header.from_bytes(HEAD)
+	msg = Message(header.msg_type, ('127.0.0.1', 1))
+	msg.header = header
+	msg.payload = str(FRAME[16:], 'utf-8')
+	msg.header.ttl -= 1
+	msg.header.hop_count += 1
+	msg.bytes()
+
+
+def main():
+	for name, operation in [
+		('encode Message.bytes()', MESSAGE.bytes),
+		('decode Header.from_bytes()', lambda: Header.from_bytes(HEAD)),
+		('relay decode+forward+encode', relay if hasattr(Message, 'from_frame') else relay_decoded),
+		('new message (id generation)', lambda: Message(types.MsgType.QUERY, ('10.1.2.3', 1337), payload=PAYLOAD))
+	]:
+		seconds = min(timeit.repeat(operation, number=COUNT, repeat=3))
+		print(f'{name:32s} {seconds / COUNT * 1e6:6.2f} us  ({COUNT / seconds:,.0f}/s)')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,80 @@
+"""
+Measures posts and a file transfer between two local nodes with compression turned off and with zlib, sending text or
+random data. Prints posts per second, the transfer rate and the share of the payload bytes zlib sent on the wire.
+
+Loopback costs nothing, so the numbers show the CPU cost of compression, not the bandwidth it saves.
+
+Run from the repository root: `python benchmarks/compression.py [text|random]`
+"""
+import filecmp
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from p2p_messenger import Config
+from p2p_messenger.node import Node
+from p2p_messenger.protocol import compression
+
+BASE_PORT = 20000 + os.getpid() % 120 * 100
+POSTS = 3000
+FILE_MIB = 20
+
+WORDS = open(os.path.join(ROOT, 'README.md')).read().split()
+
+
+def text(length: int, rnd: random.Random) -> str:
+	return ' '.join(rnd.choice(WORDS) for _ in range(length // 5))[:length]
+
+
+def run(port: int, posts: list[str], path: str, directory: str) -> str:
+	Config.transfer_dir = directory
+	receiver = Node(port, [('127.0.0.1', port)])
+	sender = Node(port + 1, [('127.0.0.1', port)])
+	for node in (receiver, sender):
+		node.daemon = True
+		node.start()
+		time.sleep(0.5)
+	sender.recipient_id_map.add(receiver.peer_id, ('127.0.0.1', port))
+	sender.post_msg('warm up', receiver.peer_id).result(timeout=10)
+	started = time.perf_counter()
+	futures = [sender.post_msg(post, receiver.peer_id) for post in posts]
+	acked = sum(future.result(timeout=120) for future in futures)
+	post_seconds = time.perf_counter() - started
+	started = time.perf_counter()
+	sender.send_file(path, receiver.peer_id, name='received.bin').result(timeout=300)
+	file_seconds = time.perf_counter() - started
+	identical = filecmp.cmp(path, os.path.join(directory, 'received.bin'), shallow=False)
+	return (f'posts {acked}/{len(posts)} {len(posts) / post_seconds:.0f}/s, '
+		f'file {FILE_MIB / file_seconds:.0f} MiB/s, identical {identical}')
+
+
+def main():
+	logging.basicConfig(level=logging.CRITICAL)
+	Config.state_dir = None
+	Config.post_backlog = 100000
+	kind = sys.argv[1] if len(sys.argv) > 1 else 'text'
+	rnd = random.Random(1)
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, 'sent.bin')
+		with open(path, 'wb') as f:
+			for _ in range(FILE_MIB):
+				f.write(text(1 << 20, rnd).encode('utf-8') if kind == 'text' else os.urandom(1 << 20))
+		posts = [text(1000, rnd) if kind == 'text' else os.urandom(500).hex() for _ in range(POSTS)]
+		for i, codecs in enumerate([[], ['zlib']]):
+			Config.compression_codecs = codecs
+			result = run(BASE_PORT + i * 10, posts, path, os.path.join(directory, str(i)))
+			print(f'{kind}, codecs {codecs}: {result}', flush=True)
+		stats = compression.CODECS[1].stats()
+		print(f'zlib: {stats["ratio"]} of the bytes on the wire, {stats["compressed"]} payloads compressed, '
+			f'{stats["rejected"]} rejected, {stats["compress_seconds"]:.2f}s compressing')
+	os._exit(0)  # the nodes keep running threads
+
+
+if __name__ == '__main__':
+	main()
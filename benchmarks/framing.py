@@ -0,0 +1,97 @@
+"""
+Compares reading frames from a socket with one `recv` for the header and one for the payload, as nodes did before the
+frame decoder, to reading them through `FrameDecoder`. `MSG_WAITALL` keeps the former from losing track of the frames
+on short reads, which nodes did not guard against. A thread writes 200k QUERY frames into a socket pair.
+
+The first pair of results includes decoding the header, the second only splits the stream into frames.
+
+Run from the repository root: `python benchmarks/framing.py`
+"""
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from p2p_messenger.protocol import FrameDecoder, Header, Message, types
+from p2p_messenger.protocol.framing import HEADER_SIZE
+
+FRAMES = 200000
+BATCH = b''.join(
+	Message(types.MsgType.QUERY, ('127.0.0.1', 1), payload=b'Ck1Bb0NBd0NtWVFJREFRQUIK').bytes() for _ in range(1000)
+)
+LENGTH = struct.Struct('!H')
+
+
+def send(s: socket.socket):
+	for _ in range(FRAMES // 1000):
+		s.sendall(BATCH)
+	s.close()
+
+
+def recv_per_frame(s: socket.socket) -> int:
+	count = 0
+	while True:
+		head = s.recv(HEADER_SIZE, socket.MSG_WAITALL)
+		if not head:
+			return count
+		header = Header.from_bytes(head)
+		s.recv(header.length, socket.MSG_WAITALL)
+		count += 1
+
+
+def decoder(s: socket.socket) -> int:
+	frames = FrameDecoder()
+	count = 0
+	while frames.recv_into(s):
+		for _ in frames.frames():
+			count += 1
+	return count
+
+
+def recv_per_frame_raw(s: socket.socket) -> int:
+	count = 0
+	while True:
+		head = s.recv(HEADER_SIZE, socket.MSG_WAITALL)
+		if not head:
+			return count
+		s.recv(LENGTH.unpack_from(head, 6)[0], socket.MSG_WAITALL)
+		count += 1
+
+
+def decoder_raw(s: socket.socket) -> int:
+	frames = FrameDecoder()
+	count = 0
+	while frames.recv_into(s):
+		while frames.end - frames.start >= HEADER_SIZE:
+			frame_end = frames.start + HEADER_SIZE + LENGTH.unpack_from(frames.buffer, frames.start + 6)[0]
+			if frame_end > frames.end:
+				break
+			frames.start = frame_end
+			count += 1
+	return count
+
+
+def main():
+	for name, receive in [
+		('recv(16)+recv(len)', recv_per_frame),
+		('FrameDecoder', decoder),
+		('framing only, recv(16)+recv(len)', recv_per_frame_raw),
+		('framing only, FrameDecoder', decoder_raw)
+	]:
+		a, b = socket.socketpair()
+		sender = threading.Thread(target=send, args=[a])
+		started = time.perf_counter()
+		sender.start()
+		count = receive(b)
+		seconds = time.perf_counter() - started
+		sender.join()
+		b.close()
+		print(f'{name:34s} {count} frames  {count / seconds:,.0f} frames/s')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,49 @@
+"""
+Compares the message ID generators: time per ID, and duplicates among the IDs of one node generated from 8 threads
+and among the IDs of 200 nodes.
+
+Run from the repository root: `python benchmarks/ids.py`
+"""
+import os
+import sys
+import threading
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from p2p_messenger.protocol.ids import CounterIdGenerator, HashIdGenerator
+
+
+def duplicates(ids: list) -> int:
+	return len(ids) - len(set(ids))
+
+
+def generate_threaded(generator, threads: int, count: int) -> list:
+	ids = []
+
+	def work():
+		ids.extend(generator.next_id() for _ in range(count))
+
+	workers = [threading.Thread(target=work) for _ in range(threads)]
+	for worker in workers:
+		worker.start()
+	for worker in workers:
+		worker.join()
+	return ids
+
+
+def main():
+	for name, make in [
+		('HashIdGenerator', lambda i: HashIdGenerator(f'10.0.{i // 256}.{i % 256}', 1337)),
+		('CounterIdGenerator', lambda i: CounterIdGenerator())
+	]:
+		generator = make(0)
+		seconds = min(timeit.repeat(generator.next_id, number=200000, repeat=3)) / 200000
+		single = generate_threaded(make(0), 8, 125000)
+		network = [generator.next_id() for generator in map(make, range(200)) for _ in range(5000)]
+		print(f'{name:20s} {seconds * 1e6:.2f} us/id  '
+			f'duplicates: 1 node, 8 threads, 1M ids: {duplicates(single)}  200 nodes x 5k ids: {duplicates(network)}')
+
+
+if __name__ == '__main__':
+	main()
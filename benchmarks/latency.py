@@ -0,0 +1,107 @@
+"""
+Measures how choosing neighbours by round-trip time shortens lookups. Local nodes are spread over emulated data
+centres: every received message is delayed by 1 ms if it comes from a node in the same data centre and by 30 ms
+otherwise. After the overlay settled, prints the share of links within a data centre and the time lookups of random
+recipients take.
+
+Run from the repository root: `python benchmarks/latency.py MODE [NODES] [SETTLE] [LOOKUPS]`
+
+`MODE` is `random` for random neighbours or `latency` for neighbours chosen by round-trip time. Both run with peer
+sampling and heartbeats enabled. The defaults are 40 nodes in 4 data centres, 30 seconds to settle and 30 lookups.
+"""
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from p2p_messenger import Config
+from p2p_messenger.node import Node, Peer
+
+BASE_PORT = 20000 + os.getpid() % 120 * 100
+DATA_CENTRES = 4
+NEAR, FAR = 0.001, 0.03
+
+local_ports: dict[tuple[str, int], int] = {}
+"""Local addresses of outbound connections mapped to the listening port of the node that opened them."""
+
+
+def data_centre(port: int) -> int:
+	return (port - BASE_PORT) % DATA_CENTRES
+
+
+def emulate_latency():
+	peer_init = Peer.__init__
+	dispatch = Node.dispatch
+
+	def init(self, addr, peer_id=None, s=None):
+		peer_init(self, addr, peer_id, s)
+		if s is None:
+			# the connection was opened by the node of the closest calling method
+			frame = sys._getframe(1)
+			while frame is not None and not isinstance(frame.f_locals.get('self'), Node):
+				frame = frame.f_back
+			if frame is not None:
+				local_ports[self.sock_name] = frame.f_locals['self'].port
+
+	def delayed_dispatch(self, msg, peer):
+		remote = local_ports.get(peer.peer_name, peer.addr[1])
+		time.sleep(NEAR if data_centre(remote) == data_centre(self.port) else FAR)
+		return dispatch(self, msg, peer)
+
+	Peer.__init__ = init
+	Node.dispatch = delayed_dispatch
+
+
+def local_links(nodes: list[Node]) -> float:
+	links = [(node.port, peer.addr[1]) for node in nodes for peer in node.outbound_neighbours]
+	return sum(data_centre(a) == data_centre(b) for a, b in links) / len(links)
+
+
+def main():
+	logging.basicConfig(level=logging.CRITICAL)
+	mode = sys.argv[1] if len(sys.argv) > 1 else 'latency'
+	count = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+	settle = float(sys.argv[3]) if len(sys.argv) > 3 else 30
+	lookups = int(sys.argv[4]) if len(sys.argv) > 4 else 30
+	Config.state_dir = None
+	Config.neighbours = 3
+	Config.sampling = True
+	Config.sampling_interval = 2
+	Config.heartbeat = True
+	Config.heartbeat_interval = 0.5
+	Config.latency = mode == 'latency'
+	Config.latency_rewire_interval = 2
+	random.seed(1)
+	emulate_latency()
+
+	nodes = []
+	for i in range(count):
+		node = Node(BASE_PORT + i, [('127.0.0.1', BASE_PORT + random.randrange(i) if i else BASE_PORT)])
+		node.daemon = True
+		node.start()
+		nodes.append(node)
+		time.sleep(0.3)
+	print(f'after joining: {local_links(nodes):.2f} of the links within a data centre')
+	time.sleep(settle)
+	print(f'after {settle:.0f}s: {local_links(nodes):.2f} of the links within a data centre')
+
+	times = []
+	for _ in range(lookups):
+		sender, recipient = random.sample(nodes, 2)
+		sender.recipient_id_map.discard(recipient.peer_id)
+		started = time.perf_counter()
+		if sender.resolve(recipient.peer_id) is not None:
+			times.append(time.perf_counter() - started)
+		time.sleep(0.2)
+	times.sort()
+	print(f'{mode}: resolved {len(times)}/{lookups}, median {statistics.median(times) * 1000:.0f} ms, '
+		f'mean {statistics.fmean(times) * 1000:.0f} ms, p90 {times[int(len(times) * 0.9)] * 1000:.0f} ms')
+	os._exit(0)  # the nodes keep running threads
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,70 @@
+"""
+Measures the throughput of posts between two local nodes in plain text and encrypted, waiting for every
+acknowledgement and keeping the best of two runs of each, and compares sealing a post with a session key to
+encrypting it with RSA.
+
+Run from the repository root: `python benchmarks/posts.py [ENGINES] [POSTS]`
+
+`ENGINES` names the engines of the receiving and the sending node, `t` for threads and `a` for asyncio, e.g. `ta` for
+a threaded receiver and an asyncio sender. It defaults to `tt`, `POSTS` to 20000.
+"""
+import logging
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rsa
+
+from p2p_messenger import Config
+from p2p_messenger.node import AsyncNode, Node
+from p2p_messenger.protocol.crypto import SessionKey
+
+BASE_PORT = 20000 + os.getpid() % 120 * 100
+
+
+def post_throughput(engines: str, posts: int, port: int) -> float:
+	nodes = []
+	for i, engine in enumerate(engines):
+		node = (AsyncNode if engine == 'a' else Node)(port + i, [('127.0.0.1', port)])
+		node.daemon = True
+		node.start()
+		nodes.append(node)
+		time.sleep(0.5)
+	receiver, sender = nodes
+	sender.recipient_id_map.add(receiver.peer_id, ('127.0.0.1', port))
+	started = time.perf_counter()
+	futures = [sender.post_msg(f'message {i}', receiver.peer_id) for i in range(posts)]
+	acked = sum(future.result(timeout=120) for future in futures)
+	seconds = time.perf_counter() - started
+	if acked != posts:
+		print(f'only {acked} of {posts} posts acknowledged')
+	return posts / seconds
+
+
+def main():
+	logging.basicConfig(level=logging.CRITICAL)
+	Config.state_dir = None
+	Config.post_backlog = 100000
+	engines = sys.argv[1] if len(sys.argv) > 1 else 'tt'
+	posts = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+	rates = {False: 0, True: 0}
+	# the modes take turns, so that neither gains from running later in the process
+	for i, encryption in enumerate([False, True] * 2):
+		Config.encryption = encryption
+		rates[encryption] = max(rates[encryption], post_throughput(engines, posts, BASE_PORT + i * 10))
+	print(f'{engines[1]} -> {engines[0]}: plaintext {rates[False]:.0f} msg/s, encrypted {rates[True]:.0f} msg/s')
+
+	key = SessionKey()
+	seal = min(timeit.repeat(lambda: key.open(key.seal(b'message 1')), number=10000, repeat=3)) / 10000
+	pub_key, private_key = rsa.newkeys(Config.key_size)
+	rsa_round_trip = lambda: rsa.decrypt(rsa.encrypt(b'message 1', pub_key), private_key)
+	wrap = min(timeit.repeat(rsa_round_trip, number=50, repeat=3)) / 50
+	print(f'seal+open {seal * 1e6:.1f} us, RSA-{Config.key_size} encrypt+decrypt {wrap * 1e3:.2f} ms per message')
+	os._exit(0)  # the nodes keep running threads
+
+
+if __name__ == '__main__':
+	main()
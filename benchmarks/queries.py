@@ -0,0 +1,111 @@
+"""
+Measures recipient lookups in a mesh of local nodes: the number of QUERY messages sent by all nodes per lookup and the
+time until the hit arrives. Every node links to 2 nodes found while bootstrapping and to `DEGREE` further random
+nodes.
+
+Run from the repository root: `python benchmarks/queries.py MODE [NODES] [DEGREE] [LOOKUPS] [ENGINES]`
+
+`MODE` is `flood` for a flood with the default TTL, `ring` for an expanding ring search or `bloom` for queries routed by
+Bloom filters, which also reports how many random peer ids the received filters hold by mistake. `ENGINES` is a string of `t`
+for threads and `a` for asyncio, assigned to the nodes in turn. The defaults are 50 nodes, degree 3, 20 lookups and
+asyncio nodes.
+"""
+import collections
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from p2p_messenger import Config
+from p2p_messenger.node import AsyncNode, Node, Peer
+from p2p_messenger.node.async_node import AsyncPeer
+from p2p_messenger.protocol import bloom
+
+BASE_PORT = 20000 + os.getpid() % 120 * 100
+
+sent = collections.Counter()
+
+
+def count_sent(send):
+	def counting_send(self, msg):
+		sent[msg.header.msg_type.name] += 1
+		return send(self, msg)
+	return counting_send
+
+
+def start_mesh(count: int, degree: int, engines: str) -> list[Node]:
+	nodes = []
+	for i in range(count):
+		bootstrap = BASE_PORT + random.randrange(i) if i else BASE_PORT
+		node = (AsyncNode if engines[i % len(engines)] == 'a' else Node)(BASE_PORT + i, [('127.0.0.1', bootstrap)])
+		node.daemon = True
+		node.start()
+		nodes.append(node)
+		time.sleep(0.3)
+	time.sleep(0.5)
+	# nodes only link to nodes that joined before them while bootstrapping, which leaves the later ones unreachable
+	for node in nodes:
+		linked = {peer.addr[1] for peer in node.outbound_neighbours}
+		others = [other for other in nodes if other is not node and other.port not in linked]
+		for other in random.sample(others, degree):
+			node.add_neighbour(('127.0.0.1', other.port))
+	time.sleep(1)
+	return nodes
+
+
+def false_positive_rate(nodes: list[Node], samples: int = 100) -> float:
+	"""Returns the share of random peer ids that any level of a received filter holds."""
+	tests = hits = 0
+	for node in nodes:
+		for levels in list(node.filters.received.values()):
+			for _ in range(samples):
+				bits = bloom.mask(os.urandom(20), Config.bloom_size, Config.bloom_hashes)
+				tests += 1
+				hits += any(level & bits == bits for level in levels)
+	return hits / tests if tests else 0
+
+
+def main():
+	logging.basicConfig(level=logging.CRITICAL)
+	mode = sys.argv[1] if len(sys.argv) > 1 else 'flood'
+	count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+	degree = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+	lookups = int(sys.argv[4]) if len(sys.argv) > 4 else 20
+	engines = sys.argv[5] if len(sys.argv) > 5 else 'a'
+	Config.state_dir = None
+	Config.neighbours = 2
+	Config.query_expanding_ring = mode == 'ring'
+	Config.bloom = mode == 'bloom'
+	random.seed(1)
+	Peer.send = count_sent(Peer.send)
+	AsyncPeer.send = count_sent(AsyncPeer.send)
+
+	nodes = start_mesh(count, degree, engines)
+	if Config.bloom:
+		# changes spread one hop per refresh
+		time.sleep(Config.bloom_refresh_interval * (Config.bloom_depth + 1))
+		print(f'{sum(len(node.filters.received) for node in nodes)} filters received, '
+			f'false positive rate {false_positive_rate(nodes):.5f}')
+	sent.clear()
+	times = []
+	queries = []
+	for _ in range(lookups):
+		sender, recipient = random.sample(nodes, 2)
+		before = sent['QUERY']
+		started = time.perf_counter()
+		if sender.resolve(recipient.peer_id) is not None:
+			times.append(time.perf_counter() - started)
+		time.sleep(0.5)  # let the flood die down before counting the next one
+		queries.append(sent['QUERY'] - before)
+	times.sort()
+	median = f'{times[len(times) // 2] * 1000:.0f} ms' if times else '-'
+	print(f'{mode}, {count} nodes, degree {degree}: resolved {len(times)}/{lookups}, '
+		f'{sum(queries) / lookups:.0f} QUERY sends per lookup, median time to hit {median}')
+	os._exit(0)  # the nodes keep running threads
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,90 @@
+"""
+Measures the throughput of encrypted posts to a node serving post sessions in 1, 2 and 4 processes.
+
+A receiving node is started in a child process with `--workers` processes in total, then `SENDERS` nodes in this
+process post `POSTS` messages each to it at once. Prints posts per second and how many posts every process of the
+receiver opened. Linux only, like `--workers`.
+
+Run from the repository root: `python benchmarks/workers.py [SENDERS] [POSTS]`
+"""
+import collections
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from p2p_messenger import Config
+from p2p_messenger.node import Node
+from p2p_messenger.node.workers import start_workers
+
+BASE_PORT = 20000 + os.getpid() % 120 * 100
+
+
+def receive(port: int, workers: int, log: str, ready):
+	original = Node.handle_sealed_post
+
+	def handle_sealed_post(self, msg, ingress):
+		with open(log, 'a') as f:
+			f.write(f'{os.getpid()}\n')
+		return original(self, msg, ingress)
+
+	Node.handle_sealed_post = handle_sealed_post
+	node = Node(port, [('127.0.0.1', port)])
+	start_workers(node, workers - 1)
+	node.start()
+	ready.send(node.peer_id)
+	node.join()
+
+
+def start_receiver(workers: int, port: int) -> tuple[multiprocessing.Process, str, str]:
+	log = tempfile.mktemp()
+	open(log, 'w').close()
+	ready, child_ready = multiprocessing.Pipe()
+	receiver = multiprocessing.get_context('fork').Process(target=receive, args=[port, workers, log, child_ready])
+	receiver.start()
+	return receiver, ready.recv(), log
+
+
+def run(port: int, peer_id: str, log: str, senders: int, posts: int) -> str:
+	nodes = []
+	for i in range(1, senders + 1):
+		node = Node(port + i, [('127.0.0.1', port)])
+		node.daemon = True
+		node.start()
+		nodes.append(node)
+		time.sleep(0.2)
+	for node in nodes:
+		# the posts are measured, not the query for the receiver
+		node.recipient_id_map.add(peer_id, ('127.0.0.1', port))
+	started = time.perf_counter()
+	futures = [node.post_msg(f'message {i}', peer_id) for i in range(posts) for node in nodes]
+	acked = sum(future.result(timeout=120) for future in futures)
+	seconds = time.perf_counter() - started
+	served = collections.Counter(open(log).read().split())
+	for node in nodes:
+		node.shutdown()
+	return (f'{len(futures)} posts in {seconds:.2f}s, {len(futures) / seconds:.0f}/s, {acked} acknowledged, '
+		f'opened per process {sorted(served.values(), reverse=True)}')
+
+
+def main():
+	logging.basicConfig(level=logging.CRITICAL)
+	Config.state_dir = None
+	senders = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+	posts = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+	print(f'{os.cpu_count()} cores, encryption {"on" if Config.encryption else "off"}')
+	# the receivers are forked before this process runs any thread
+	receivers = {workers: start_receiver(workers, BASE_PORT + i * 20) for i, workers in enumerate([1, 2, 4])}
+	for i, (workers, (receiver, peer_id, log)) in enumerate(receivers.items()):
+		print(f'{workers} processes: {run(BASE_PORT + i * 20, peer_id, log, senders, posts)}', flush=True)
+		receiver.kill()
+		os.remove(log)
+	os._exit(0)  # the nodes of the senders keep running threads
+
+
+if __name__ == '__main__':
+	main()
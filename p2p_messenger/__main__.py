@@ -4,31 +4,47 @@ import logging
 from datetime import datetime
 import sys
 from . import Config
-from .node import Node
+from .node import Node, AsyncNode
+from .node.workers import start_workers
 
 
 class CLI(object):
 	"""A simple P2P messenger."""
 
 	@staticmethod
-	def node(port=None, b=None):
-		"""Runs the node."""
+	def node(port=None, b=None, engine='thread', workers=1):
+		"""
+		Runs the node. Use `--engine=asyncio` to run all connections on a single event loop.
+		Use `--workers=N` to serve post sessions in N processes sharing the port.
+		"""
 
 		if port is None:
 			port = Config.default_port
 
 		if b:
-			if isinstance(b, int):
-				address = (Config.default_ip_addr, b)
-			else:
-				b_ip, b_port = tuple(b.split(':', maxsplit=1))
-				b_port = int(b_port)
-				address = (b_ip, b_port)
+			# several bootstrapping peers may be given separated by commas
+			if isinstance(b, str):
+				b = b.split(',')
+			elif not isinstance(b, (list, tuple)):
+				b = [b]
+			addresses = []
+			for b_addr in b:
+				if isinstance(b_addr, int):
+					addresses.append((Config.default_ip_addr, b_addr))
+				else:
+					b_ip, b_port = tuple(b_addr.split(':', maxsplit=1))
+					addresses.append((b_ip, int(b_port)))
 		else:
-			address = Config.bootstrap_peer
-		logging.debug('Address: %s', address)
+			addresses = Config.bootstrap_peers
+		logging.debug('Bootstrap addresses: %s', addresses)
 
-		node = Node(port, address)
+		if engine == 'asyncio':
+			node = AsyncNode(port, addresses)
+		elif engine == 'thread':
+			node = Node(port, addresses)
+		else:
+			raise ValueError(f'Unknown engine: {engine}')
+		start_workers(node, workers - 1)
 		node.start()
 
 		try:
@@ -42,6 +58,9 @@ class CLI(object):
 				if cmd_parts[0] == 'neighbours':
 					print('Inbound neighbours: ', node.inbound_neighbours)
 					print('Outbound neighbours: ', node.outbound_neighbours)
+				elif cmd_parts[0] == 'stats':
+					for name, values in node.stats().items():
+						print(f'{name}: {values}')
 				elif cmd_parts[0] == 'post':
 					if len(cmd_parts) < 3:
 						print('Invalid command. Usage: post <peer-id> <message>')
@@ -49,8 +68,18 @@ class CLI(object):
 					peer_id = cmd_parts[1]
 					payload = ' '.join(cmd_parts[2:])
 
-					# TODO: Encrypt payload with "peer_id" (derive public key of it).
-					node.post_msg(chat_msg=payload, peer_id=peer_id)
+					delivery = node.post_msg(chat_msg=payload, peer_id=peer_id)
+					delivery.add_done_callback(
+						lambda f: logging.info('Message delivered.' if f.result() else 'Message was not delivered.')
+					)
+				elif cmd_parts[0] == 'send':
+					if len(cmd_parts) < 3:
+						print('Invalid command. Usage: send <peer-id> <file>')
+						continue
+					delivery = node.send_file(' '.join(cmd_parts[2:]), peer_id=cmd_parts[1])
+					delivery.add_done_callback(
+						lambda f: logging.info('File delivered.' if f.result() else 'File was not delivered.')
+					)
 				else:
 					print('Unknown command.')
 		except Exception as e:
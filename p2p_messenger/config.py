@@ -18,6 +18,9 @@ class Config:
 	max_connections = 10
 	"""Maximum number of concurrent connections for a single node."""
 
+	state_dir = None
+	"""Directory for the persistent state of nodes, one subdirectory per port. Nothing is persisted if empty."""
+
 	prot_version = 1
 	"""Version of the protocol this client uses to send messages."""
 
@@ -27,19 +30,311 @@ class Config:
 	prot_max_ttl = 7
 	"""Maximum allowed TTL of messages."""
 
-	bootstrap_peer = (default_ip_addr, default_port)
-	"""Tuple of ip and port of a running node used for bootstrapping into the network."""
+	dedup_capacity = 4096
+	"""Maximum number of message IDs remembered per message type for duplicate suppression and reverse routing."""
+
+	dedup_hop_timeout = 1.0
+	"""Upper bound in seconds for a message to travel a single hop."""
+
+	send_queue_bytes = 262144
+	"""Maximum number of bytes queued for sending per neighbour connection."""
+
+	send_flush_timeout = 1
+	"""Seconds to wait for queued messages to be written when a connection is closed."""
+
+	query_timeout = 3
+	"""Seconds to wait for a query hit before a recipient is considered unreachable."""
+
+	query_expanding_ring = False
+	"""Whether queries are sent with growing TTL, starting at 1, instead of flooding with the default TTL right away."""
+
+	query_ring_timeout = 0.25
+	"""Seconds per hop of TTL to wait for a query hit before the TTL of the query is doubled."""
+
+	bloom = False
+	"""Whether queries are only forwarded to the neighbours whose routing filter holds the recipient."""
+
+	bloom_size = 8192
+	"""Size of every level of a routing filter in bits, a multiple of 8. All nodes have to use the same size."""
+
+	bloom_hashes = 4
+	"""Number of bits set per peer id in a routing filter. All nodes have to use the same number."""
+
+	bloom_depth = 5
+	"""Number of levels of a routing filter, i.e. the number of hops it summarises."""
+
+	bloom_refresh_interval = 2
+	"""Seconds between updates of the routing filters sent to subscribed neighbours."""
+
+	dht = False
+	"""Whether recipients are looked up in the DHT before falling back to flooding a query."""
+
+	dht_k = 8
+	"""Size of the k-buckets of the DHT routing table and number of nodes an address record is stored at."""
+
+	dht_alpha = 3
+	"""Number of DHT requests a lookup has in flight in parallel."""
+
+	dht_rpc_timeout = 1
+	"""Seconds to wait for the answer to a DHT request before the contact is considered gone."""
+
+	dht_republish_interval = 600
+	"""Seconds between publications of the own address record to the DHT."""
+
+	dht_record_ttl = 1800
+	"""Seconds an address record stored for another node is kept without being published again."""
+
+	dht_record_capacity = 4096
+	"""Maximum number of address records stored for other nodes."""
+
+	addr_cache_capacity = 1024
+	"""Maximum number of recipient addresses remembered."""
+
+	addr_cache_positive_ttl = 300
+	"""Seconds a resolved recipient address is reused without querying again."""
+
+	addr_cache_negative_ttl = 10
+	"""Seconds an unresolved recipient is not queried again."""
+
+	key_size = 1024
+	"""Size in bits of the RSA key pair a node is identified by."""
+
+	replace_small_key = False
+	"""Whether a stored or given key smaller than `key_size` is replaced by a new one, which changes the peer ID."""
+
+	encryption = True
+	"""Whether posts are encrypted end to end."""
+
+	rekey_interval = 3600
+	"""Seconds after which a new session key is set up for a recipient."""
+
+	rekey_messages = 1000000
+	"""Number of messages after which a new session key is set up for a recipient."""
+
+	key_cache_capacity = 1024
+	"""Maximum number of session keys received from senders remembered."""
+
+	compression_codecs = ['zlib']
+	"""Names of the compression codecs a node accepts and compresses with, in order of preference. Empty disables it."""
+
+	compression_level = 1
+	"""Compression level passed to codecs supporting one."""
+
+	compression_min_size = 256
+	"""Payloads smaller than this number of bytes are never compressed."""
+
+	compression_max_ratio = 0.9
+	"""Compressed payloads larger than this fraction of the original size are sent uncompressed instead."""
+
+	post_window = 32
+	"""Maximum number of posts per recipient sent without having been acknowledged."""
+
+	post_backlog = 1024
+	"""Maximum number of posts per recipient waiting for room in the window."""
+
+	post_ack_timeout = 5
+	"""Seconds to wait for the acknowledgement of a post before the session to the recipient is considered broken."""
+
+	post_idle_timeout = 30
+	"""Seconds without posts after which the session to a recipient is closed."""
+
+	transfer_dir = 'downloads'
+	"""Directory received files are written to."""
+
+	transfer_chunk_size = 32768
+	"""Number of bytes of a file sent per chunk."""
+
+	transfer_window = 4
+	"""Maximum number of chunks of a file sent without having been acknowledged."""
+
+	transfer_timeout = 10
+	"""Seconds without an acknowledgement after which a file transfer is resumed over a new connection."""
+
+	transfer_retries = 3
+	"""Number of times a file transfer is resumed before giving up."""
+
+	sampling = False
+	"""Whether neighbours are picked from a partial view maintained by gossip instead of a ping flood."""
+
+	sampling_view_size = 20
+	"""Maximum number of entries of the partial view."""
+
+	sampling_shuffle_length = 5
+	"""Number of entries swapped in a single shuffle."""
+
+	sampling_interval = 5
+	"""Seconds between shuffles, after each of which missing neighbours are replaced from the view."""
+
+	sampling_timeout = 2
+	"""Seconds to wait for the answer to a shuffle before the node shuffled with is considered gone."""
+
+	heartbeat = False
+	"""Whether outbound neighbours are sent heartbeats and dropped and replaced when they stop answering."""
+
+	heartbeat_interval = 1
+	"""Seconds between heartbeats, which is also how often failed neighbours are checked for and replaced."""
+
+	heartbeat_phi_threshold = 8
+	"""Suspicion level above which a neighbour is considered failed, higher values detect later but more reliably."""
+
+	heartbeat_window = 100
+	"""Number of recent heartbeat inter-arrival times the suspicion level is derived from."""
+
+	heartbeat_min_std = 0.2
+	"""Lower bound in seconds on the standard deviation of the inter-arrival times, to tolerate jitter."""
+
+	replace_backoff = 1
+	"""Initial delay in seconds before a neighbour candidate that could not be connected to is tried again."""
+
+	replace_max_backoff = 60
+	"""Maximum delay in seconds between attempts to connect to a neighbour candidate."""
+
+	latency = False
+	"""Whether neighbours are chosen and rewired by round-trip time rather than at random, which needs heartbeats."""
+
+	latency_random_links = 1
+	"""Number of outbound neighbours chosen at random regardless of their round-trip time, to keep the overlay mixed."""
+
+	latency_rewire_interval = 10
+	"""Seconds between probes of a neighbour candidate for a lower round-trip time than the slowest neighbour."""
+
+	latency_rewire_ratio = 0.8
+	"""Fraction of the round-trip time of the slowest neighbour a probed candidate has to beat to replace it."""
+
+	admission = True
+	"""Whether received flood messages are rate limited per connection and dropped when too many are being handled."""
+
+	admission_max_handlers = 16
+	"""Maximum number of messages of rate limited types handled at the same time across all connections."""
+
+	admission_limits = {
+		'PING': {'rate': 20, 'burst': 100},
+		'PONG': {'rate': 100, 'burst': 500},
+		'QUERY': {'rate': 20, 'burst': 100}
+	}
+	"""Message type names mapped to the messages per second and burst size a single connection may send of them."""
+
+	bootstrap_peers = [(default_ip_addr, default_port)]
+	"""List of ip and port tuples of running nodes used for bootstrapping into the network."""
+
+	bootstrap_timeout = 3
+	"""Maximum number of seconds to wait for pongs during bootstrapping."""
+
+	bootstrap_settle = 0.5
+	"""Seconds without a new pong after which bootstrapping finishes early."""
+
+	bootstrap_retries = 3
+	"""Number of connection retries per bootstrapping peer."""
+
+	bootstrap_backoff = 0.25
+	"""Initial delay in seconds between connection retries, doubled after every retry."""
 
 	@classmethod
 	def load(cls):
-		"""Load configuration values from `config.yml` and update values in class."""
+		"""
+		Load configuration values from `config.yml` and update values in class.
+		Sections and values missing from the file keep their defaults, so older config files still load.
+		"""
 		with open('./config.yml', 'r') as f:
 			config = yaml.safe_load(f)
 			cls.default_ip = config['default_ip']
 			cls.default_port = config['default_port']
 			cls.neighbours = config['neighbours']
 			cls.max_connections = config['max_connections']
+			cls.state_dir = config.get('state_dir', cls.state_dir)
 			cls.prot_version = config['protocol']['version']
 			cls.prot_default_ttl = config['protocol']['ttl']
 			cls.prot_max_ttl = config['protocol']['max_ttl']
-			cls.bootstrap_peer = (config['bootstrap']['ip'], config['bootstrap']['port'])
+			dedup = config.get('dedup', {})
+			cls.dedup_capacity = dedup.get('capacity', cls.dedup_capacity)
+			cls.dedup_hop_timeout = dedup.get('hop_timeout', cls.dedup_hop_timeout)
+			send_queue = config.get('send_queue', {})
+			cls.send_queue_bytes = send_queue.get('max_bytes', cls.send_queue_bytes)
+			cls.send_flush_timeout = send_queue.get('flush_timeout', cls.send_flush_timeout)
+			query = config.get('query', {})
+			cls.query_timeout = query.get('timeout', cls.query_timeout)
+			cls.query_expanding_ring = query.get('expanding_ring', cls.query_expanding_ring)
+			cls.query_ring_timeout = query.get('ring_timeout', cls.query_ring_timeout)
+			cls.addr_cache_capacity = query.get('cache_capacity', cls.addr_cache_capacity)
+			bloom = config.get('bloom', {})
+			cls.bloom = bloom.get('enabled', cls.bloom)
+			cls.bloom_size = bloom.get('size', cls.bloom_size)
+			cls.bloom_hashes = bloom.get('hashes', cls.bloom_hashes)
+			cls.bloom_depth = bloom.get('depth', cls.bloom_depth)
+			cls.bloom_refresh_interval = bloom.get('refresh_interval', cls.bloom_refresh_interval)
+			dht = config.get('dht', {})
+			cls.dht = dht.get('enabled', cls.dht)
+			cls.dht_k = dht.get('k', cls.dht_k)
+			cls.dht_alpha = dht.get('alpha', cls.dht_alpha)
+			cls.dht_rpc_timeout = dht.get('rpc_timeout', cls.dht_rpc_timeout)
+			cls.dht_republish_interval = dht.get('republish_interval', cls.dht_republish_interval)
+			cls.dht_record_ttl = dht.get('record_ttl', cls.dht_record_ttl)
+			cls.dht_record_capacity = dht.get('record_capacity', cls.dht_record_capacity)
+			cls.addr_cache_positive_ttl = query.get('positive_ttl', cls.addr_cache_positive_ttl)
+			cls.addr_cache_negative_ttl = query.get('negative_ttl', cls.addr_cache_negative_ttl)
+			crypto = config.get('crypto', {})
+			cls.key_size = crypto.get('key_size', cls.key_size)
+			cls.replace_small_key = crypto.get('replace_small_key', cls.replace_small_key)
+			cls.encryption = crypto.get('encryption', cls.encryption)
+			cls.rekey_interval = crypto.get('rekey_interval', cls.rekey_interval)
+			cls.rekey_messages = crypto.get('rekey_messages', cls.rekey_messages)
+			cls.key_cache_capacity = crypto.get('key_cache_capacity', cls.key_cache_capacity)
+			compression = config.get('compression', {})
+			cls.compression_codecs = compression.get('codecs', cls.compression_codecs) or []
+			cls.compression_level = compression.get('level', cls.compression_level)
+			cls.compression_min_size = compression.get('min_size', cls.compression_min_size)
+			cls.compression_max_ratio = compression.get('max_ratio', cls.compression_max_ratio)
+			post = config.get('post', {})
+			cls.post_window = post.get('window', cls.post_window)
+			cls.post_backlog = post.get('backlog', cls.post_backlog)
+			cls.post_ack_timeout = post.get('ack_timeout', cls.post_ack_timeout)
+			cls.post_idle_timeout = post.get('idle_timeout', cls.post_idle_timeout)
+			transfer = config.get('transfer', {})
+			cls.transfer_dir = transfer.get('dir', cls.transfer_dir)
+			cls.transfer_chunk_size = transfer.get('chunk_size', cls.transfer_chunk_size)
+			cls.transfer_window = transfer.get('window', cls.transfer_window)
+			cls.transfer_timeout = transfer.get('timeout', cls.transfer_timeout)
+			cls.transfer_retries = transfer.get('retries', cls.transfer_retries)
+			sampling = config.get('sampling', {})
+			cls.sampling = sampling.get('enabled', cls.sampling)
+			cls.sampling_view_size = sampling.get('view_size', cls.sampling_view_size)
+			cls.sampling_shuffle_length = sampling.get('shuffle_length', cls.sampling_shuffle_length)
+			cls.sampling_interval = sampling.get('interval', cls.sampling_interval)
+			cls.sampling_timeout = sampling.get('timeout', cls.sampling_timeout)
+			heartbeat = config.get('heartbeat', {})
+			cls.heartbeat = heartbeat.get('enabled', cls.heartbeat)
+			cls.heartbeat_interval = heartbeat.get('interval', cls.heartbeat_interval)
+			cls.heartbeat_phi_threshold = heartbeat.get('phi_threshold', cls.heartbeat_phi_threshold)
+			cls.heartbeat_window = heartbeat.get('window', cls.heartbeat_window)
+			cls.heartbeat_min_std = heartbeat.get('min_std', cls.heartbeat_min_std)
+			cls.replace_backoff = heartbeat.get('replace_backoff', cls.replace_backoff)
+			cls.replace_max_backoff = heartbeat.get('replace_max_backoff', cls.replace_max_backoff)
+			latency = config.get('latency', {})
+			cls.latency = latency.get('enabled', cls.latency)
+			cls.latency_random_links = latency.get('random_links', cls.latency_random_links)
+			cls.latency_rewire_interval = latency.get('rewire_interval', cls.latency_rewire_interval)
+			cls.latency_rewire_ratio = latency.get('rewire_ratio', cls.latency_rewire_ratio)
+			admission = config.get('admission', {})
+			cls.admission = admission.get('enabled', cls.admission)
+			cls.admission_max_handlers = admission.get('max_handlers', cls.admission_max_handlers)
+			cls.admission_limits = admission.get('limits', cls.admission_limits) or {}
+			bootstrap = config['bootstrap']
+			if 'peers' in bootstrap:
+				cls.bootstrap_peers = [(peer['ip'], peer['port']) for peer in bootstrap['peers']]
+			else:
+				# single bootstrapping peer of older config files
+				cls.bootstrap_peers = [(bootstrap['ip'], bootstrap['port'])]
+			cls.bootstrap_timeout = bootstrap.get('timeout', cls.bootstrap_timeout)
+			cls.bootstrap_settle = bootstrap.get('settle', cls.bootstrap_settle)
+			cls.bootstrap_retries = bootstrap.get('retries', cls.bootstrap_retries)
+			cls.bootstrap_backoff = bootstrap.get('backoff', cls.bootstrap_backoff)
+
+	@classmethod
+	def dedup_expiry(cls) -> float:
+		"""Seconds a message ID is remembered, long enough for a request and its reply to cross `prot_max_ttl` hops."""
+		return 2 * cls.prot_max_ttl * cls.dedup_hop_timeout
+
+	@classmethod
+	def key_expiry(cls) -> float:
+		"""Seconds a received session key is kept, long enough for posts sealed with it shortly before a rekey."""
+		return 2 * cls.rekey_interval
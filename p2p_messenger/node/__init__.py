@@ -1,7 +1,9 @@
 from .node import Node
+from .async_node import AsyncNode
 from .peer import Peer
 
 __all__ = [
 	'Node',
+	'AsyncNode',
 	'Peer'
 ]
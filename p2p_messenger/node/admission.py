@@ -0,0 +1,97 @@
+from threading import Lock
+
+from ..config import Config
+from ..protocol import types
+
+
+class TokenBucket:
+	"""Token bucket refilled at `rate` tokens per second up to `burst` tokens, starting full."""
+
+	__slots__ = ('rate', 'burst', 'tokens', 'last')
+
+	def __init__(self, rate: float, burst: float, now: float):
+		self.rate = rate
+		self.burst = burst
+		self.tokens = burst
+		self.last = now
+
+	def take(self, now: float) -> bool:
+		"""Takes a token if there is one. Returns whether there was."""
+		self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+		self.last = now
+		if self.tokens < 1:
+			return False
+		self.tokens -= 1
+		return True
+
+
+class AdmissionControl:
+	"""
+	Admission control for received messages, decided on the header alone before the frame is copied or decoded.
+
+	Every connection gets a token bucket per message type listed in `Config.admission_limits`. Messages of these
+	types are dropped once the bucket of their connection is empty, or while `Config.admission_max_handlers` of them
+	are handled at the same time across all connections. All other types, such as posts, acknowledgements and
+	heartbeats, are always admitted, so a neighbour flooding the node cannot crowd them out.
+	"""
+
+	def __init__(self):
+		self.limits: dict[types.MsgType, tuple[float, float]] = {
+			types.MsgType[name]: (limit['rate'], limit['burst']) for name, limit in Config.admission_limits.items()
+		}
+		"""Message types mapped to the rate and burst of their token buckets."""
+
+		self.buckets: dict[object, dict[types.MsgType, TokenBucket]] = {}
+		"""Connections mapped to their token buckets by message type."""
+
+		self.running = 0
+		"""Number of admitted messages of limited types whose handler did not return yet."""
+
+		self.rate_limited = 0
+		"""Number of messages dropped because the token bucket of their connection was empty."""
+
+		self.overloaded = 0
+		"""Number of messages dropped because too many handlers were running."""
+
+		self._lock = Lock()
+
+	def admit(self, peer, msg_type: types.MsgType, now: float) -> bool:
+		"""
+		Returns whether a message of `msg_type` received on the connection to `peer` should be handled.
+		Every admitted message of a limited type has to be followed by a call to `done` once it was handled.
+		"""
+		limit = self.limits.get(msg_type)
+		if limit is None or not Config.admission:
+			return True
+		with self._lock:
+			buckets = self.buckets.setdefault(peer, {})
+			bucket = buckets.get(msg_type)
+			if bucket is None:
+				bucket = buckets[msg_type] = TokenBucket(*limit, now)
+			if not bucket.take(now):
+				self.rate_limited += 1
+				return False
+			if self.running >= Config.admission_max_handlers:
+				self.overloaded += 1
+				return False
+			self.running += 1
+		return True
+
+	def done(self, msg_type: types.MsgType):
+		"""Records that the handler of an admitted message returned."""
+		if msg_type in self.limits and Config.admission:
+			with self._lock:
+				self.running -= 1
+
+	def remove(self, peer):
+		"""Forgets a closed connection."""
+		with self._lock:
+			self.buckets.pop(peer, None)
+
+	def stats(self) -> dict[str, int]:
+		"""Returns the number of handlers running and of messages dropped."""
+		return {
+			'running': self.running,
+			'rate_limited': self.rate_limited,
+			'overloaded': self.overloaded
+		}
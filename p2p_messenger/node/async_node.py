@@ -0,0 +1,707 @@
+import asyncio
+import logging
+import os
+import socket
+import threading
+from concurrent import futures
+from time import monotonic
+from typing import Optional
+
+from .node import Node
+from .peer import RTT_GAIN
+from .routing import Lookup
+from .session import PostSession, failed_post
+from .transfer import OutgoingTransfer
+from ..config import Config
+from ..protocol import FrameDecoder, Header, Message, dht, types
+from ..protocol.framing import MAX_FRAME_SIZE
+
+BLOCKING_TYPES = frozenset({types.MsgType.KEY, types.MsgType.XFER, types.MsgType.CHUNK})
+"""Message types whose handlers decrypt with RSA or open and write files, run in the default executor."""
+
+
+class AsyncPeer:
+	"""Neighbour connection driven by the event loop of an `AsyncNode`."""
+
+	def __init__(
+		self,
+		addr: tuple[str, int],
+		reader: asyncio.StreamReader,
+		writer: asyncio.StreamWriter,
+		peer_id: str = None
+	):
+		self.peer_id = peer_id
+		self.addr = addr
+		self.reader = reader
+		self.writer = writer
+		self.socket = writer.get_extra_info('socket')
+		self.sock_name = writer.get_extra_info('sockname')
+		self.peer_name = writer.get_extra_info('peername')
+
+		self.loop = asyncio.get_running_loop()
+		"""Event loop driving this connection."""
+
+		self.loop_thread = threading.get_ident()
+		"""Thread running the event loop, messages sent from any other thread are handed over to it."""
+
+		self.dropped_flood = 0
+		"""Number of flood messages dropped because the transport buffer was full."""
+
+		self.dropped_control = 0
+		"""Number of control messages dropped because the transport buffer was full or the connection closed."""
+
+		self.rtt: Optional[float] = None
+		"""Smoothed round-trip time of the heartbeats over this connection in seconds, None until the first answer."""
+
+	def __repr__(self) -> str:
+		return format('Peer connection %s, transport %s' % (str(self.addr), self.writer.transport))
+
+	@property
+	def closed(self) -> bool:
+		"""Whether the connection was disconnected or failed, in which case nothing is sent anymore."""
+		return self.writer.is_closing()
+
+	def sample_rtt(self, rtt: float):
+		"""Folds a round-trip time sample into the smoothed round-trip time."""
+		self.rtt = rtt if self.rtt is None else self.rtt + RTT_GAIN * (rtt - self.rtt)
+
+	@classmethod
+	async def connect(cls, addr: tuple[str, int], peer_id: str = None):
+		"""Establishes a connection from the node to a peer."""
+		reader, writer = await asyncio.open_connection(*addr)
+		logging.debug(f"Established peer connection to node {peer_id} with address: {addr}")
+		return cls(addr, reader, writer, peer_id)
+
+	def send(self, msg: Message):
+		"""
+		Writes a message to the transport without blocking. The transport buffer cannot be reordered, so instead of
+		evicting flood messages, control messages get an extra `Config.send_queue_bytes` of headroom.
+		"""
+		if threading.get_ident() != self.loop_thread:
+			# handlers running in the executor must not touch the transport
+			self.loop.call_soon_threadsafe(self.send, msg)
+			return
+		logging.debug('Sending message of type %s to %s:%d', msg.header.msg_type.name, *self.addr)
+		logging.debug('Message printout: %s', msg)
+		data = msg.bytes()
+		is_flood = msg.header.msg_type in types.FLOOD_TYPES
+		limit = Config.send_queue_bytes if is_flood else 2 * Config.send_queue_bytes
+		if self.writer.is_closing() or self.writer.transport.get_write_buffer_size() + len(data) > limit:
+			logging.debug('Dropping message of type %s to %s', msg.header.msg_type.name, self.addr)
+			self.dropped_flood += is_flood
+			self.dropped_control += not is_flood
+			return
+		self.writer.write(data)
+
+	def stats(self) -> dict[str, int]:
+		"""Returns outbound buffer size and drop counters of this connection."""
+		return {
+			'queued_bytes': self.writer.transport.get_write_buffer_size(),
+			'dropped_flood': self.dropped_flood,
+			'dropped_control': self.dropped_control
+		}
+
+	def disconnect(self):
+		logging.debug("Disconnecting %s:%d" % self.addr)
+		self.writer.close()
+
+
+class AsyncNode(Node):
+	"""
+	Node running listening, neighbour I/O and all message handlers on a single asyncio event loop
+	instead of one thread per connection. It speaks the same wire protocol as `Node`.
+	"""
+
+	def __init__(self, port: int, b_addrs: list[tuple[str, int]]):
+		super().__init__(port, b_addrs)
+
+		self.loop: asyncio.AbstractEventLoop = None
+		"""Event loop of this node, set once the node is running."""
+
+		self.server: asyncio.AbstractServer = None
+		"""Listening server of this node."""
+
+		self.tasks: set[asyncio.Task] = set()
+		"""Background tasks spawned by handlers, referenced until they are done."""
+
+		self.candidate_event: asyncio.Event = None
+		"""Event set whenever a new neighbour candidate is found."""
+
+	def run(self):
+		"""Runs the event loop of the node until it is shut down."""
+		self.loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(self.loop)
+		try:
+			self.loop.run_until_complete(self.serve())
+		finally:
+			self.loop.close()
+
+	async def serve(self):
+		"""Listens for connections and bootstraps into the network."""
+		self.server = await asyncio.start_server(
+			self.reply,
+			self.ip,
+			self.port,
+			backlog=Config.max_connections,
+			reuse_address=True,
+			reuse_port=bool(self.worker_channels)
+		)
+		for channel in self.worker_channels:
+			channel.setblocking(False)
+			self.loop.add_reader(channel, self.adopt_connections, channel)
+		logging.info(f'Node with peer ID <{self.peer_id}> reachable at {self.ip} on port {self.port}...')
+		self.candidate_event = asyncio.Event()
+		bootstrap = self.spawn(self.bootstrap(self.b_addrs))
+		self.spawn(self.sweep_sessions_forever())
+		if Config.dht:
+			self.spawn(self.maintain_dht_forever(bootstrap))
+		if Config.bloom:
+			self.spawn(self.refresh_filters_forever())
+		if Config.sampling:
+			self.spawn(self.sample_peers_forever(bootstrap))
+		if Config.heartbeat:
+			self.spawn(self.heartbeat_forever(bootstrap))
+		try:
+			await self.server.serve_forever()
+		except asyncio.CancelledError:
+			pass
+
+	def spawn(self, coro) -> asyncio.Task:
+		"""Schedules a coroutine on the event loop of the node."""
+		task = self.loop.create_task(coro)
+		self.tasks.add(task)
+		task.add_done_callback(self._task_done)
+		return task
+
+	def _task_done(self, task: asyncio.Task):
+		self.tasks.discard(task)
+		if not task.cancelled() and task.exception():
+			logging.warning(f'Background task failed: {task.exception()}')
+
+	def call(self, coro):
+		"""Runs a coroutine on the event loop from another thread and waits for its result."""
+		return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+	def shutdown(self):
+		self.call(self._shutdown())
+
+	async def _shutdown(self):
+		self.save_state()
+		for transfer in list(self.transfers.values()):
+			transfer.fail()
+		self.close_sessions()
+		self.close_dht_peers()
+		# teardown connections to neighbours
+		logging.info('Disconnecting from peers...')
+		for n in self.outbound_neighbours:
+			logging.debug(f'Disconnect from neighbour: {n}')
+			n.send(Message(types.MsgType.BYE, self.host_addr))  # signal neighbor to close its connection
+			n.disconnect()  # close own outgoing connection to neighbour
+		# wait for other peers to handle bye message
+		await asyncio.sleep(1)
+		for channel in self.worker_channels:
+			self.loop.remove_reader(channel)
+		self.stop_workers()
+		self.server.close()
+
+	async def bootstrap(self, addrs: list[tuple[str, int]]):
+		"""
+		Joins the network by sending a ping message to each of the given addresses in parallel.
+		Finishes as soon as enough neighbour candidates answered, no more pongs arrive or the deadline passed.
+		"""
+
+		started = monotonic()
+		if await self.reconnect_neighbours():
+			self.time_to_ready = monotonic() - started
+			logging.info(f'Reconnected to previous neighbours in {self.time_to_ready:.3f}s')
+			return
+
+		addrs = [addr for addr in addrs if addr != self.host_addr]
+		if not addrs:
+			logging.warning('Aborting bootstrap: Cannot bootstrap with yourself. Continuing as detached peer.')
+			return
+		if Config.sampling:
+			self.view.add(addrs)
+			await asyncio.gather(*[self._shuffle(addr) for addr in addrs])
+			await self._maintain_neighbours()
+			self.time_to_ready = monotonic() - started
+			logging.info(f'Finished bootstrapping with {len(self.outbound_neighbours)} neighbours '
+						 f'from a view of {len(self.view)} nodes in {self.time_to_ready:.3f}s')
+			self.save_state()
+			return
+		deadline = started + Config.bootstrap_timeout
+
+		pingers = [self.spawn(self.ping_bootstrap_peer(addr, deadline)) for addr in addrs]
+
+		# wait for some pongs
+		while len(self.neighbour_candidates) < Config.neighbours:
+			remaining = deadline - monotonic()
+			if remaining <= 0:
+				break
+			timeout = min(remaining, Config.bootstrap_settle) if self.neighbour_candidates else remaining
+			self.candidate_event.clear()
+			try:
+				await asyncio.wait_for(self.candidate_event.wait(), timeout)
+			except asyncio.TimeoutError:
+				if self.neighbour_candidates:
+					break  # no further pongs are coming in
+		candidates = self.neighbour_candidates
+		self.neighbour_candidates = []
+		logging.debug('Received neighbour candidates: {}'.format(candidates))
+
+		for pinger in pingers:
+			pinger.cancel()  # stop bootstrapping peers from retrying
+		results = await asyncio.gather(*pingers, return_exceptions=True)
+		b_peers = [b_peer for b_peer in results if isinstance(b_peer, AsyncPeer)]
+		for b_peer in b_peers:
+			b_peer.disconnect()
+		if not b_peers:
+			logging.warning('Bootstrapping failed. Continuing as detached peer.')
+
+		neighbour_addrs = self.select_neighbours(candidates)
+		for addr in neighbour_addrs:
+			await self._add_neighbour(addr)
+		self.keep_candidates(candidates)
+
+		self.time_to_ready = monotonic() - started
+		logging.info(f'Finished bootstrapping with {len(neighbour_addrs)} neighbours in {self.time_to_ready:.3f}s')
+		self.save_state()
+
+	async def reconnect_neighbours(self) -> int:
+		"""Connects to the neighbours known from the last run. Returns the number of outbound neighbours."""
+		if not self.state:
+			return 0
+		addrs = [addr for addr in self.state.load_neighbours()[:Config.neighbours] if addr != self.host_addr]
+		results = await asyncio.gather(*[self._add_neighbour(addr) for addr in addrs], return_exceptions=True)
+		for addr, result in zip(addrs, results):
+			if isinstance(result, OSError):
+				logging.debug(f'Previous neighbour {addr} is gone: {result}')
+		return len(self.outbound_neighbours)
+
+	async def ping_bootstrap_peer(self, addr: tuple[str, int], deadline: float) -> Optional[AsyncPeer]:
+		"""Sends a ping to a bootstrapping peer, retrying with exponential backoff until the deadline."""
+		logging.info('Attempting to bootstrap using %s:%s...' % addr)
+		backoff = Config.bootstrap_backoff
+		for attempt in range(Config.bootstrap_retries + 1):
+			try:
+				b_peer = await AsyncPeer.connect(addr)
+				break
+			except OSError as e:
+				logging.debug(f'Bootstrapping peer {addr} unreachable (attempt {attempt + 1}): {e}')
+				if monotonic() + backoff >= deadline:
+					return None
+				await asyncio.sleep(backoff)
+				backoff *= 2
+		else:
+			return None
+		# pongs are routed back to us over the same connection
+		self.spawn(self.serve_peer(b_peer))
+
+		b_peer.send(self.discovery_ping())
+		return b_peer
+
+	def candidate_found(self):
+		self.candidate_event.set()
+
+	def post_msg(self, chat_msg: str, peer_id: str) -> futures.Future:
+		"""Posts message. May be called from any thread."""
+		return self.call(self._post_msg(chat_msg, peer_id))
+
+	async def _post_msg(self, chat_msg: str, peer_id: str) -> futures.Future:
+		addr = await self._resolve(peer_id)
+		if not addr:
+			logging.warning(f'Failed to send the message. Did not find recipient {peer_id}')
+			return failed_post()
+		try:
+			session = await self._session(peer_id, addr)
+			return session.post(self.seal_post(session, peer_id, chat_msg))
+		except OSError as e:
+			logging.error(f"{e}: Recipient not reachable via {addr}")
+			self.recipient_id_map.discard(peer_id)  # reset address mapping
+		except ValueError as e:
+			logging.error(f'Cannot encrypt message: {e}')
+		return failed_post()
+
+	async def _session(self, peer_id: str, addr: tuple[str, int]) -> PostSession:
+		session = self.sessions.get(peer_id)
+		if session is not None and not session.closed and session.peer.addr == addr:
+			return session
+		peer = await AsyncPeer.connect(addr, peer_id)
+		session = self.sessions.get(peer_id)
+		if session is not None and not session.closed and session.peer.addr == addr:
+			peer.disconnect()  # another post connected in the meantime
+			return session
+		if session is not None:
+			session.close()  # the recipient moved
+		session = self.sessions[peer_id] = PostSession(peer)
+		# acknowledgements come back over the same connection
+		self.spawn(self.serve_peer(peer))
+		return session
+
+	def send_file(self, path: str, peer_id: str, name: str = None) -> futures.Future:
+		"""Streams a file to the recipient without waiting for its delivery. May be called from any thread."""
+		return self.call(self._send_file(path, peer_id, name))
+
+	async def _send_file(self, path: str, peer_id: str, name: str = None) -> futures.Future:
+		try:
+			transfer = OutgoingTransfer(path, peer_id, name or os.path.basename(path), self.host_addr)
+		except OSError as e:
+			logging.error(f'Cannot send file: {e}')
+			return failed_post()
+		self.transfers[transfer.transfer_id] = transfer
+		transfer.future.add_done_callback(lambda _: self.transfers.pop(transfer.transfer_id, None))
+		await self._start_transfer(transfer)
+		return transfer.future
+
+	def resume_transfer(self, transfer: OutgoingTransfer):
+		self.spawn(self._start_transfer(transfer))
+
+	async def _start_transfer(self, transfer: OutgoingTransfer):
+		if transfer.attempts > Config.transfer_retries:
+			transfer.fail()
+			return
+		addr = await self._resolve(transfer.peer_id)
+		try:
+			session = await self._session(transfer.peer_id, addr) if addr else None
+		except OSError as e:
+			logging.error(f"{e}: Recipient not reachable via {addr}")
+			self.recipient_id_map.discard(transfer.peer_id)  # reset address mapping
+			session = None
+		if session is None:
+			transfer.fail()
+			return
+		transfer.offer(session)
+
+	async def refresh_filters_forever(self):
+		while True:
+			self.refresh_filters()
+			await asyncio.sleep(Config.bloom_refresh_interval)
+
+	async def sweep_sessions_forever(self):
+		while True:
+			await asyncio.sleep(Config.post_ack_timeout / 2)
+			self.sweep_sessions()
+			# file I/O stays off the event loop
+			await self.loop.run_in_executor(None, self.flush_state)
+
+	def resolve(self, peer_id: str) -> Optional[tuple[str, int]]:
+		"""Returns the address of the recipient with the given peer id. May be called from any thread."""
+		return self.call(self._resolve(peer_id))
+
+	async def _resolve(self, peer_id: str) -> Optional[tuple[str, int]]:
+		found, addr = self.recipient_id_map.lookup(peer_id)
+		if found:
+			return addr
+		if Config.dht:
+			addr = (await self._dht_lookup(dht.node_key(peer_id))).record
+			if addr is not None:
+				self.recipient_id_map.add(peer_id, addr)
+				return addr
+			# recipients that do not take part in the DHT are still found by flooding
+		for ttl, timeout in self.query_rings():
+			future = self.query(peer_id, ttl)
+			try:
+				return await asyncio.wait_for(asyncio.shield(future), timeout)
+			except asyncio.TimeoutError:
+				pass
+		self.query_failed(peer_id, future)
+		return None
+
+	def new_future(self) -> asyncio.Future:
+		return self.loop.create_future()
+
+	async def _dht_connection(self, addr: tuple[str, int]) -> AsyncPeer:
+		peer = self.neighbours.outbound_to(addr)
+		if peer is not None:
+			return peer
+		entry = self.dht_peers.get(addr)
+		if entry is None or entry[0].writer.is_closing():
+			peer = await asyncio.wait_for(AsyncPeer.connect(addr), Config.dht_rpc_timeout)
+			entry = self.dht_peers.get(addr)
+			if entry is None or entry[0].writer.is_closing():
+				self.dht_peers[addr] = (peer, monotonic())
+				# answers come back over the same connection
+				self.spawn(self.serve_peer(peer))
+				return peer
+			peer.disconnect()  # another request connected in the meantime
+		self.dht_peers[addr] = (entry[0], monotonic())
+		return entry[0]
+
+	def dht_lookup(self, target: bytes, find_record: bool = True) -> Lookup:
+		"""Runs an iterative lookup of `target` in the DHT. May be called from any thread."""
+		return self.call(self._dht_lookup(target, find_record))
+
+	async def _dht_lookup(self, target: bytes, find_record: bool = True) -> Lookup:
+		lookup = Lookup(self.node_key, target, self.routing.closest(target, Config.dht_k), find_record)
+		pending = {}
+		while not lookup.done:
+			for key, addr in lookup.next_batch():
+				try:
+					msg_id, future = self.dht_request(await self._dht_connection(addr), target)
+				except OSError as e:
+					logging.debug(f'DHT node {addr} unreachable: {e}')
+					self.routing.remove(key)
+					lookup.on_failure(key)
+					continue
+				pending[future] = (msg_id, key, monotonic() + Config.dht_rpc_timeout)
+			if not pending:
+				break
+			timeout = min(deadline for _, _, deadline in pending.values()) - monotonic()
+			await asyncio.wait(pending, timeout=max(timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+			self.dht_collect(lookup, pending)
+		self.dht_forget([msg_id for msg_id, _, _ in pending.values()])
+		logging.debug(f'DHT lookup finished after {lookup.rounds} rounds, found record {lookup.record}')
+		return lookup
+
+	def publish(self):
+		"""Stores the address record of this node in the DHT. May be called from any thread."""
+		self.call(self._publish())
+
+	async def _publish(self):
+		if not len(self.routing):
+			requests = [self.dht_request(n, self.node_key) for n in self.outbound_neighbours + self.inbound_neighbours]
+			if requests:
+				await asyncio.wait([future for _, future in requests], timeout=Config.dht_rpc_timeout)
+			self.dht_forget([msg_id for msg_id, _ in requests])
+		lookup = await self._dht_lookup(self.node_key, find_record=False)
+		store_msg = Message(types.MsgType.STORE, self.host_addr, payload=self.peer_id_bytes)
+		for _, addr in lookup.closest():
+			try:
+				(await self._dht_connection(addr)).send(store_msg)
+			except OSError as e:
+				logging.debug(f'DHT node {addr} unreachable: {e}')
+		logging.info(f'Published address record to {len(lookup.closest())} DHT nodes')
+
+	async def maintain_dht_forever(self, bootstrap: asyncio.Task):
+		await asyncio.wait([bootstrap])
+		while True:
+			await self._publish()
+			await asyncio.sleep(Config.dht_republish_interval)
+
+	def shuffle(self, addr: tuple[str, int] = None) -> bool:
+		"""Swaps entries of the view with the node at `addr` or the oldest entry. May be called from any thread."""
+		return self.call(self._shuffle(addr))
+
+	async def _shuffle(self, addr: tuple[str, int] = None) -> bool:
+		target = addr or self.view.oldest()
+		if target is None:
+			return False
+		peer = self.neighbours.outbound_to(target)
+		opened = peer is None
+		try:
+			if opened:
+				peer = await asyncio.wait_for(AsyncPeer.connect(target), Config.sampling_timeout)
+				# the answer comes back over the same connection
+				self.spawn(self.serve_peer(peer))
+			msg_id, future = self.shuffle_request(peer, target)
+		except (OSError, asyncio.TimeoutError) as e:
+			logging.debug(f'Node {target} unreachable for shuffle: {e}')
+			self.view.remove(target)
+			return False
+		try:
+			await asyncio.wait_for(future, Config.sampling_timeout)
+			return True
+		except asyncio.TimeoutError:
+			logging.debug(f'Node {target} did not answer shuffle in time')
+			self.shuffles.pop(msg_id, None)
+			self.view.remove(target)
+			return False
+		finally:
+			if opened:
+				peer.disconnect()
+
+	def maintain_neighbours(self):
+		"""Connects to random nodes of the view until there are enough neighbours. May be called from any thread."""
+		self.call(self._maintain_neighbours())
+
+	async def _maintain_neighbours(self):
+		for addr in self.replacement_candidates():
+			if len(self.outbound_neighbours) >= Config.neighbours:
+				break
+			try:
+				await self._add_neighbour(addr)
+			except OSError as e:
+				logging.debug(f'Neighbour candidate {addr} unreachable: {e}')
+				self.candidate_failed(addr)
+		if self.rediscovery_due():
+			await self._rediscover()
+
+	def rediscover(self):
+		"""Looks for new neighbour candidates. May be called from any thread."""
+		self.call(self._rediscover())
+
+	async def _rediscover(self):
+		if not self.outbound_neighbours:
+			if any(addr != self.host_addr for addr in self.b_addrs):
+				await self.bootstrap(self.b_addrs)
+		elif not Config.sampling:
+			self.discover()
+
+	def drop_neighbour(self, peer: AsyncPeer):
+		"""Forgets an outbound neighbour and aborts the connection, which may never flush its buffer if it failed."""
+		self.neighbours.remove(peer)
+		self.filters.remove(peer)
+		self.detector.remove(peer)
+		peer.writer.transport.abort()
+
+	def rewire(self):
+		"""Probes a neighbour candidate for a lower round-trip time. May be called from any thread."""
+		self.call(self._rewire())
+
+	async def _rewire(self):
+		addr = self.rewire_step()
+		if addr is None:
+			return
+		try:
+			if await self._add_neighbour(addr):
+				self.probe = addr
+		except OSError as e:
+			logging.debug(f'Neighbour candidate {addr} unreachable: {e}')
+			self.candidate_failed(addr)
+
+	async def heartbeat_forever(self, bootstrap: asyncio.Task):
+		await asyncio.wait([bootstrap])
+		while True:
+			self.heartbeat()
+			await self._maintain_neighbours()
+			if self.rewire_due():
+				await self._rewire()
+			await asyncio.sleep(Config.heartbeat_interval)
+
+	async def sample_peers_forever(self, bootstrap: asyncio.Task):
+		await asyncio.wait([bootstrap])
+		while True:
+			await asyncio.sleep(Config.sampling_interval)
+			await self._shuffle()
+			self.rotate_neighbour()
+			await self._maintain_neighbours()
+
+	def adopt_connections(self, channel: socket.socket):
+		"""Handles the connections a worker process handed over on `channel`, called by the loop when it is readable."""
+		try:
+			data, fds, _, _ = socket.recv_fds(channel, 1, 1)
+		except BlockingIOError:
+			return
+		except OSError:
+			data, fds = b'', []
+		if not data and not fds:
+			logging.debug('Worker process exited.')
+			self.loop.remove_reader(channel)
+			return
+		for fd in fds:
+			self.spawn(self._adopt(socket.socket(fileno=fd)))
+
+	async def _adopt(self, client: socket.socket):
+		try:
+			addr = client.getpeername()
+			reader, writer = await asyncio.open_connection(sock=client)
+		except OSError as e:
+			logging.debug(f'Handed over connection closed already: {e}')
+			client.close()
+			return
+		logging.debug(f'Adopt connection from {addr} handed over by a worker process')
+		await self.serve_peer(AsyncPeer(addr, reader, writer))
+
+	async def reply(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		"""Handles an accepted connection."""
+		logging.debug(f'Accept connection from {writer.get_extra_info("peername")}')
+		await self.serve_peer(AsyncPeer(writer.get_extra_info('peername'), reader, writer))
+
+	async def serve_peer(self, peer: AsyncPeer):
+		"""Handles incoming requests on the connection to `peer`."""
+		decoder = FrameDecoder()
+		connected = True
+		while connected:
+			try:
+				data = await peer.reader.read(MAX_FRAME_SIZE)
+			except ConnectionError:
+				data = b''
+			if not data:
+				logging.debug(f'Connection closed by {peer.peer_name}')
+				break
+			decoder.feed(data)
+			connected = await self._handle_frames(decoder, peer)
+		self.connection_lost(peer)
+		peer.disconnect()
+
+	async def _handle_frames(self, decoder: FrameDecoder, peer: AsyncPeer) -> bool:
+		"""
+		Handles every complete frame like `handle_frames`, but runs the handlers of `BLOCKING_TYPES` in the default
+		executor, one call for each run of consecutive blocking frames. The next frame of the connection waits for
+		them, so a session key is installed before the posts sealed with it are opened and chunks are written in
+		order, while other connections are served meanwhile.
+		"""
+		blocking = []
+		connected = True
+		try:
+			for header, frame in decoder.frames():
+				if header.msg_type in BLOCKING_TYPES:
+					blocking.append((header, frame))
+					continue
+				if blocking and not await self.loop.run_in_executor(None, self.handle_blocking_frames, blocking, peer):
+					return False
+				blocking = []
+				if not self.handle_frame(header, frame, peer):
+					return False
+		except ValueError as e:
+			# the stream cannot be resynchronised after a malformed header
+			logging.error(f'Closing connection to {peer.addr}: {e}')
+			connected = False
+		# the frames are views of the receive buffer, which is only refilled once they are handled
+		if blocking and not await self.loop.run_in_executor(None, self.handle_blocking_frames, blocking, peer):
+			return False
+		return connected
+
+	def handle_blocking_frames(self, frames: list[tuple[Header, memoryview]], peer: AsyncPeer) -> bool:
+		"""Handles a run of frames in an executor thread. Returns whether the connection should be kept open."""
+		return all(self.handle_frame(header, frame, peer) for header, frame in frames)
+
+	def add_neighbour(self, addr: tuple[str, int]):
+		"""Establishes an outbound neighbour connection to `addr` without blocking the event loop."""
+		self.spawn(self._add_neighbour(addr))
+
+	async def _add_neighbour(self, addr: tuple[str, int], peer_id: str = None) -> bool:
+		if self.neighbours.outbound_to(addr):
+			return False
+		peer = await AsyncPeer.connect(addr, peer_id)
+		# another connection to the same node may have been established while this one was
+		if not self.neighbours.add(peer, outbound=True):
+			logging.debug('Closing duplicate connection to neighbour %s:%d', *addr)
+			peer.disconnect()
+			return False
+		logging.info('Connecting to new neighbour: {}'.format(peer.addr))
+		logging.debug('Current neighbours: %s', self.outbound_neighbours)
+		# replies to our floods are routed back over this connection
+		self.spawn(self.serve_peer(peer))
+		return True
+
+	def handle_join(self, msg: Message, client: AsyncPeer):
+		"""Handles incoming join."""
+		if len(self.outbound_neighbours) >= Config.max_connections:
+			return False
+		client.writer.write(self.peer_id_bytes)  # Send my id to the requesting node
+		self.neighbours.update(client, addr=msg.get_sender(), peer_id=msg.text())
+		self.neighbours.add(client, outbound=False)
+		self.spawn(self._accept_join(msg.get_sender(), client.peer_id))
+		return True
+
+	async def _accept_join(self, addr: tuple[str, int], sender_peer_id: str):
+		peer = await AsyncPeer.connect(addr, sender_peer_id)
+		jacc_msg = Message(types.MsgType.JACC, self.host_addr, payload=self.peer_id_bytes)
+		peer.send(jacc_msg)
+		try:
+			peer_id = (await asyncio.wait_for(peer.reader.read(1024), 3)).decode('utf-8')
+			if peer_id == sender_peer_id:
+				if self.neighbours.add(peer, outbound=True):
+					self.spawn(self.serve_peer(peer))
+					return
+				logging.debug('Closing duplicate connection to neighbour %s:%d', *addr)
+		except asyncio.TimeoutError as e:
+			logging.warning(f'Handle join function failed while building outbound connection. ({e})')
+		peer.disconnect()
+
+	def handle_jacc(self, msg: Message, client: AsyncPeer):
+		client.writer.write(self.peer_id_bytes)  # Send my id to the requesting node
+		self.neighbours.update(client, addr=msg.get_sender(), peer_id=msg.text())
+		self.neighbours.add(client, outbound=False)
+		return True
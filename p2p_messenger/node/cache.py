@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Hashable
+
+
+class SeenCache:
+	"""
+	Bounded cache of recently seen message IDs with per-entry expiry.
+
+	Entries map a message ID to an arbitrary value, e.g. the connection a message arrived on. Lookups are O(1),
+	the oldest entry is evicted once `capacity` is reached and entries expire `expiry` seconds after insertion.
+	With `lru` set, lookups refresh the position of an entry so the least recently used one is evicted instead.
+	"""
+
+	def __init__(self, capacity: int, expiry: float, lru: bool = False):
+		self.capacity = capacity
+		"""Maximum number of entries."""
+
+		self.expiry = expiry
+		"""Default number of seconds after which an entry expires."""
+
+		self.lru = lru
+		"""Whether lookups mark an entry as recently used."""
+
+		self.hits = 0
+		"""Number of lookups that found a live entry."""
+
+		self.misses = 0
+		"""Number of lookups that found no entry or an expired one."""
+
+		self.evictions = 0
+		"""Number of live entries dropped because the capacity was reached."""
+
+		self.expirations = 0
+		"""Number of entries dropped because they expired."""
+
+		self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+		self._lock = Lock()
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def __contains__(self, key: Hashable) -> bool:
+		return self.lookup(key)[0]
+
+	def __setitem__(self, key: Hashable, value: Any):
+		self.add(key, value)
+
+	def get(self, key: Hashable, default: Any = None) -> Any:
+		"""Returns the value of a live entry or `default`."""
+		found, value = self.lookup(key)
+		return value if found else default
+
+	def lookup(self, key: Hashable) -> tuple[bool, Any]:
+		"""Returns whether a live entry exists for `key` and its value."""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return False, None
+			expires_at, value = entry
+			if expires_at <= monotonic():
+				del self._entries[key]
+				self.expirations += 1
+				self.misses += 1
+				return False, None
+			if self.lru:
+				self._entries.move_to_end(key)
+			self.hits += 1
+			return True, value
+
+	def add(self, key: Hashable, value: Any = None, expiry: float = None):
+		"""Inserts or replaces an entry, evicting the oldest entries if necessary. `expiry` overrides the default."""
+		with self._lock:
+			self._entries.pop(key, None)
+			self._insert(key, value, expiry, monotonic())
+
+	def add_if_absent(self, key: Hashable, value: Any = None, expiry: float = None) -> bool:
+		"""
+		Inserts an entry unless a live one exists for `key`, as a single step under the lock.
+		Returns whether the entry was inserted, so that exactly one of several concurrent callers sees True.
+		"""
+		with self._lock:
+			now = monotonic()
+			entry = self._entries.get(key)
+			if entry is not None and entry[0] > now:
+				if self.lru:
+					self._entries.move_to_end(key)
+				self.hits += 1
+				return False
+			if entry is not None:
+				del self._entries[key]
+				self.expirations += 1
+			self.misses += 1
+			self._insert(key, value, expiry, now)
+			return True
+
+	def discard(self, key: Hashable):
+		"""Removes the entry for `key` if present."""
+		with self._lock:
+			self._entries.pop(key, None)
+
+	def items(self) -> list[tuple[Hashable, Any, float]]:
+		"""Returns key, value and remaining seconds until expiry of every live entry."""
+		with self._lock:
+			now = monotonic()
+			return [(key, value, expires_at - now) for key, (expires_at, value) in self._entries.items() if expires_at > now]
+
+	def _insert(self, key: Hashable, value: Any, expiry: float, now: float):
+		"""Appends an entry for a key not in the cache, evicting the oldest entries if necessary. Needs the lock."""
+		self._purge(now)
+		while len(self._entries) >= self.capacity:
+			self._entries.popitem(last=False)
+			self.evictions += 1
+		self._entries[key] = (now + (self.expiry if expiry is None else expiry), value)
+
+	def _purge(self, now: float):
+		"""Drops expired entries from the front, which holds the oldest insertions or least recently used entries."""
+		while self._entries:
+			key, (expires_at, _) = next(iter(self._entries.items()))
+			if expires_at > now:
+				return
+			del self._entries[key]
+			self.expirations += 1
+
+	def stats(self) -> dict[str, int]:
+		"""Returns size and counters of the cache."""
+		return {
+			'size': len(self._entries),
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions,
+			'expirations': self.expirations
+		}
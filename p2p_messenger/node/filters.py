@@ -0,0 +1,113 @@
+from threading import Lock
+
+from ..config import Config
+from ..protocol import bloom
+
+
+class FilterTable:
+	"""
+	Attenuated Bloom filters summarising which peer ids are reachable through each outbound neighbour.
+
+	Level i of a filter holds the peer ids i hops away from the node that sent it, so level 0 is the node itself and
+	level i + 1 of the own filter is the union of level i of the filters of all outbound neighbours, except the one
+	the filter is sent to. Every node subscribes to the filters of its outbound neighbours, which send the subscriber
+	only the bits that changed since their last update.
+	"""
+
+	def __init__(self, peer_id: bytes):
+		self.own_mask = bloom.mask(peer_id, Config.bloom_size, Config.bloom_hashes)
+		"""Level 0 of the own filter."""
+
+		self.received: dict[object, list[int]] = {}
+		"""Filters of outbound neighbours by connection."""
+
+		self.subscribed: set = set()
+		"""Connections to outbound neighbours the node subscribed to."""
+
+		self.subscribers: dict[object, list[int]] = {}
+		"""Connections of subscribers mapped to the levels last sent to them."""
+
+		self.updates_sent = 0
+		"""Number of filter updates sent to subscribers."""
+
+		self._lock = Lock()
+
+	def own(self, exclude: tuple[str, int] = None) -> list[int]:
+		"""Returns the levels of the filter of this node, leaving out what is reachable through the node at `exclude`."""
+		with self._lock:
+			filters = [levels for peer, levels in self.received.items() if peer.addr != exclude]
+		levels = [self.own_mask]
+		for level in range(1, Config.bloom_depth):
+			bits = 0
+			for received in filters:
+				bits |= received[level - 1]
+			levels.append(bits)
+		return levels
+
+	def subscribe(self, peer) -> bool:
+		"""Records that the node subscribes to the filter of an outbound neighbour. Returns False if it did already."""
+		with self._lock:
+			if peer in self.subscribed:
+				return False
+			self.subscribed.add(peer)
+			return True
+
+	def add_subscriber(self, peer):
+		"""Registers a subscriber, which is sent the whole filter with the next update."""
+		with self._lock:
+			self.subscribers.setdefault(peer, [0] * Config.bloom_depth)
+
+	def apply(self, peer, deltas: list[int]):
+		"""Applies an update of the filter of an outbound neighbour."""
+		with self._lock:
+			levels = self.received.setdefault(peer, [0] * Config.bloom_depth)
+			for level, delta in enumerate(deltas[:Config.bloom_depth]):
+				levels[level] ^= delta
+
+	def updates(self) -> list[tuple[object, list[int]]]:
+		"""Returns the subscribers whose view of the own filter is outdated together with the changed bits."""
+		with self._lock:
+			subscribers = list(self.subscribers.items())
+		updates = []
+		for peer, sent in subscribers:
+			own = self.own(exclude=peer.addr)
+			deltas = [new ^ old for new, old in zip(own, sent)]
+			if any(deltas):
+				updates.append((peer, deltas))
+				with self._lock:
+					if peer in self.subscribers:
+						self.subscribers[peer] = own
+		self.updates_sent += len(updates)
+		return updates
+
+	def remove(self, peer):
+		"""Forgets a closed connection."""
+		with self._lock:
+			self.received.pop(peer, None)
+			self.subscribed.discard(peer)
+			self.subscribers.pop(peer, None)
+
+	def route(self, peers, peer_id: bytes, ttl: int) -> list:
+		"""
+		Returns the connections a query for `peer_id` with the given remaining TTL should be forwarded on: the
+		neighbours whose filter holds the peer id within reach of the query and those that sent no filter. Returns
+		all `peers` if no filter matches, so that the query is flooded.
+		"""
+		bits = bloom.mask(peer_id, Config.bloom_size, Config.bloom_hashes)
+		matched, unknown = [], []
+		with self._lock:
+			for peer in peers:
+				levels = self.received.get(peer)
+				if levels is None:
+					unknown.append(peer)
+				elif any(level & bits == bits for level in levels[:ttl]):
+					matched.append(peer)
+		return matched + unknown if matched else list(peers)
+
+	def stats(self) -> dict[str, int]:
+		"""Returns the number of filters held and sent."""
+		return {
+			'received': len(self.received),
+			'subscribers': len(self.subscribers),
+			'updates_sent': self.updates_sent
+		}
@@ -0,0 +1,61 @@
+from threading import Lock
+from time import monotonic
+
+import rsa
+from .cache import SeenCache
+from ..config import Config
+from ..protocol import utils
+from ..protocol.crypto import DecryptionError, SessionKey, key_id_of
+
+
+class KeyRing:
+	"""
+	Session keys of a node: the key used for each recipient, set up once and replaced after
+	`Config.rekey_interval` seconds or `Config.rekey_messages` messages, and all keys received from senders.
+	"""
+
+	def __init__(self, private_key: rsa.PrivateKey):
+		self.private_key = private_key
+
+		self.outgoing: dict[str, tuple[SessionKey, bytes]] = {}
+		"""Dictionary mapping peer ids of recipients to their session key and the key wrapped for them."""
+
+		self.incoming = SeenCache(Config.key_cache_capacity, Config.key_expiry(), lru=True)
+		"""Cache mapping key ids to the session keys received from senders."""
+
+		self._lock = Lock()
+
+	def sending_key(self, peer_id: str) -> tuple[SessionKey, bytes]:
+		"""
+		Returns the session key for the recipient and the KEY payload handing it to them, creating a new key if
+		there is none or it is due for replacement. Raises `ValueError` if the peer id is not a usable public key.
+		"""
+		with self._lock:
+			entry = self.outgoing.get(peer_id)
+			if entry is not None:
+				key, _ = entry
+				if key.created + Config.rekey_interval > monotonic() and key.uses < Config.rekey_messages:
+					return entry
+			key = SessionKey()
+			try:
+				wrapped = key.wrap(utils.peer_id_to_pub_key(peer_id))
+			except OverflowError:
+				raise ValueError(f'Public key of {peer_id} is too small to exchange a session key')
+			entry = self.outgoing[peer_id] = (key, wrapped)
+			return entry
+
+	def receive(self, payload) -> SessionKey:
+		"""Stores the session key of a KEY payload. Raises `DecryptionError` if it was not meant for this node."""
+		found, key = self.incoming.lookup(key_id_of(payload))
+		if found:
+			return key
+		key = SessionKey.unwrap(payload, self.private_key)
+		self.incoming.add(key.key_id, key)
+		return key
+
+	def open(self, payload) -> bytes:
+		"""Returns the plaintext of an SPOST payload. Raises `DecryptionError` if it cannot be opened."""
+		key = self.incoming.get(key_id_of(payload))
+		if key is None:
+			raise DecryptionError('Message was sealed with an unknown session key')
+		return key.open(payload)
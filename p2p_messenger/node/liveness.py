@@ -0,0 +1,125 @@
+import math
+from collections import deque
+from statistics import fmean, pstdev
+from threading import Lock
+from typing import Hashable
+
+from ..config import Config
+
+
+class FailureDetector:
+	"""
+	Phi accrual failure detector for the outbound neighbour connections.
+
+	Every connection is sent a heartbeat each `Config.heartbeat_interval` seconds, which the node on the other end
+	answers. From the spread of the recent inter-arrival times of the answers, phi expresses how unlikely it is that
+	an answer is still coming, on a logarithmic scale: a phi of 8 is wrong about once in 10^8 times. A connection is
+	suspected once its phi exceeds `Config.heartbeat_phi_threshold`, so the threshold trades detection latency for
+	false positives on a jittery network.
+	"""
+
+	def __init__(self):
+		self.arrivals: dict[object, deque[float]] = {}
+		"""Connections mapped to the recent inter-arrival times of their heartbeats."""
+
+		self.last_arrival: dict[object, float] = {}
+		"""Connections mapped to the time of their last heartbeat, or of the first one sent."""
+
+		self.suspected = 0
+		"""Number of connections suspected so far."""
+
+		self.detection_latency = 0.0
+		"""Sum of the seconds from the last heartbeat of a suspected connection until it was suspected."""
+
+		self._lock = Lock()
+
+	def watch(self, peer, now: float):
+		"""Starts watching a connection as if a heartbeat arrived, so that one that never answers is suspected too."""
+		with self._lock:
+			if peer not in self.last_arrival:
+				self.last_arrival[peer] = now
+				# seed the window with the expected interval, like a first heartbeat right on time
+				self.arrivals[peer] = deque([Config.heartbeat_interval], maxlen=Config.heartbeat_window)
+
+	def heartbeat(self, peer, now: float):
+		"""Records the arrival of a heartbeat answer on a watched connection."""
+		with self._lock:
+			last = self.last_arrival.get(peer)
+			if last is None:
+				return
+			self.arrivals[peer].append(now - last)
+			self.last_arrival[peer] = now
+
+	def phi(self, peer, now: float) -> float:
+		"""Returns the suspicion level of a connection, 0 if it is not watched."""
+		with self._lock:
+			last = self.last_arrival.get(peer)
+			if last is None:
+				return 0.0
+			intervals = list(self.arrivals[peer])
+		mean = fmean(intervals)
+		std = max(pstdev(intervals), Config.heartbeat_min_std)
+		# logistic approximation of the cumulative normal distribution
+		y = (now - last - mean) / std
+		e = math.exp(-y * (1.5976 + 0.070566 * y * y))
+		if now - last > mean:
+			return -math.log10(e / (1 + e))
+		return -math.log10(1 - 1 / (1 + e))
+
+	def suspect(self, peer, now: float) -> bool:
+		"""Returns whether a connection is suspected to have failed, in which case it is no longer watched."""
+		if self.phi(peer, now) <= Config.heartbeat_phi_threshold:
+			return False
+		with self._lock:
+			last = self.last_arrival.pop(peer, None)
+			self.arrivals.pop(peer, None)
+			if last is None:
+				return False
+			self.suspected += 1
+			self.detection_latency += now - last
+		return True
+
+	def remove(self, peer):
+		"""Forgets a closed connection."""
+		with self._lock:
+			self.last_arrival.pop(peer, None)
+			self.arrivals.pop(peer, None)
+
+	def stats(self) -> dict[str, float]:
+		"""Returns the number of connections watched and suspected and the mean detection latency."""
+		return {
+			'watched': len(self.last_arrival),
+			'suspected': self.suspected,
+			'mean_detection_latency': self.detection_latency / self.suspected if self.suspected else None
+		}
+
+
+class Backoff:
+	"""
+	Exponential backoff per key, e.g. the address of a neighbour candidate that could not be connected to. The delay
+	starts at `Config.replace_backoff` seconds and doubles after every failure up to `Config.replace_max_backoff`.
+	"""
+
+	def __init__(self):
+		self.retries: dict[Hashable, tuple[float, float]] = {}
+		"""Keys mapped to the time of the next attempt and the current delay."""
+
+		self._lock = Lock()
+
+	def ready(self, key: Hashable, now: float) -> bool:
+		"""Returns whether the next attempt for `key` is due."""
+		with self._lock:
+			retry = self.retries.get(key)
+		return retry is None or retry[0] <= now
+
+	def failed(self, key: Hashable, now: float):
+		"""Postpones the next attempt for `key`."""
+		with self._lock:
+			_, delay = self.retries.get(key, (now, Config.replace_backoff / 2))
+			delay = min(2 * delay, Config.replace_max_backoff)
+			self.retries[key] = (now + delay, delay)
+
+	def succeeded(self, key: Hashable):
+		"""Resets the delay for `key`."""
+		with self._lock:
+			self.retries.pop(key, None)
@@ -0,0 +1,112 @@
+from threading import Lock
+from typing import Hashable, Optional
+
+
+class NeighbourTable:
+	"""
+	Thread-safe registry of neighbour connections, indexed by address, peer ID and socket.
+
+	Changes are serialized by a lock and replace the immutable snapshots of inbound and outbound connections
+	(copy-on-write), so handlers iterate over a consistent view without holding the lock while they send.
+	"""
+
+	def __init__(self):
+		self.outbound: tuple = ()
+		"""Snapshot of active outbound connections to neighbour peers."""
+
+		self.inbound: tuple = ()
+		"""Snapshot of active inbound connections from neighbour peers."""
+
+		self._by_addr: dict[tuple[str, int], tuple] = {}
+		self._by_peer_id: dict[str, tuple] = {}
+		self._by_socket: dict[Hashable, object] = {}
+		self._lock = Lock()
+
+	def __len__(self) -> int:
+		return len(self.outbound) + len(self.inbound)
+
+	def __contains__(self, peer) -> bool:
+		return self._by_socket.get(peer.socket) is peer
+
+	def add(self, peer, outbound: bool = True) -> bool:
+		"""
+		Registers a connection to a neighbour. Returns whether it is registered, which an outbound connection is not
+		if there is another outbound connection to the same address already.
+		"""
+		with self._lock:
+			if self._by_socket.get(peer.socket) is peer:
+				return True
+			if outbound:
+				if any(n in self.outbound for n in self._by_addr.get(peer.addr, ())):
+					return False
+				self.outbound += (peer,)
+			else:
+				self.inbound += (peer,)
+			self._by_socket[peer.socket] = peer
+			self._index(peer)
+			return True
+
+	def remove(self, peer) -> bool:
+		"""Unregisters a connection. Returns whether it was registered."""
+		with self._lock:
+			if self._by_socket.get(peer.socket) is not peer:
+				return False
+			del self._by_socket[peer.socket]
+			self._unindex(peer)
+			self.outbound = tuple(n for n in self.outbound if n is not peer)
+			self.inbound = tuple(n for n in self.inbound if n is not peer)
+			return True
+
+	def update(self, peer, addr: tuple[str, int] = None, peer_id: str = None):
+		"""Sets the listening address and/or peer ID of a connection, re-indexing it if it is registered."""
+		with self._lock:
+			registered = self._by_socket.get(peer.socket) is peer
+			if registered:
+				self._unindex(peer)
+			if addr is not None:
+				peer.addr = addr
+			if peer_id is not None:
+				peer.peer_id = peer_id
+			if registered:
+				self._index(peer)
+
+	def by_addr(self, addr: tuple[str, int]) -> tuple:
+		"""Returns all connections to the neighbour listening on `addr`."""
+		return self._by_addr.get(addr, ())
+
+	def by_peer_id(self, peer_id: str) -> tuple:
+		"""Returns all connections to the neighbour with the given peer ID."""
+		return self._by_peer_id.get(peer_id, ())
+
+	def by_socket(self, s: Hashable):
+		"""Returns the connection using socket `s`, or None."""
+		return self._by_socket.get(s)
+
+	def outbound_to(self, addr: tuple[str, int]):
+		"""Returns the outbound connection to the neighbour listening on `addr`, or None."""
+		for peer in self.by_addr(addr):
+			if peer in self.outbound:
+				return peer
+		return None
+
+	def addrs(self) -> list[tuple[str, int]]:
+		"""Returns the addresses of all outbound neighbours."""
+		return [n.addr for n in self.outbound]
+
+	def _index(self, peer):
+		self._by_addr[peer.addr] = self._by_addr.get(peer.addr, ()) + (peer,)
+		if peer.peer_id:
+			self._by_peer_id[peer.peer_id] = self._by_peer_id.get(peer.peer_id, ()) + (peer,)
+
+	def _unindex(self, peer):
+		self._drop(self._by_addr, peer.addr, peer)
+		if peer.peer_id:
+			self._drop(self._by_peer_id, peer.peer_id, peer)
+
+	@staticmethod
+	def _drop(index: dict, key: Optional[Hashable], peer):
+		peers = tuple(n for n in index.get(key, ()) if n is not peer)
+		if peers:
+			index[key] = peers
+		else:
+			index.pop(key, None)
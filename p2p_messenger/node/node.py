@@ -1,19 +1,44 @@
+import math
+import os
 import socket
-from threading import Thread
-from time import sleep
+from concurrent import futures
+from threading import Condition, Event, Lock, Thread
+from time import monotonic, sleep
 import logging
 import random
 from typing import Optional
 
 import rsa
+from .admission import AdmissionControl
+from .cache import SeenCache
+from .filters import FilterTable
+from .keyring import KeyRing
+from .liveness import Backoff, FailureDetector
+from .neighbours import NeighbourTable
 from .peer import Peer
+from .routing import Lookup, RoutingTable
+from .sampling import PartialView
+from .session import PostSession, failed_post
+from .transfer import IncomingTransfer, OutgoingTransfer
+from .state import NodeState
 from ..config import Config
-from ..protocol import Header, Message, types, utils
+from ..protocol import FrameDecoder, Header, Message, bloom, compression, dht, sampling, stream, types, utils
+from ..protocol.crypto import DecryptionError
 
 
 class Node(Thread):
-    def __init__(self, port: int, b_addr: tuple[str, int]):
-        """Initiates a new node (have to call `run` to activate the node)."""
+    def __init__(
+        self,
+        port: int,
+        b_addrs: list[tuple[str, int]],
+        keys: tuple[rsa.PublicKey, rsa.PrivateKey] = None,
+        persist: bool = True
+    ):
+        """
+        Initiates a new node (have to call `run` to activate the node).
+        The node is identified by `keys` if given, otherwise by the stored or a new key pair.
+        Nothing is read from or written to `Config.state_dir` unless `persist` is set.
+        """
 
         Thread.__init__(self)
 
@@ -26,52 +51,178 @@ class Node(Thread):
         self.host_addr = (self.ip, self.port)
         """IP and port tuple of this node as addressable in the network."""
 
-        self.pub_key, self.private_key = rsa.newkeys(16)
+        self.state = NodeState(os.path.join(Config.state_dir, str(port))) if persist and Config.state_dir else None
+        """On-disk state of this node, or None if the node does not persist anything."""
+
+        keys = keys or (self.state.load_keys() if self.state else None)
+        if keys is not None and keys[0].n.bit_length() < Config.key_size:
+            if not Config.replace_small_key:
+                raise ValueError(
+                    f'Key of {keys[0].n.bit_length()} bits is smaller than the configured {Config.key_size} bits, '
+                    f'set replace_small_key to replace it, which changes the peer ID'
+                )
+            logging.warning(f'Replacing stored {keys[0].n.bit_length()} bit key, {Config.key_size} bits are required')
+            keys = None
+        if keys is None:
+            keys = rsa.newkeys(Config.key_size)
+            if self.state:
+                self.state.save_keys(keys[1])
+        self.pub_key, self.private_key = keys
         """Public and private keys of this node for encrypted communication"""
 
         self.peer_id = utils.pub_key_to_peer_id(self.pub_key)
         """Peer ID for this node."""
 
-        self.inbound_neighbours: list[Peer] = []
-        """List of active inbound connections from neighbour peers."""
+        self.peer_id_bytes = self.peer_id.encode('utf-8')
+        """Peer ID for this node as it appears in payloads."""
 
-        self.outbound_neighbours: list[Peer] = []
-        """List of active outbound connections to neighbour peers."""
+        self.node_key = dht.node_key(self.peer_id_bytes)
+        """Key of this node in the DHT keyspace."""
 
-        self.recv_pings: dict[str, tuple[str, int]] = {}
-        """Dictionary mapping message IDs of received pings to the address tuple of the respective sender."""
+        self.keyring = KeyRing(self.private_key)
+        """Session keys for encrypted posts."""
 
-        self.recv_queries: dict[str, tuple[str, int]] = {}
-        """Dictionary mapping public keys of received queries to the address tuple of the respective sender."""
+        self.accepted_codecs = compression.accepted_codecs()
+        """Ids of the compression codecs this node accepts, announced in every acknowledgement."""
 
-        self.sent_pings: list[str] = []
-        """List of message IDs of sent pings."""
+        self.neighbours = NeighbourTable()
+        """Registry of active inbound and outbound connections to neighbour peers."""
 
-        self.sent_queries: list[str] = []
-        """List of message IDs of sent queries."""
+        self.recv_pings = SeenCache(Config.dedup_capacity, Config.dedup_expiry())
+        """Cache mapping message IDs of received pings to the connection they arrived on."""
+
+        self.recv_queries = SeenCache(Config.dedup_capacity, Config.dedup_expiry())
+        """Cache mapping message IDs of received queries to the connection they arrived on."""
+
+        self.sent_pings = SeenCache(Config.dedup_capacity, Config.dedup_expiry())
+        """Cache of message IDs of sent pings."""
 
         self.neighbour_candidates: list[tuple[str, int]] = []
-        """List of neighbour candidates from ping-pong discovery."""
+        """List of neighbour candidates from ping-pong discovery, kept after bootstrapping to replace failed neighbours."""
+
+        self.candidate_rtts: dict[tuple[str, int], float] = {}
+        """Dictionary mapping neighbour candidates to the lowest round-trip time of their pongs through the overlay."""
+
+        self.random_links: set[tuple[str, int]] = set()
+        """Addresses of the outbound neighbours chosen at random when neighbours are chosen by round-trip time."""
+
+        self.probe: Optional[tuple[str, int]] = None
+        """Address of the neighbour candidate connected to for measuring its round-trip time, if any."""
+
+        self.last_rewire = monotonic()
+        """Time of the last probe of a neighbour candidate."""
+
+        self.detector = FailureDetector()
+        """Failure detector watching the outbound neighbours."""
+
+        self.backoff = Backoff()
+        """Backoff of connection attempts per neighbour candidate, with None standing for the rediscovery of candidates."""
+
+        self.admission = AdmissionControl()
+        """Rate limits and concurrency cap for received flood messages."""
+
+        self.candidates_changed = Condition()
+        """Condition notified whenever a new neighbour candidate is found."""
+
+        self.time_to_ready: Optional[float] = None
+        """Seconds the last bootstrap took from its start until the neighbours were chosen."""
+
+        self.recipient_id_map = SeenCache(Config.addr_cache_capacity, Config.addr_cache_positive_ttl, lru=True)
+        """Cache mapping peer ids to the address tuple of the recipient, or None if the recipient was not found."""
+
+        if self.state:
+            self.state.load_addresses(self.recipient_id_map)
+
+        self.state_dirty = False
+        """Whether resolved recipient addresses changed since the state was last saved."""
+
+        self.pending_queries: dict[str, futures.Future] = {}
+        """Dictionary mapping peer ids to the future of the query in flight for them."""
+
+        self.query_ttls: dict[str, int] = {}
+        """Dictionary mapping peer ids to the TTL of the widest ring sent for the query in flight for them."""
+
+        self.query_lock = Lock()
+        """Lock guarding `pending_queries` and `query_ttls`."""
+
+        self.filters = FilterTable(self.peer_id_bytes)
+        """Routing filters of the outbound neighbours and subscribers to the own routing filter."""
+
+        self.routing = RoutingTable(self.node_key)
+        """Contacts of the DHT by XOR distance to the own key."""
+
+        self.dht_records = SeenCache(Config.dht_record_capacity, Config.dht_record_ttl, lru=True)
+        """Cache mapping DHT keys to the address records stored for other nodes."""
+
+        self.dht_requests: dict[bytes, futures.Future] = {}
+        """Dictionary mapping message ids of DHT requests in flight to the future completed with the answer."""
 
-        self.recipient_id_map: dict[str, Optional[tuple[str, int]]] = {}
-        """Dictionary mapping peer ids to the address tuple of the recipient"""
+        self.dht_peers: dict[tuple[str, int], tuple[Peer, float]] = {}
+        """Dictionary mapping addresses of DHT nodes that are no neighbours to the connection and time of its last use."""
 
-        self.b_addr = b_addr
-        """IP and port tuple of the bootstrapping peer."""
+        self.dht_lock = Lock()
+        """Lock guarding `dht_requests` and `dht_peers`."""
+
+        self.view = PartialView(self.host_addr)
+        """Random sample of the nodes in the network that neighbours are picked from when peer sampling is enabled."""
+
+        self.shuffles: dict[bytes, tuple[list[tuple[tuple[str, int], int]], futures.Future]] = {}
+        """Dictionary mapping message ids of shuffles in flight to the entries sent and the future of the answer."""
+
+        self.sessions: dict[str, PostSession] = {}
+        """Dictionary mapping peer ids to the open post session to that recipient."""
+
+        self.transfers: dict[bytes, OutgoingTransfer] = {}
+        """Dictionary mapping transfer ids to the files being sent."""
+
+        self.incoming: dict[bytes, IncomingTransfer] = {}
+        """Dictionary mapping transfer ids to the files being received."""
+
+        self.session_lock = Lock()
+        """Lock guarding `sessions`, `transfers` and `incoming`."""
+
+        self.b_addrs = b_addrs
+        """IP and port tuples of the bootstrapping peers."""
 
         self.s = None
         """Listening socket from this peer."""
 
+        self.worker_channels: list[socket.socket] = []
+        """Sockets to the worker processes sharing the listening port, which hand over connections other than sessions."""
+
+    @property
+    def inbound_neighbours(self) -> tuple[Peer, ...]:
+        """Snapshot of active inbound connections from neighbour peers."""
+        return self.neighbours.inbound
+
+    @property
+    def outbound_neighbours(self) -> tuple[Peer, ...]:
+        """Snapshot of active outbound connections to neighbour peers."""
+        return self.neighbours.outbound
+
     def run(self):
         """Runs a node listening for connections."""
 
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.worker_channels:
+            self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.s.bind((socket.gethostname(), self.port))
         self.s.listen(Config.max_connections)
+        for channel in self.worker_channels:
+            Thread(target=self.adopt_connections, args=[channel], daemon=True).start()
 
-        bt = Thread(target=self.bootstrap, args=[self.b_addr])
+        bt = Thread(target=self.bootstrap, args=[self.b_addrs])
         bt.start()
+        Thread(target=self.sweep_sessions_forever, daemon=True).start()
+        if Config.dht:
+            Thread(target=self.maintain_dht_forever, args=[bt], daemon=True).start()
+        if Config.bloom:
+            Thread(target=self.refresh_filters_forever, daemon=True).start()
+        if Config.sampling:
+            Thread(target=self.sample_peers_forever, args=[bt], daemon=True).start()
+        if Config.heartbeat:
+            Thread(target=self.heartbeat_forever, args=[bt], daemon=True).start()
 
         logging.info(f'Node with peer ID <{self.peer_id}> reachable at {self.ip} on port {self.port}...')
 
@@ -79,12 +230,19 @@ class Node(Thread):
             while True:
                 (client, addr) = self.s.accept()
                 logging.debug(f'Accept connection from {addr}, socket {client}')
-                ct = Thread(target=self.reply, args=[client])
+                ct = Thread(target=self.reply, args=[Peer(addr, s=client)])
                 ct.start()
         except KeyboardInterrupt:
             self.shutdown()
+        except OSError:
+            logging.debug('Listening socket closed.')
 
     def shutdown(self):
+        self.save_state()
+        for transfer in list(self.transfers.values()):
+            transfer.fail()
+        self.close_sessions()
+        self.close_dht_peers()
         # teardown connections to neighbours
         logging.info('Disconnecting from peers...')
         for n in self.outbound_neighbours:
@@ -93,51 +251,186 @@ class Node(Thread):
             n.disconnect()  # close own outgoing connection to neighbour
         # wait for other peers to handle bye message
         sleep(1)
+        self.stop_workers()
         try:
             self.s.shutdown(socket.SHUT_RDWR)
             self.s.close()
         except OSError as e:
             logging.warning(f"Encountered exception during shutdown: {e}")
 
-    def bootstrap(self, addr: tuple[str, int]):
-        """Joins the network by sending a ping message to the given address."""
+    def stop_workers(self):
+        """Closes the sockets to the worker processes, which exit once they notice."""
+        for channel in self.worker_channels:
+            channel.close()
+        self.worker_channels = []
 
-        # send ping to bootstrapping peer
-        logging.info('Attempting to bootstrap using %s:%s...' % addr)
+    def adopt_connections(self, channel: socket.socket):
+        """Handles the connections a worker process hands over on `channel` until the worker exits."""
+        while True:
+            try:
+                data, fds, _, _ = socket.recv_fds(channel, 1, 1)
+            except OSError:
+                return
+            if not data and not fds:
+                logging.debug('Worker process exited.')
+                return
+            for fd in fds:
+                client = socket.socket(fileno=fd)
+                try:
+                    peer = Peer(client.getpeername(), s=client)
+                except OSError as e:
+                    logging.debug(f'Handed over connection closed already: {e}')
+                    client.close()
+                    continue
+                logging.debug(f'Adopt connection from {peer.addr} handed over by a worker process')
+                Thread(target=self.reply, args=[peer]).start()
+
+    def bootstrap(self, addrs: list[tuple[str, int]]):
+        """
+        Joins the network by sending a ping message to each of the given addresses in parallel.
+        Finishes as soon as enough neighbour candidates answered, no more pongs arrive or the deadline passed.
+        """
+
+        started = monotonic()
+        if self.reconnect_neighbours():
+            self.time_to_ready = monotonic() - started
+            logging.info(f'Reconnected to previous neighbours in {self.time_to_ready:.3f}s')
+            return
 
-        if addr == self.host_addr:
+        addrs = [addr for addr in addrs if addr != self.host_addr]
+        if not addrs:
             logging.warning('Aborting bootstrap: Cannot bootstrap with yourself. Continuing as detached peer.')
             return
-
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        try:
-            s.connect(addr)
-        except ConnectionRefusedError:
-            logging.warning('Bootstrapping failed. Continuing as detached peer.')
+        if Config.sampling:
+            self.view.add(addrs)
+            for addr in addrs:
+                self.shuffle(addr)
+            self.maintain_neighbours()
+            self.time_to_ready = monotonic() - started
+            logging.info(f'Finished bootstrapping with {len(self.outbound_neighbours)} neighbours '
+                         f'from a view of {len(self.view)} nodes in {self.time_to_ready:.3f}s')
+            self.save_state()
             return
+        deadline = started + Config.bootstrap_timeout
 
-        logging.debug('Sending message of type PING to %s:%d' % addr)
-        ping_msg = Message(types.MsgType.PING, self.host_addr)
-        self.sent_pings.append(ping_msg.get_id())
-        s.send(ping_msg.bytes())
-        logging.debug(f'Message print out: {ping_msg}')
+        b_peers: list[Peer] = []
+        done = Event()
+        for addr in addrs:
+            Thread(target=self.ping_bootstrap_peer, args=[addr, deadline, b_peers, done]).start()
 
         # wait for some pongs
-        sleep(3)
-        logging.debug('Received neighbour candidates: {}'.format(self.neighbour_candidates))
+        with self.candidates_changed:
+            while len(self.neighbour_candidates) < Config.neighbours:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                timeout = min(remaining, Config.bootstrap_settle) if self.neighbour_candidates else remaining
+                if not self.candidates_changed.wait(timeout) and self.neighbour_candidates:
+                    break  # no further pongs are coming in
+            candidates = self.neighbour_candidates
+            self.neighbour_candidates = []
+        logging.debug('Received neighbour candidates: {}'.format(candidates))
+
+        with self.candidates_changed:
+            done.set()  # stop bootstrapping peers from retrying
+        for b_peer in b_peers:
+            b_peer.disconnect()
+        if not b_peers:
+            logging.warning('Bootstrapping failed. Continuing as detached peer.')
 
-        neighbour_addrs = random.sample(
-            self.neighbour_candidates,
-            Config.neighbours if len(self.neighbour_candidates) >= Config.neighbours else len(self.neighbour_candidates)
-        )
+        neighbour_addrs = self.select_neighbours(candidates)
         for addr in neighbour_addrs:
             # TODO use a join method with exchange of peer_ids in order to build symmetrical neighbour relations
-            logging.info('Connecting new neighbour (bootstrapping): {}'.format(addr))
-            self.outbound_neighbours.append(Peer(addr))  # add peer id to Peer
-        logging.debug(f'Current neighbours: {self.outbound_neighbours}')
+            self.add_neighbour(addr)  # add peer id to Peer
+        self.keep_candidates(candidates)
+
+        self.time_to_ready = monotonic() - started
+        logging.info(f'Finished bootstrapping with {len(neighbour_addrs)} neighbours in {self.time_to_ready:.3f}s')
+        self.save_state()
+
+    def select_neighbours(self, candidates: list[tuple[str, int]]) -> list[tuple[str, int]]:
+        """
+        Returns the candidates to connect to as neighbours. They are chosen at random, or by the round-trip time of
+        their pongs when neighbours are chosen by latency, except for `Config.latency_random_links` random ones.
+        Candidates there is an outbound connection to already, e.g. one added by a ping meanwhile, are skipped.
+        """
+        candidates = [addr for addr in candidates if not self.neighbours.outbound_to(addr)]
+        count = min(Config.neighbours, len(candidates))
+        if not Config.latency:
+            return random.sample(candidates, count)
+        ranked = sorted(candidates, key=lambda addr: self.candidate_rtts.get(addr, math.inf))
+        closest = ranked[:max(0, count - Config.latency_random_links)]
+        chosen = random.sample(ranked[len(closest):], count - len(closest))
+        self.random_links.update(chosen)
+        return closest + chosen
+
+    def keep_candidates(self, candidates: list[tuple[str, int]]):
+        """Keeps the neighbour candidates found while bootstrapping to replace failed neighbours with."""
+        with self.candidates_changed:
+            known = set(self.neighbour_candidates)
+            self.neighbour_candidates.extend(addr for addr in candidates if addr not in known)
+
+    def reconnect_neighbours(self) -> int:
+        """Connects to the neighbours known from the last run. Returns the number of outbound neighbours."""
+        if not self.state:
+            return 0
+        for addr in self.state.load_neighbours()[:Config.neighbours]:
+            if addr == self.host_addr:
+                continue
+            try:
+                self.add_neighbour(addr)
+            except OSError as e:
+                logging.debug(f'Previous neighbour {addr} is gone: {e}')
+        return len(self.outbound_neighbours)
+
+    def save_state(self):
+        """Persists the current neighbours and resolved recipient addresses."""
+        self.state_dirty = False
+        if not self.state:
+            return
+        try:
+            self.state.save_neighbours(self.neighbours.addrs())
+            self.state.save_addresses(self.recipient_id_map)
+        except OSError as e:
+            logging.warning(f'Failed to save node state: {e}')
+
+    def flush_state(self):
+        """Persists the state if a recipient address was resolved since it was last saved."""
+        if self.state_dirty:
+            self.save_state()
+
+    def ping_bootstrap_peer(self, addr: tuple[str, int], deadline: float, b_peers: list[Peer], done: Event):
+        """
+        Sends a ping to a bootstrapping peer, retrying with exponential backoff until the deadline
+        or until the bootstrap is `done`. The connection is added to `b_peers` to be closed by the bootstrap.
+        """
+        logging.info('Attempting to bootstrap using %s:%s...' % addr)
+        backoff = Config.bootstrap_backoff
+        for attempt in range(Config.bootstrap_retries + 1):
+            try:
+                b_peer = Peer(addr)
+                break
+            except OSError as e:
+                logging.debug(f'Bootstrapping peer {addr} unreachable (attempt {attempt + 1}): {e}')
+                if monotonic() + backoff >= deadline or done.wait(backoff):
+                    return
+                backoff *= 2
+        else:
+            return
+        with self.candidates_changed:
+            if done.is_set():
+                b_peer.disconnect()
+                return
+            b_peers.append(b_peer)
+        # pongs are routed back to us over the same connection
+        Thread(target=self.reply, args=[b_peer]).start()
+
+        b_peer.send(self.discovery_ping())
 
-        self.neighbour_candidates = []
-        logging.debug(f'Finished bootstrapping process for node with {self.pub_key}')
+    def candidate_found(self):
+        """Wakes up a bootstrap waiting for neighbour candidates."""
+        with self.candidates_changed:
+            self.candidates_changed.notify_all()
 
     # TODO Send a test message to bootstrapping peer? But we need the peer id somehow
 
@@ -147,14 +440,18 @@ class Node(Thread):
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         s.connect(addr)
         s.settimeout(3)
-        join_msg = Message(msg_type=types.MsgType.JOIN, sender=self.host_addr, payload=self.peer_id)
-        logging.debug(f"Message printout: {join_msg}")
+        join_msg = Message(msg_type=types.MsgType.JOIN, sender=self.host_addr, payload=self.peer_id_bytes)
+        logging.debug('Message printout: %s', join_msg)
         s.send(join_msg.bytes())
         try:
-            peer_id = s.recv(1024).decode('utf-8')[:32]
+            peer_id = s.recv(1024).decode('utf-8')
+            s.settimeout(None)
             # mapping from Peer.socket.getpeername() to peer id
-            self.outbound_neighbours.append(Peer(addr=addr, peer_id=peer_id, s=s))
-            return True
+            peer = Peer(addr=addr, peer_id=peer_id, s=s)
+            if self.neighbours.add(peer, outbound=True):
+                Thread(target=self.reply, args=[peer]).start()
+                return True
+            logging.debug('Closing duplicate connection to neighbour %s:%d', *addr)
         except Exception as e:
             logging.warning(f"Handle join function failed. ({e})")
 
@@ -166,131 +463,780 @@ class Node(Thread):
             logging.warning(e)
         return False
 
-    def post_msg(self, chat_msg: str, peer_id: str):
-        """Posts message"""
+    def post_msg(self, chat_msg: str, peer_id: str) -> futures.Future:
+        """
+        Posts message over the session to the recipient without waiting for its delivery.
+        Returns a future completed with whether the recipient acknowledged the message.
+        """
 
-        def send_msg():
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        addr = self.resolve(peer_id)
+        if not addr:
+            logging.warning(f'Failed to send the message. Did not find recipient {peer_id}')
+            return failed_post()
+        try:
+            session = self.session(peer_id, addr)
+            return session.post(self.seal_post(session, peer_id, chat_msg))
+        except OSError as e:
+            logging.error(f"{e}: Recipient not reachable via {addr}")
+            self.recipient_id_map.discard(peer_id)  # reset address mapping
+        except ValueError as e:
+            logging.error(f'Cannot encrypt message: {e}')
+        return failed_post()
+
+    def seal_post(self, session: PostSession, peer_id: str, chat_msg: str) -> Message:
+        """
+        Returns the message posting `chat_msg` to the recipient, encrypted with the session key for the recipient
+        unless encryption is disabled. The session key is handed to the recipient first if it does not have it yet.
+        """
+        if not Config.encryption:
+            codec_id, payload = self.compress(session, (peer_id + chat_msg).encode('utf-8'))
+            post_msg = Message(types.MsgType.POST, self.host_addr, payload=payload)
+        else:
+            key, wrapped = self.keyring.sending_key(peer_id)
+            # concurrent posts must not send the key twice, nor seal with it before it is queued
+            with self.session_lock:
+                if session.key_id != key.key_id:
+                    session.key_id = key.key_id
+                    session.peer.send(Message(types.MsgType.KEY, self.host_addr, payload=wrapped))
+            # compress before encrypting, ciphertext does not compress
+            codec_id, plaintext = self.compress(session, chat_msg.encode('utf-8'))
+            post_msg = Message(types.MsgType.SPOST, self.host_addr, payload=key.seal(plaintext))
+        post_msg.header.codec = codec_id
+        return post_msg
+
+    @staticmethod
+    def compress(session: PostSession, data: bytes) -> tuple[int, bytes]:
+        """Compresses a post payload if the recipient accepts one of our codecs and it is worth it."""
+        return session.compressor.compress(data) if session.compressor else (0, data)
+
+    def session(self, peer_id: str, addr: tuple[str, int]) -> PostSession:
+        """Returns the open post session to the recipient, connecting to `addr` if there is none."""
+        with self.session_lock:
+            session = self.sessions.get(peer_id)
+            if session is not None and not session.closed and session.peer.addr == addr:
+                return session
+            if session is not None:
+                session.close()  # the recipient moved
+            peer = Peer(addr, peer_id=peer_id)
+            session = self.sessions[peer_id] = PostSession(peer)
+        # acknowledgements come back over the same connection
+        Thread(target=self.reply, args=[peer]).start()
+        return session
+
+    def send_file(self, path: str, peer_id: str, name: str = None) -> futures.Future:
+        """
+        Streams a file to the recipient without waiting for its delivery.
+        Returns a future completed with whether the recipient acknowledged the whole file.
+        """
+        try:
+            transfer = OutgoingTransfer(path, peer_id, name or os.path.basename(path), self.host_addr)
+        except OSError as e:
+            logging.error(f'Cannot send file: {e}')
+            return failed_post()
+        with self.session_lock:
+            self.transfers[transfer.transfer_id] = transfer
+        transfer.future.add_done_callback(lambda _: self.transfers.pop(transfer.transfer_id, None))
+        self.start_transfer(transfer)
+        return transfer.future
+
+    def start_transfer(self, transfer: OutgoingTransfer):
+        """Offers a transfer over the session to its recipient, giving up after `Config.transfer_retries` resumes."""
+        if transfer.attempts > Config.transfer_retries:
+            transfer.fail()
+            return
+        addr = self.resolve(transfer.peer_id)
+        try:
+            session = self.session(transfer.peer_id, addr) if addr else None
+        except OSError as e:
+            logging.error(f"{e}: Recipient not reachable via {addr}")
+            self.recipient_id_map.discard(transfer.peer_id)  # reset address mapping
+            session = None
+        if session is None:
+            transfer.fail()
+            return
+        transfer.offer(session)
+
+    def resume_transfer(self, transfer: OutgoingTransfer):
+        """Offers a transfer again after its connection was lost."""
+        Thread(target=self.start_transfer, args=[transfer]).start()
+
+    def sweep_sessions(self):
+        """
+        Closes post sessions with an overdue acknowledgement or without posts for `Config.post_idle_timeout`,
+        as well as the sessions of stalled file transfers, which are resumed once the connection is gone.
+        """
+        now = monotonic()
+        with self.session_lock:
+            expired = [(peer_id, session) for peer_id, session in self.sessions.items() if session.expired(now)]
+            for transfer in self.transfers.values():
+                session = transfer.session
+                if transfer.stalled(now) and session is not None and self.sessions.get(transfer.peer_id) is session:
+                    logging.warning(f'Transfer of {transfer.path} to {transfer.peer_id} stalled, reconnecting')
+                    expired.append((transfer.peer_id, session))
+            for peer_id, _ in expired:
+                self.sessions.pop(peer_id, None)
+            for transfer_id, incoming in list(self.incoming.items()):
+                if incoming.last_active + Config.transfer_timeout <= now:
+                    del self.incoming[transfer_id]
+                    incoming.close()
+        self.close_dht_peers(idle_since=now - Config.post_idle_timeout)
+        for peer_id, session in expired:
+            if session.unacked:
+                logging.warning(f'Recipient {peer_id} did not acknowledge posts in time, closing session')
+                self.recipient_id_map.discard(peer_id)  # reset address mapping
+            else:
+                logging.debug(f'Closing idle session to {peer_id}')
+            session.close()
+
+    def sweep_sessions_forever(self):
+        """Runs `sweep_sessions` and saves changed state periodically for the lifetime of the node."""
+        while True:
+            sleep(Config.post_ack_timeout / 2)
+            self.sweep_sessions()
+            self.flush_state()
+
+    def close_sessions(self):
+        """Closes all post sessions."""
+        with self.session_lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def resolve(self, peer_id: str) -> Optional[tuple[str, int]]:
+        """Returns the address of the recipient with the given peer id, querying the network if it is not cached."""
+        found, addr = self.recipient_id_map.lookup(peer_id)
+        if found:
+            return addr
+        if Config.dht:
+            addr = self.dht_lookup(dht.node_key(peer_id)).record
+            if addr is not None:
+                self.recipient_id_map.add(peer_id, addr)
+                return addr
+            # recipients that do not take part in the DHT are still found by flooding
+        for ttl, timeout in self.query_rings():
+            future = self.query(peer_id, ttl)
             try:
-                s.connect(self.recipient_id_map[peer_id])
-                # TODO encrypt chat message
-                payload = peer_id + chat_msg
-                post_msg = Message(types.MsgType.POST, self.host_addr, payload=payload)
-                logging.debug(f'Sending message of type POST to {self.recipient_id_map[peer_id]}')
-                logging.debug(f'Message printout: {post_msg}')
-                s.send(post_msg.bytes())
-            except Exception as e:
-                logging.error(f"{e}: Recipient not reachable via {self.recipient_id_map[peer_id]}")
-                self.recipient_id_map[peer_id] = None  # reset address mapping
+                return future.result(timeout=timeout)
+            except futures.TimeoutError:
+                pass
+        self.query_failed(peer_id, future)
+        return None
+
+    def new_future(self):
+        """Creates the future a pending query is completed with."""
+        return futures.Future()
+
+    @staticmethod
+    def query_rings() -> list[tuple[int, float]]:
+        """
+        Returns the TTL of each ring of a query and the seconds to wait for a query hit before sending the next one.
+        Expanding ring search starts with the direct neighbours and doubles the TTL up to the default TTL, so that
+        close recipients are found without flooding the network. Otherwise a single ring with the default TTL is sent.
+        """
+        rings = []
+        if Config.query_expanding_ring:
+            ttl = 1
+            while ttl < Config.prot_default_ttl:
+                rings.append((ttl, ttl * Config.query_ring_timeout))
+                ttl *= 2
+        rings.append((Config.prot_default_ttl, Config.query_timeout))
+        return rings
+
+    def query(self, peer_id: str, ttl: int = None):
+        """
+        Floods a query for the recipient with the given peer id up to `ttl` hops, unless a query reaching as far is
+        already in flight. Returns the future of the query which is completed with the address from the first query hit.
+        """
+        ttl = ttl or Config.prot_default_ttl
+        with self.query_lock:
+            future = self.pending_queries.get(peer_id)
+            if future is None:
+                future = self.pending_queries[peer_id] = self.new_future()
+            elif self.query_ttls[peer_id] >= ttl:
+                return future
+            self.query_ttls[peer_id] = ttl
+
+        logging.debug('Sending query with TTL %d to %d neighbours.' % (ttl, len(self.outbound_neighbours)))
+        # every ring needs a new message id, relays drop queries they have seen already
+        query_msg = Message(types.MsgType.QUERY, self.host_addr, payload=peer_id.encode('utf-8'))
+        query_msg.header.ttl = ttl
+        logging.debug('Message printout: %s', query_msg)
+        targets = self.outbound_neighbours
+        if Config.bloom:
+            targets = self.filters.route(targets, query_msg.payload, ttl)
+        for n in targets:
+            n.send(query_msg)
+        return future
+
+    def query_failed(self, peer_id: str, future):
+        """Gives up on a pending query and remembers the recipient as unreachable for a while."""
+        with self.query_lock:
+            if self.pending_queries.get(peer_id) is not future:
+                return
+            del self.pending_queries[peer_id]
+            del self.query_ttls[peer_id]
+        self.recipient_id_map.add(peer_id, None, expiry=Config.addr_cache_negative_ttl)
+        if not future.done():
+            future.set_result(None)  # release other posts waiting for the same query
+
+    def dht_connection(self, addr: tuple[str, int]) -> Peer:
+        """Returns a connection to the DHT node at `addr`, reusing the neighbour connection or an earlier one."""
+        peer = self.neighbours.outbound_to(addr)
+        if peer is not None:
+            return peer
+        with self.dht_lock:
+            entry = self.dht_peers.get(addr)
+            if entry is not None and not entry[0].closed:
+                self.dht_peers[addr] = (entry[0], monotonic())
+                return entry[0]
+        peer = Peer(addr)
+        with self.dht_lock:
+            entry = self.dht_peers.get(addr)
+            if entry is not None and not entry[0].closed:
+                peer.disconnect()  # another request connected in the meantime
+                return entry[0]
+            self.dht_peers[addr] = (peer, monotonic())
+        # answers come back over the same connection
+        Thread(target=self.reply, args=[peer]).start()
+        return peer
+
+    def close_dht_peers(self, idle_since: float = math.inf):
+        """Closes the connections opened for DHT requests that were not used since `idle_since`."""
+        with self.dht_lock:
+            idle = [addr for addr, (_, last_used) in self.dht_peers.items() if last_used <= idle_since]
+            peers = [self.dht_peers.pop(addr)[0] for addr in idle]
+        for peer in peers:
+            peer.disconnect()
+
+    def dht_request(self, peer, target: bytes) -> tuple[bytes, futures.Future]:
+        """
+        Asks the node on the other end of the connection to `peer` for its contacts closest to `target`.
+        Returns the message id of the request and the future completed with the record and contacts of the answer.
+        """
+        find_msg = Message(types.MsgType.FIND, self.host_addr, payload=dht.pack_find(self.node_key, target))
+        future = self.new_future()
+        with self.dht_lock:
+            self.dht_requests[find_msg.get_id()] = future
+        peer.send(find_msg)
+        return find_msg.get_id(), future
+
+    def dht_forget(self, msg_ids):
+        """Stops waiting for the answers to the given DHT requests."""
+        with self.dht_lock:
+            for msg_id in msg_ids:
+                self.dht_requests.pop(msg_id, None)
+
+    def dht_collect(self, lookup: Lookup, pending: dict):
+        """
+        Passes the answers to the requests of a lookup that came in to the lookup and fails the overdue ones.
+        `pending` maps the futures of the requests to their message id, contact key and deadline.
+        """
+        now = monotonic()
+        for future, (msg_id, key, deadline) in list(pending.items()):
+            if future.done():
+                lookup.on_reply(key, *future.result())
+            elif deadline <= now:
+                self.dht_forget([msg_id])
+                self.routing.remove(key)
+                lookup.on_failure(key)
+            else:
+                continue
+            del pending[future]
+
+    def dht_lookup(self, target: bytes, find_record: bool = True) -> Lookup:
+        """Runs an iterative lookup of `target` in the DHT."""
+        lookup = Lookup(self.node_key, target, self.routing.closest(target, Config.dht_k), find_record)
+        pending = {}
+        while not lookup.done:
+            for key, addr in lookup.next_batch():
                 try:
-                    s.shutdown(socket.SHUT_RDWR)
-                    s.close()
+                    msg_id, future = self.dht_request(self.dht_connection(addr), target)
                 except OSError as e:
-                    logging.warning(e)
-
-        if peer_id not in self.recipient_id_map or not self.recipient_id_map[peer_id]:
-            self.recipient_id_map[peer_id] = None
-            # We do not know the recipient's address, do a query
-            num_of_neighbours = len(self.outbound_neighbours)
-            logging.debug('Sending query to %d neighbours.' % num_of_neighbours)
-            query_msg = Message(types.MsgType.QUERY, self.host_addr, payload=peer_id)
-            logging.debug(f'Message printout: {query_msg}')
-            self.recipient_id_map[peer_id] = None
-            for n in self.outbound_neighbours:
-                n.send(query_msg)
-
-        # wait for query hit
-        sleep(3)
-        if self.recipient_id_map[peer_id]:
-            send_msg()
+                    logging.debug(f'DHT node {addr} unreachable: {e}')
+                    self.routing.remove(key)
+                    lookup.on_failure(key)
+                    continue
+                pending[future] = (msg_id, key, monotonic() + Config.dht_rpc_timeout)
+            if not pending:
+                break
+            timeout = min(deadline for _, _, deadline in pending.values()) - monotonic()
+            futures.wait(pending, timeout=max(timeout, 0), return_when=futures.FIRST_COMPLETED)
+            self.dht_collect(lookup, pending)
+        self.dht_forget([msg_id for msg_id, _, _ in pending.values()])
+        logging.debug(f'DHT lookup finished after {lookup.rounds} rounds, found record {lookup.record}')
+        return lookup
+
+    def dht_seed(self):
+        """
+        Asks all neighbours for the contacts closest to the own key, so that an empty routing table gets populated.
+        Neighbours that do not take part in the DHT do not answer.
+        """
+        requests = [self.dht_request(n, self.node_key) for n in self.outbound_neighbours + self.inbound_neighbours]
+        futures.wait([future for _, future in requests], timeout=Config.dht_rpc_timeout)
+        self.dht_forget([msg_id for msg_id, _ in requests])
+
+    def publish(self):
+        """Stores the address record of this node at the DHT nodes closest to its key, joining the DHT first if needed."""
+        if not len(self.routing):
+            self.dht_seed()
+        lookup = self.dht_lookup(self.node_key, find_record=False)
+        store_msg = Message(types.MsgType.STORE, self.host_addr, payload=self.peer_id_bytes)
+        for _, addr in lookup.closest():
+            try:
+                self.dht_connection(addr).send(store_msg)
+            except OSError as e:
+                logging.debug(f'DHT node {addr} unreachable: {e}')
+        logging.info(f'Published address record to {len(lookup.closest())} DHT nodes')
+
+    def maintain_dht_forever(self, bootstrap: Thread):
+        """Publishes the address record of this node once `bootstrap` finished and every republish interval."""
+        bootstrap.join()
+        while True:
+            self.publish()
+            sleep(Config.dht_republish_interval)
+
+    def refresh_filters(self):
+        """Subscribes to the routing filters of new outbound neighbours and sends the changes of the own one."""
+        for n in self.outbound_neighbours:
+            if self.filters.subscribe(n):
+                n.send(Message(types.MsgType.FSUB, self.host_addr))
+        for peer, deltas in self.filters.updates():
+            payload = bloom.pack_filter(deltas, Config.bloom_size, Config.bloom_hashes)
+            peer.send(Message(types.MsgType.FILTER, self.host_addr, payload=payload))
+
+    def refresh_filters_forever(self):
+        """Runs `refresh_filters` periodically for the lifetime of the node."""
+        while True:
+            self.refresh_filters()
+            sleep(Config.bloom_refresh_interval)
+
+    def shuffle_request(self, peer, target: tuple[str, int]) -> tuple[bytes, futures.Future]:
+        """
+        Offers the node on the other end of the connection to `peer` a sample of the view to swap for a sample of its
+        own. The own entry is implied by the sender of the message. Returns the message id and the future of the answer.
+        """
+        sent = self.view.sample(Config.sampling_shuffle_length - 1, exclude=target)
+        shuffle_msg = Message(types.MsgType.SHUF, self.host_addr, payload=sampling.pack_entries(sent))
+        future = self.new_future()
+        self.shuffles[shuffle_msg.get_id()] = (sent, future)
+        peer.send(shuffle_msg)
+        return shuffle_msg.get_id(), future
+
+    def shuffle(self, addr: tuple[str, int] = None) -> bool:
+        """
+        Swaps entries of the view with the node at `addr`, by default the oldest entry of the view, which is removed
+        from the view first. Returns whether the node answered in time.
+        """
+        target = addr or self.view.oldest()
+        if target is None:
+            return False
+        peer = self.neighbours.outbound_to(target)
+        opened = peer is None
+        try:
+            if opened:
+                peer = Peer(target)
+                # the answer comes back over the same connection
+                Thread(target=self.reply, args=[peer]).start()
+            msg_id, future = self.shuffle_request(peer, target)
+        except OSError as e:
+            logging.debug(f'Node {target} unreachable for shuffle: {e}')
+            self.view.remove(target)
+            return False
+        try:
+            future.result(timeout=Config.sampling_timeout)
+            return True
+        except futures.TimeoutError:
+            logging.debug(f'Node {target} did not answer shuffle in time')
+            self.shuffles.pop(msg_id, None)
+            self.view.remove(target)
+            return False
+        finally:
+            if opened:
+                peer.disconnect()
+
+    def replacement_candidates(self) -> list[tuple[str, int]]:
+        """
+        Returns the known nodes that are no outbound neighbours and not backed off from in random order, taken from
+        the view with peer sampling and from the candidates of ping-pong discovery otherwise.
+        """
+        now = monotonic()
+        connected = {n.addr for n in self.outbound_neighbours}
+        known = self.view.addrs() if Config.sampling else list(self.neighbour_candidates)
+        candidates = [addr for addr in known if addr not in connected and self.backoff.ready(addr, now)]
+        random.shuffle(candidates)
+        if Config.latency:
+            candidates.sort(key=lambda addr: self.candidate_rtts.get(addr, math.inf))
+        return candidates
+
+    def candidate_failed(self, addr: tuple[str, int]):
+        """Backs off from a neighbour candidate that could not be connected to."""
+        self.backoff.failed(addr, monotonic())
+        if Config.sampling:
+            self.view.remove(addr)
+
+    def rediscovery_due(self) -> bool:
+        """Returns whether the node still lacks neighbours and may look for new candidates, backing off while it does."""
+        now = monotonic()
+        if len(self.outbound_neighbours) >= Config.neighbours:
+            self.backoff.succeeded(None)
+            return False
+        if not self.backoff.ready(None, now):
+            return False
+        self.backoff.failed(None, now)
+        return True
+
+    def maintain_neighbours(self):
+        """
+        Connects to known nodes until there are `Config.neighbours` outbound neighbours, backing off from the
+        unreachable ones, and looks for new candidates if the known ones do not suffice.
+        """
+        for addr in self.replacement_candidates():
+            if len(self.outbound_neighbours) >= Config.neighbours:
+                break
+            try:
+                self.add_neighbour(addr)
+            except OSError as e:
+                logging.debug(f'Neighbour candidate {addr} unreachable: {e}')
+                self.candidate_failed(addr)
+        if self.rediscovery_due():
+            self.rediscover()
+
+    def rediscover(self):
+        """
+        Looks for new neighbour candidates by flooding a ping over the remaining neighbours, which the periodic
+        shuffles take care of with peer sampling. A node without any neighbour left bootstraps again.
+        """
+        if not self.outbound_neighbours:
+            if any(addr != self.host_addr for addr in self.b_addrs):
+                self.bootstrap(self.b_addrs)
+        elif not Config.sampling:
+            self.discover()
+
+    def discover(self):
+        """Floods a ping over the outbound neighbours to learn new neighbour candidates from the pongs."""
+        ping_msg = self.discovery_ping()
+        for n in self.outbound_neighbours:
+            n.send(ping_msg)
+
+    def discovery_ping(self) -> Message:
+        """Returns a new ping whose pongs are collected as neighbour candidates."""
+        ping_msg = Message(types.MsgType.PING, self.host_addr)
+        self.sent_pings.add(ping_msg.get_id(), monotonic())  # send time to measure the round-trip time of the pongs
+        return ping_msg
+
+    def rotate_neighbour(self):
+        """
+        Drops a random outbound neighbour to be replaced from the view, so that the neighbours keep following the view
+        as in Cyclon, where the view is the overlay. Nodes would otherwise only ever link to nodes that joined before
+        them, which could then never reach them.
+        """
+        outbound = self.outbound_neighbours
+        # links chosen by round-trip time stay, they are only replaced by faster ones
+        rotating = [n for n in outbound if n.addr in self.random_links] if Config.latency else outbound
+        if len(outbound) >= Config.neighbours and rotating and self.replacement_candidates():
+            self.drop_neighbour(random.choice(rotating))
+
+    def rewire_due(self) -> bool:
+        """Returns whether the next neighbour candidate should be probed for its round-trip time."""
+        if not Config.latency or monotonic() < self.last_rewire + Config.latency_rewire_interval:
+            return False
+        self.last_rewire = monotonic()
+        return True
+
+    def rewire_step(self) -> Optional[tuple[str, int]]:
+        """
+        Replaces the slowest neighbour chosen by round-trip time with the candidate probed last if the candidate is
+        faster by `Config.latency_rewire_ratio`, otherwise drops the probe. Tops up the random links from the other
+        neighbours. Returns the candidate with the lowest round-trip time of its pongs to probe next, if any.
+        """
+        outbound = self.outbound_neighbours
+        self.random_links &= {n.addr for n in outbound}
+        probe = self.neighbours.outbound_to(self.probe) if self.probe else None
+        self.probe = None
+        chosen = [n for n in outbound if n.addr not in self.random_links and n is not probe]
+        # neighbours that replaced lost random links are random picks too and not measured yet, so they come first
+        chosen.sort(key=lambda n: math.inf if n.rtt is None else n.rtt)
+        while len(self.random_links) < Config.latency_random_links and chosen:
+            self.random_links.add(chosen.pop().addr)
+        if probe is not None:
+            slowest = max((n for n in chosen if n.rtt is not None), key=lambda n: n.rtt, default=None)
+            if probe.rtt is not None and slowest is not None and probe.rtt < Config.latency_rewire_ratio * slowest.rtt:
+                logging.info(f'Replacing neighbour {slowest.addr} ({slowest.rtt * 1000:.1f}ms) '
+                             f'with {probe.addr} ({probe.rtt * 1000:.1f}ms)')
+                self.drop_neighbour(slowest)
+            else:
+                self.backoff.failed(probe.addr, monotonic())  # probe others before this one again
+                self.drop_neighbour(probe)
+        if len(self.outbound_neighbours) < Config.neighbours:
+            return None  # failed neighbours are replaced first
+        candidates = self.replacement_candidates()
+        if not candidates and not Config.sampling:
+            self.discover()  # there will be candidates to probe next time
+        return candidates[0] if candidates else None
+
+    def rewire(self):
+        """Probes a neighbour candidate for a lower round-trip time than the slowest neighbour."""
+        addr = self.rewire_step()
+        if addr is None:
             return
-        else:
-            logging.warning(f'Failed to send the message. Did not find recipient {peer_id}')
+        try:
+            if self.add_neighbour(addr):
+                self.probe = addr
+        except OSError as e:
+            logging.debug(f'Neighbour candidate {addr} unreachable: {e}')
+            self.candidate_failed(addr)
+
+    def sample_peers_forever(self, bootstrap: Thread):
+        """
+        Shuffles with the oldest node of the view and swaps a neighbour for a node of the view every
+        `Config.sampling_interval`.
+        """
+        bootstrap.join()
+        while True:
+            sleep(Config.sampling_interval)
+            self.shuffle()
+            self.rotate_neighbour()
+            self.maintain_neighbours()
+
+    def heartbeat(self):
+        """Drops the outbound neighbours that failed or are suspected to, and sends a heartbeat to the others."""
+        now = monotonic()
+        for n in self.outbound_neighbours:
+            if n.closed or self.detector.suspect(n, now):
+                logging.warning(f'Neighbour {n.addr} failed, dropping the connection')
+                self.backoff.failed(n.addr, now)
+                self.drop_neighbour(n)
+                continue
+            self.detector.watch(n, now)
+            n.send(Message(types.MsgType.BEAT, self.host_addr, payload=utils.pack_timestamp(now)))
+
+    def drop_neighbour(self, peer: Peer):
+        """Forgets an outbound neighbour that failed or is replaced and closes the connection to it."""
+        self.neighbours.remove(peer)
+        self.filters.remove(peer)
+        self.detector.remove(peer)
+        peer.disconnect()
+
+    def heartbeat_forever(self, bootstrap: Thread):
+        """Runs `heartbeat` and replaces failed neighbours every `Config.heartbeat_interval` once `bootstrap` finished."""
+        bootstrap.join()
+        while True:
+            self.heartbeat()
+            self.maintain_neighbours()
+            if self.rewire_due():
+                self.rewire()
+            sleep(Config.heartbeat_interval)
+
+    def reply(self, peer: Peer):
+        """Handles incoming requests on the connection to `peer`."""
+
+        decoder = FrameDecoder()
+        connected = True
+        while connected:
+            try:
+                n = decoder.recv_into(peer.socket)
+            except OSError:
+                n = 0
+            if n == 0:
+                logging.warning(f'Received zero bytes message. Closing socket: {peer.socket}')
+                break
+            connected = self.handle_frames(decoder, peer)
+        self.connection_lost(peer)
+        peer.disconnect()
+
+    def handle_frames(self, decoder: FrameDecoder, peer) -> bool:
+        """
+        Handles every complete frame received on the connection to `peer`.
+        Returns whether the connection should be kept open, which it is not after a malformed header.
+        """
+        try:
+            for header, frame in decoder.frames():
+                if not self.handle_frame(header, frame, peer):
+                    return False
+        except ValueError as e:
+            # the stream cannot be resynchronised after a malformed header
+            logging.error(f'Closing connection to {peer.addr}: {e}')
+            return False
+        return True
+
+    def handle_frame(self, header: Header, frame: memoryview, peer) -> bool:
+        """
+        Admits and dispatches a single frame received on the connection to `peer`.
+        Returns whether the connection should be kept open.
+        """
+        # over-limit floods are dropped before the frame is copied, decompressed or deduplicated
+        if not self.admission.admit(peer, header.msg_type, monotonic()):
+            logging.debug('Dropping message of type %s from %s: over limit', header.msg_type.name, peer.addr)
+            return True
+        msg = Message.from_frame(header, frame)
 
-    def reply(self, client: socket):
-        """Handles incoming requests."""
+        try:
+            return self.dispatch(msg, peer)
+        except Exception as e:
+            logging.exception(e)
+            return True
+        finally:
+            self.admission.done(header.msg_type)
+
+    def connection_lost(self, peer):
+        """
+        Forgets a closed connection, failing the posts still waiting for an acknowledgement on it
+        and resuming the file transfers using it.
+        """
+        self.neighbours.remove(peer)
+        self.filters.remove(peer)
+        self.detector.remove(peer)
+        self.admission.remove(peer)
+        with self.session_lock:
+            session = self.sessions.get(peer.peer_id)
+            if session is not None and session.peer is peer:
+                del self.sessions[peer.peer_id]
+            else:
+                session = None
+            interrupted = [t for t in self.transfers.values() if t.session is not None and t.session.peer is peer]
+        with self.dht_lock:
+            entry = self.dht_peers.get(peer.addr)
+            if entry is not None and entry[0] is peer:
+                del self.dht_peers[peer.addr]
+        if session is not None:
+            session.close()
+        for transfer in interrupted:
+            self.resume_transfer(transfer)
+
+    def dispatch(self, msg: Message, peer) -> bool:
+        """
+        Passes a message received on the connection to `peer` to its handler.
+        Returns whether the connection should be kept open.
+        """
+
+        logging.debug('Received message of type %s.', msg.header.msg_type.name)
+        logging.debug('Message printout: %s', msg)
+
+        if msg.header.hop_count == 0 and peer.addr != msg.get_sender():
+            # the message was not forwarded yet, so its sender is the node on the other end of this connection
+            self.neighbours.update(peer, addr=msg.get_sender())
+
+        if msg.header.codec and msg.header.msg_type != types.MsgType.SPOST:
+            try:
+                msg.payload = compression.decompress(msg.header.codec, msg.payload, compression.MAX_SIZE)
+            except ValueError as e:
+                logging.error(f'Dropping message of type {msg.header.msg_type.name}: {e}')
+                return True
 
         connected = True
-        while connected:
-            # TODO fix struct.error bug with zero bytes, occurs when
-            #  - peers (all except bootstrapping peer) shutdown via ctrl+c (from all neighbours, inbound connections)
-            #  - bootstrapping peer gets it from all the peers after some time
-            #  --> probably need to be able to identify neighbours with connections to close them properly during BYE
-            header_bytes = client.recv(16)
-            if len(header_bytes) == 0:
-                logging.warning(f'Received zero bytes message. Closing socket: {client}')
-                client.close()
-                return
-            header = Header.from_bytes(header_bytes)
-            payload = client.recv(header.length)
-            msg = Message(header.msg_type, self.host_addr)
-            msg.header = header
-            msg.payload = str(payload, 'utf-8')
-
-            logging.debug('Received message of type %s.' % msg.header.msg_type.name)
-            logging.debug(f'Message print out: {msg}')
-
-            if msg.header.msg_type == types.MsgType.PING:
-                self.handle_ping(msg)
-            elif msg.header.msg_type == types.MsgType.PONG:
-                self.handle_pong(msg)
-            elif msg.header.msg_type == types.MsgType.JOIN:
-                connected = self.handle_join(msg, client)
-            elif msg.header.msg_type == types.MsgType.JACC:
-                connected = self.handle_jacc(msg, client)
-            elif msg.header.msg_type == types.MsgType.BYE:
-                self.handle_bye(msg)
-                connected = False
-            elif msg.header.msg_type == types.MsgType.QUERY:
-                self.handle_query(msg)
-            elif msg.header.msg_type == types.MsgType.QHIT:
-                self.handle_query_hit(msg)
-            elif msg.header.msg_type == types.MsgType.POST:
-                self.handle_post(msg)
-                # TODO think about this, do we keep this open or do we only process one msg per inbound connection?
-                #  is it possible from the sender's side to use the same socket to send multiple post msgs?
-                #  and how would we signal the end of the communication?
-                connected = False
-        client.close()
-
-    def handle_ping(self, msg: Message):
-        """Handles incoming ping."""
-        if msg.get_id() in self.recv_pings:
-            logging.debug('Rejecting ping because message was already received.')
-            return
-        elif msg.get_sender() == self.host_addr:
+        if msg.header.msg_type == types.MsgType.PING:
+            self.handle_ping(msg, peer)
+        elif msg.header.msg_type == types.MsgType.PONG:
+            self.handle_pong(msg)
+        elif msg.header.msg_type == types.MsgType.JOIN:
+            connected = self.handle_join(msg, peer)
+        elif msg.header.msg_type == types.MsgType.JACC:
+            connected = self.handle_jacc(msg, peer)
+        elif msg.header.msg_type == types.MsgType.BYE:
+            self.handle_bye(msg)
+            connected = False
+        elif msg.header.msg_type == types.MsgType.QUERY:
+            self.handle_query(msg, peer)
+        elif msg.header.msg_type == types.MsgType.QHIT:
+            self.handle_query_hit(msg)
+        elif msg.header.msg_type == types.MsgType.POST:
+            # the sender keeps the connection as a session for further posts and closes it when idle
+            self.handle_post(msg, peer)
+        elif msg.header.msg_type == types.MsgType.SPOST:
+            self.handle_sealed_post(msg, peer)
+        elif msg.header.msg_type == types.MsgType.KEY:
+            self.handle_key(msg)
+        elif msg.header.msg_type == types.MsgType.ACK:
+            self.handle_ack(msg, peer)
+        elif msg.header.msg_type == types.MsgType.XFER:
+            self.handle_offer(msg, peer)
+        elif msg.header.msg_type == types.MsgType.CHUNK:
+            self.handle_chunk(msg, peer)
+        elif msg.header.msg_type == types.MsgType.XACK:
+            self.handle_transfer_ack(msg)
+        elif msg.header.msg_type == types.MsgType.FIND:
+            self.handle_find(msg, peer)
+        elif msg.header.msg_type == types.MsgType.NODES:
+            self.handle_nodes(msg)
+        elif msg.header.msg_type == types.MsgType.STORE:
+            self.handle_store(msg)
+        elif msg.header.msg_type == types.MsgType.FSUB:
+            self.handle_filter_subscription(peer)
+        elif msg.header.msg_type == types.MsgType.FILTER:
+            self.handle_filter(msg, peer)
+        elif msg.header.msg_type == types.MsgType.SHUF:
+            self.handle_shuffle(msg, peer)
+        elif msg.header.msg_type == types.MsgType.SREP:
+            self.handle_shuffle_reply(msg)
+        elif msg.header.msg_type == types.MsgType.BEAT:
+            self.handle_heartbeat(msg, peer)
+        elif msg.header.msg_type == types.MsgType.BACK:
+            self.handle_heartbeat_answer(msg, peer)
+        return connected
+
+    def stats(self) -> dict[str, dict]:
+        """Returns counters of this node for monitoring."""
+        return {
+            'recv_pings': self.recv_pings.stats(),
+            'recv_queries': self.recv_queries.stats(),
+            'sent_pings': self.sent_pings.stats(),
+            'recipient_id_map': self.recipient_id_map.stats(),
+            'bootstrap': {'time_to_ready': self.time_to_ready},
+            'filters': self.filters.stats(),
+            'sampling': {'view': len(self.view), 'shuffles': len(self.shuffles)},
+            'failure_detector': self.detector.stats(),
+            'admission': self.admission.stats(),
+            'dht': {
+                'contacts': len(self.routing),
+                'records': self.dht_records.stats(),
+                'connections': len(self.dht_peers)
+            },
+            'compression': {codec.name: codec.stats() for codec in compression.CODECS.values()},
+            'sessions': {
+                peer_id: {'unacked': len(session.unacked), 'backlog': len(session.backlog)}
+                for peer_id, session in list(self.sessions.items())
+            },
+            'outbound_neighbours': {str(n.addr): n.stats() for n in list(self.outbound_neighbours)},
+            'inbound_neighbours': {str(n.addr): n.stats() for n in list(self.inbound_neighbours)}
+        }
+
+    def add_neighbour(self, addr: tuple[str, int]) -> bool:
+        """
+        Establishes an outbound neighbour connection to `addr`.
+        Returns False if there is one already, including one established concurrently.
+        """
+        if self.neighbours.outbound_to(addr):
+            return False
+        peer = Peer(addr)
+        if not self.neighbours.add(peer, outbound=True):
+            logging.debug('Closing duplicate connection to neighbour %s:%d', *addr)
+            peer.disconnect()
+            return False
+        logging.info('Connecting to new neighbour: {}'.format(peer.addr))
+        logging.debug('Current neighbours: %s', self.outbound_neighbours)
+        # replies to our floods are routed back over this connection
+        Thread(target=self.reply, args=[peer]).start()
+        return True
+
+    def handle_ping(self, msg: Message, ingress: Peer):
+        """Handles incoming ping received on the connection to `ingress`."""
+        if msg.get_sender() == self.host_addr:
             logging.debug('Rejecting ping because we are the original sender of the message.')
             return
+        elif not self.recv_pings.add_if_absent(msg.get_id(), ingress):
+            logging.debug('Rejecting ping because message was already received.')
+            return
+
+        msg.forward()
 
-        # TODO this just saves the original sender of the ping instead of the neighbour that we got the msg from
-        self.recv_pings[msg.get_id()] = msg.get_sender()
-        msg.header.ttl -= 1
-        msg.header.hop_count += 1
-
-        if msg.header.ttl > 0 and msg.header.hop_count <= Config.prot_max_ttl and self.outbound_neighbours:
-            # forward ping to all neighbours (except the neighbour that we got the ping from)
-            num_of_neighbours = len(self.outbound_neighbours)
-            logging.debug('Forwarding ping to at most %d neighbours.' % num_of_neighbours)
-            for n in self.outbound_neighbours:
-                # Do not send the ping back to where we got it from
-                if n.addr is not msg.get_sender():
-                    # TODO we should actually compare with the peer id from the ingoing neighbour connection
-                    logging.debug(f'Sender check passed: neighbour <{n.addr}> vs. sender <{msg.get_sender()}>')
-                    logging.debug(f'Forwarding ping to {n}')
-                    n.send(msg)
-            logging.debug(f'Add {msg.get_id()}:{msg.get_sender()} to list of received pings')
-
-        # send pong to sender
-        # TODO we should know from which direct node we got the ping in order to send back the pong
-        #  msg.get_sender() is address of the original sender, not necessarily the node that sent it our way
+        if msg.header.ttl > 0 and msg.header.hop_count <= Config.prot_max_ttl:
+            self.flood(msg, ingress)
+
+        # send pong back to the neighbour we got the ping from
         if len(self.outbound_neighbours) < Config.max_connections:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sender = msg.get_sender()
-            s.connect(sender)
             pong_msg = Message(msg_type=types.MsgType.PONG, sender=self.host_addr, msg_id=msg.get_id())
-            logging.debug('Sending message of type PONG to %s:%d' % sender)
-            logging.debug(f'Message printout: {pong_msg}')
-            s.send(pong_msg.bytes())
+            ingress.send(pong_msg)
         else:
             logging.debug(f"Not sending back PONG message because: {len(self.outbound_neighbours)} outbound neighbours "
                           f">= {Config.max_connections} max connections")
@@ -299,13 +1245,28 @@ class Node(Thread):
         #  what if this peer builds a neighbour connection to the other peer
         #  but the peer does not choose this peer out of its neighbour candidates?
         #  maybe we need a handshake after all
-        if len(self.outbound_neighbours) < Config.neighbours:
+        # with peer sampling, neighbours are only picked from the view
+        if Config.sampling:
+            return
+        if len(self.outbound_neighbours) < Config.neighbours and not self.neighbours.outbound_to(msg.get_sender()):
             # TODO we really should know the peer id/ pub key of the sender and add it to Peer
-            peer = Peer(msg.get_sender())
-            # append to neighbours
-            logging.info('Connecting to new neighbour after ping: {}'.format(peer.addr))
-            self.outbound_neighbours.append(peer)
-            logging.debug(f'Current neighbours: {self.outbound_neighbours}')
+            self.add_neighbour(msg.get_sender())
+
+    def flood(self, msg: Message, ingress: Peer, peer_id=None):
+        """
+        Forwards a flood message to all outbound neighbours except the node it came from,
+        i.e. the node behind the `ingress` connection and the original sender of the message.
+        A query for `peer_id` only goes to the neighbours whose routing filter holds the recipient, if any does.
+        """
+        skip = {ingress.addr, msg.get_sender()}
+        if ingress.peer_id:
+            skip.update(n.addr for n in self.neighbours.by_peer_id(ingress.peer_id))
+        targets = [n for n in self.outbound_neighbours if n is not ingress and n.addr not in skip]
+        if Config.bloom and peer_id is not None:
+            targets = self.filters.route(targets, peer_id, msg.header.ttl)
+        logging.debug('Forwarding %s to %d neighbours.' % (msg.header.msg_type.name, len(targets)))
+        for n in targets:
+            n.send(msg)
 
     def handle_pong(self, msg: Message):
         """Handles incoming pong."""
@@ -313,38 +1274,38 @@ class Node(Thread):
         if len(self.outbound_neighbours) < Config.max_connections and msg.get_sender() != self.host_addr:
             if msg.get_sender() not in self.neighbour_candidates:
                 self.neighbour_candidates.append(msg.get_sender())
+                self.candidate_found()
             else:
-                logging.warning(f"Sender {msg.get_sender()} already sent a pong")
-
-        if msg.get_id() in self.sent_pings:
-            logging.debug('Received pong for my ping.')
+                logging.debug(f"Sender {msg.get_sender()} already sent a pong")
+
+        sent_at = self.sent_pings.get(msg.get_id())
+        if sent_at is not None:
+            # a relayed pong took the path through the relays, which says nothing about a direct link to its sender
+            if msg.header.hop_count == 0:
+                rtt = monotonic() - sent_at
+                logging.debug(f'Received pong for my ping after {rtt * 1000:.1f}ms.')
+                self.candidate_rtts[msg.get_sender()] = min(rtt, self.candidate_rtts.get(msg.get_sender(), rtt))
             return
-        elif msg.get_id() not in self.recv_pings:
+        ingress = self.recv_pings.get(msg.get_id())
+        if ingress is None:
             logging.debug(f'Rejecting pong because message id {msg.get_id()} is unknown.')
-            logging.debug(f'Sent pings: {self.sent_pings}')
-            logging.debug(f'Received pings: {self.recv_pings.keys()}')
             return
 
-        msg.header.ttl -= 1
-        msg.header.hop_count += 1
+        msg.forward()
 
-        # Reverse path routing pongs
+        # Reverse path routing pongs over the connection the ping arrived on
         if msg.header.ttl > 0 and msg.header.hop_count <= Config.prot_max_ttl:
-            # TODO route pong back via neighbour connection instead of opening a new socket
-            #  which would in turn creates a new socket on the other side and start a separate reply thread
-            #  and is only used once
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect(self.recv_pings[msg.get_id()])
-            s.send(Message(types.MsgType.PONG, msg.get_sender()).bytes())
+            ingress.send(msg)
 
-    def handle_join(self, msg: Message, client: socket.socket):
+    def handle_join(self, msg: Message, client: Peer):
         """Handles incoming join."""
         if len(self.outbound_neighbours) < Config.max_connections:
             try:
-                client.send(self.peer_id.encode('utf-8'))  # Send my id to the requesting node
-                sender_peer_id = msg.payload[:32]
+                client.socket.send(self.peer_id_bytes)  # Send my id to the requesting node
+                sender_peer_id = msg.text()
                 # mapping from client.getpeername() to peer id
-                self.inbound_neighbours.append(Peer(addr=msg.get_sender(), peer_id=sender_peer_id, s=client))
+                self.neighbours.update(client, addr=msg.get_sender(), peer_id=sender_peer_id)
+                self.neighbours.add(client, outbound=False)
             except Exception as e:
                 logging.warning(f'Handle join function failed while building inbound connection. ({e})')
                 return False
@@ -352,15 +1313,19 @@ class Node(Thread):
             s.connect(msg.get_sender())
             s.settimeout(3)
             try:
-                jacc_msg = Message(types.MsgType.JACC, self.host_addr, payload=self.peer_id)
+                jacc_msg = Message(types.MsgType.JACC, self.host_addr, payload=self.peer_id_bytes)
                 logging.debug('Sending message of type JACC to %s:%d' % msg.get_sender())
-                logging.debug(f'Message printout: {jacc_msg}')
+                logging.debug('Message printout: %s', jacc_msg)
                 s.send(jacc_msg.bytes())
-                peer_id = s.recv(1024).decode('utf-8')[:32]
+                peer_id = s.recv(1024).decode('utf-8')
                 if peer_id == sender_peer_id:
+                    s.settimeout(None)
                     # mapping from Peer.socket.getpeername() to peer id
-                    self.outbound_neighbours.append(Peer(addr=msg.get_sender(), peer_id=sender_peer_id, s=s))
-                    return True
+                    peer = Peer(addr=msg.get_sender(), peer_id=sender_peer_id, s=s)
+                    if self.neighbours.add(peer, outbound=True):
+                        Thread(target=self.reply, args=[peer]).start()
+                        return True
+                    logging.debug('Closing duplicate connection to neighbour %s:%d', *msg.get_sender())
             except Exception as e:
                 logging.warning(f'Handle join function failed while building outbound connection. ({e})')
 
@@ -372,12 +1337,14 @@ class Node(Thread):
                 logging.warning(e)
         return False
 
-    def handle_jacc(self, msg: Message, client: socket.socket):
+    def handle_jacc(self, msg: Message, client: Peer):
         try:
-            client.send(self.peer_id.encode('utf-8'))  # Send my id to the requesting node
-            sender_peer_id = msg.payload[:32]
+            client.socket.send(self.peer_id_bytes)  # Send my id to the requesting node
+            sender_peer_id = msg.text()
             # mapping from client.getpeername() to peer id
-            self.inbound_neighbours.append(Peer(addr=msg.get_sender(), peer_id=sender_peer_id, s=client))
+            self.neighbours.update(client, addr=msg.get_sender(), peer_id=sender_peer_id)
+            self.neighbours.add(client, outbound=False)
+            return True
         except Exception as e:
             logging.warning(f'Handle join function failed while building inbound connection. ({e})')
             return False
@@ -385,84 +1352,239 @@ class Node(Thread):
     def handle_bye(self, msg: Message):
         """Handles incoming bye."""
 
-        for n in self.outbound_neighbours:
-            if n.addr == msg.get_sender():
-                # this closes the outgoing connection
-                self.outbound_neighbours.remove(n)
-                n.disconnect()
-                break
+        n = self.neighbours.outbound_to(msg.get_sender())
+        if n is not None and self.neighbours.remove(n):
+            # this closes the outgoing connection
+            n.disconnect()
 
-    def handle_query(self, msg: Message):
-        """Handles incoming query."""
-        if msg.get_id() in self.recv_queries:
-            logging.debug('Rejecting query because message was already received.')
-            return
-        elif msg.get_sender() == self.host_addr:
+    def handle_query(self, msg: Message, ingress: Peer):
+        """Handles incoming query received on the connection to `ingress`."""
+        if msg.get_sender() == self.host_addr:
             logging.debug('Rejecting query because we are the original sender of the message.')
             return
-        # TODO this just saves the original sender of the query instead of the neighbour that we got the msg from
-        self.recv_queries[msg.get_id()] = msg.get_sender()
-
-        # Compare recipient public key with own public key, if no match forward to neighbours
-        recipient_pub_key = utils.peer_id_to_pub_key(msg.payload)
-        if recipient_pub_key.n == self.pub_key.n and recipient_pub_key.e == self.pub_key.e:
-            # TODO sends query hit directly to sender, in reality we should do reverse path routing
-            #  find out from which neighbour we got it the query and route it back to them
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sender = msg.get_sender()
-            s.connect(sender)
-            qhit_msg = Message(types.MsgType.QHIT, self.host_addr, payload=self.peer_id)
-            logging.debug('Sending message of type QHIT to %s:%d' % sender)
-            logging.debug(f'Message printout: {qhit_msg}')
-            s.send(qhit_msg.bytes())
+        elif not self.recv_queries.add_if_absent(msg.get_id(), ingress):
+            logging.debug('Rejecting query because message was already received.')
+            return
+
+        # Compare recipient peer id with own peer id, if no match forward to neighbours.
+        # Peer ids are the canonical encoding of the public key, so there is no need to parse the key.
+        if msg.payload == self.peer_id_bytes:
+            # route the query hit back to the neighbour we got the query from
+            qhit_msg = Message(types.MsgType.QHIT, self.host_addr, msg_id=msg.get_id(), payload=self.peer_id_bytes)
+            ingress.send(qhit_msg)
         else:
-            msg.header.ttl -= 1
-            msg.header.hop_count += 1
-            if msg.header.ttl > 0 and msg.header.hop_count <= Config.prot_max_ttl and self.outbound_neighbours:
-                # forward query to all neighbours (except the neighbour that we got the query from)
-                num_of_neighbours = len(self.outbound_neighbours)
-                logging.debug('Forwarding query to at most %d neighbours.' % num_of_neighbours)
-                for n in self.outbound_neighbours:
-                    # Do not send the query back to where we got it from
-                    if n.addr is not msg.get_sender():
-                        # TODO we should actually compare with the peer id from the ingoing neighbour connection
-                        logging.debug(f'Sender check passed: neighbour <{n.addr}> vs. sender <{msg.get_sender()}>')
-                        logging.debug(f'Forwarding query to {n}')
-                        n.send(msg)
-                logging.debug(f'Add {msg.get_id()}:{msg.get_sender()} to list of received queries')
+            msg.forward()
+            if msg.header.ttl > 0 and msg.header.hop_count <= Config.prot_max_ttl:
+                self.flood(msg, ingress, msg.payload)
 
     def handle_query_hit(self, msg: Message):
         """Handles incoming query hit."""
-        # Case 1: we are the sender
-        # Start a connection to the recipient and start posting messages
-        peer_id = msg.payload[:32]
-        if peer_id in self.recipient_id_map:
-            self.recipient_id_map[peer_id] = msg.get_sender()
-            logging.debug(f'Update recipient id to address mapping: {peer_id}<-{msg.get_sender()}')
+        # Case 1: we are not the sender, reverse path routing to sender without looking at the payload
+        ingress = self.recv_queries.get(msg.get_id())
+        if ingress is not None:
+            msg.forward()
+            # Reverse path routing query hit over the connection the query arrived on
+            if msg.header.ttl > 0 and msg.header.hop_count <= Config.prot_max_ttl:
+                ingress.send(msg)
             return
 
-        # Case 2: we are not the sender, reverse path routing to sender
-        if msg.get_id() not in self.recv_queries:
+        # Case 2: we are the sender
+        # Complete the pending query so that waiting posts are sent right away
+        peer_id = msg.text()
+        with self.query_lock:
+            future = self.pending_queries.pop(peer_id, None)
+            self.query_ttls.pop(peer_id, None)
+        if future is None:
             logging.debug('Rejecting query hit because message id is unknown.')
             return
+        self.recipient_id_map.add(peer_id, msg.get_sender())
+        logging.debug(f'Update recipient id to address mapping: {peer_id}<-{msg.get_sender()}')
+        if not future.done():
+            future.set_result(msg.get_sender())
+        # written by the periodic sweep, not for every hit
+        self.state_dirty = True
+
+    def handle_post(self, msg: Message, ingress: Peer):
+        """Handles incoming post received on the session connection `ingress` and acknowledges it."""
+        peer_id = msg.payload[:len(self.peer_id_bytes)]
+        if peer_id != self.peer_id_bytes:
+            logging.error(f"Peer ID mismatch: recipient <{str(peer_id, 'utf-8', 'replace')}> vs. own <{self.peer_id}>")
+            return
+        msg_content = str(msg.payload[len(self.peer_id_bytes):], 'utf-8', 'replace')
+        logging.info(f"Message content: <{msg_content}>")
+        ingress.send(Message(types.MsgType.ACK, self.host_addr, msg_id=msg.get_id(), payload=self.accepted_codecs))
 
-        msg.header.ttl -= 1
-        msg.header.hop_count += 1
-
-        # Reverse path routing query hit
-        if msg.header.ttl > 0 and msg.header.hop_count <= Config.prot_max_ttl:
-            # TODO route query hit back via neighbour connection instead of opening a new socket
-            #  which in turn creates a new socket on the other side and starts a separate reply thread
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect(self.recv_queries[msg.get_id()])
-            s.send(msg.bytes())
+    def handle_sealed_post(self, msg: Message, ingress: Peer):
+        """Handles incoming encrypted post received on the session connection `ingress` and acknowledges it."""
+        try:
+            plaintext = self.keyring.open(msg.payload)
+        except DecryptionError as e:
+            logging.error(f'Cannot decrypt message: {e}')
+            return
+        if msg.header.codec:
+            try:
+                plaintext = compression.decompress(msg.header.codec, plaintext, compression.MAX_SIZE)
+            except ValueError as e:
+                logging.error(f'Cannot decompress message: {e}')
+                return
+        logging.info(f"Message content: <{str(plaintext, 'utf-8', 'replace')}>")
+        ingress.send(Message(types.MsgType.ACK, self.host_addr, msg_id=msg.get_id(), payload=self.accepted_codecs))
 
-    def handle_post(self, msg: Message):
-        """Handles incoming post."""
-        peer_id = msg.payload[:24]
+    def handle_key(self, msg: Message):
+        """Handles incoming session key for the encrypted posts that follow."""
+        try:
+            self.keyring.receive(msg.payload)
+        except DecryptionError as e:
+            logging.error(f'Cannot decrypt session key: {e}')
+
+    def handle_ack(self, msg: Message, ingress: Peer):
+        """Handles incoming acknowledgement of a post sent over the session connection `ingress`."""
+        with self.session_lock:
+            session = self.sessions.get(ingress.peer_id)
+        if session is None or session.peer is not ingress or not session.ack(msg.get_id()):
+            logging.debug(f'Ignoring acknowledgement of unknown post {msg.get_id()}')
+            return
+        if not session.negotiated:
+            session.compressor = compression.Compressor.negotiate(bytes(msg.payload))
+            session.negotiated = True
+
+    def handle_offer(self, msg: Message, ingress: Peer):
+        """Handles incoming offer of a file transfer and tells the sender which chunk to continue with."""
+        transfer_id, chunk_size, peer_id, name = stream.unpack_offer(msg.payload)
+        name = os.path.basename(name)
         if peer_id != self.peer_id:
             logging.error(f"Peer ID mismatch: recipient <{peer_id}> vs. own <{self.peer_id}>")
             return
-        msg_content = msg.payload[24:]
-        # TODO Decrypt message, fails if there are not enough bytes
-        logging.info(f"Message content: <{msg_content}>")
+        if not 0 < chunk_size <= stream.MAX_CHUNK_SIZE or name in ('', '.', '..'):
+            logging.error(f'Rejecting transfer of file <{name}> with chunk size {chunk_size}')
+            return
+        with self.session_lock:
+            incoming = self.incoming.get(transfer_id)
+            if incoming is None:
+                try:
+                    incoming = self.incoming[transfer_id] = IncomingTransfer(
+                        transfer_id, name, chunk_size, Config.transfer_dir
+                    )
+                except OSError as e:
+                    logging.error(f'Cannot receive file <{name}>: {e}')
+                    return
+        logging.info(f'Receiving file <{name}> from chunk {incoming.next_seq}')
+        ack_payload = stream.pack_ack(transfer_id, incoming.next_seq) + self.accepted_codecs
+        ingress.send(Message(types.MsgType.XACK, self.host_addr, payload=ack_payload))
+
+    def handle_chunk(self, msg: Message, ingress: Peer):
+        """Handles incoming chunk of a file transfer and acknowledges it."""
+        transfer_id, seq, last, data = stream.unpack_chunk(msg.payload)
+        with self.session_lock:
+            incoming = self.incoming.get(transfer_id)
+        if incoming is None:
+            logging.debug(f'Ignoring chunk of unknown transfer {transfer_id.hex()}')
+            return
+        next_seq = incoming.write(seq, last, data)
+        if incoming.done:
+            with self.session_lock:
+                self.incoming.pop(transfer_id, None)
+            logging.info(f'Received file <{incoming.path}>')
+        ack_payload = stream.pack_ack(transfer_id, next_seq) + self.accepted_codecs
+        ingress.send(Message(types.MsgType.XACK, self.host_addr, payload=ack_payload))
+
+    def handle_transfer_ack(self, msg: Message):
+        """Handles incoming acknowledgement of a file transfer by sending the next chunks."""
+        transfer_id, next_seq = stream.unpack_ack(msg.payload)
+        with self.session_lock:
+            transfer = self.transfers.get(transfer_id)
+        if transfer is None:
+            logging.debug(f'Ignoring acknowledgement of unknown transfer {transfer_id.hex()}')
+            return
+        transfer.on_ack(next_seq, bytes(msg.payload[stream.ACK_STRUCT.size:]))
+
+    def handle_find(self, msg: Message, ingress: Peer):
+        """Answers a DHT request with the record of the target key, if known, and the closest contacts to it."""
+        if not Config.dht:
+            return  # nodes outside the DHT stay silent, so they never end up in routing tables
+        sender_key, target = dht.unpack_find(msg.payload)
+        self.routing.update(sender_key, msg.get_sender())
+        if target == self.node_key:
+            record = self.host_addr
+        else:
+            found, record = self.dht_records.lookup(target)
+            if not found:
+                record = self.routing.get(target)
+        payload = dht.pack_nodes(self.node_key, record, self.routing.closest(target, Config.dht_k))
+        ingress.send(Message(types.MsgType.NODES, self.host_addr, msg_id=msg.get_id(), payload=payload))
+
+    def handle_nodes(self, msg: Message):
+        """Handles the answer to a DHT request."""
+        sender_key, record, contacts = dht.unpack_nodes(msg.payload)
+        self.routing.update(sender_key, msg.get_sender())
+        with self.dht_lock:
+            future = self.dht_requests.pop(msg.get_id(), None)
+        if future is None:
+            logging.debug(f'Ignoring late answer to DHT request {msg.get_id()}')
+        elif not future.done():
+            future.set_result((record, contacts))
+
+    def handle_store(self, msg: Message):
+        """
+        Stores the address record of the sender under the key of its peer id. Records are not authenticated,
+        but a forged address only makes posts fail, since they are encrypted for the owner of the peer id.
+        """
+        if not Config.dht:
+            return
+        key = dht.node_key(bytes(msg.payload))
+        self.routing.update(key, msg.get_sender())
+        self.dht_records.add(key, msg.get_sender())
+
+    def handle_filter_subscription(self, ingress: Peer):
+        """Starts sending the changes of the own routing filter to the node on the other end of `ingress`."""
+        if Config.bloom:
+            self.filters.add_subscriber(ingress)
+
+    def handle_filter(self, msg: Message, ingress: Peer):
+        """Applies an update of the routing filter of the outbound neighbour behind `ingress`."""
+        try:
+            deltas = bloom.unpack_filter(msg.payload)
+        except ValueError as e:
+            logging.warning(f'Ignoring routing filter of {ingress.addr}: {e}')
+            return
+        self.filters.apply(ingress, deltas)
+
+    def handle_shuffle(self, msg: Message, ingress: Peer):
+        """Answers a shuffle with a sample of the view and merges the entries offered, including one for the sender."""
+        if not Config.sampling:
+            return  # nodes without a view stay silent, the sender drops them from its view
+        received = [(msg.get_sender(), 0)] + sampling.unpack_entries(msg.payload)
+        sent = self.view.sample(Config.sampling_shuffle_length, exclude=msg.get_sender())
+        payload = sampling.pack_entries(sent)
+        ingress.send(Message(types.MsgType.SREP, self.host_addr, msg_id=msg.get_id(), payload=payload))
+        self.view.merge(received, sent)
+
+    def handle_shuffle_reply(self, msg: Message):
+        """Merges the entries of the answer to a shuffle into the view, replacing the entries sent."""
+        sent, future = self.shuffles.pop(msg.get_id(), (None, None))
+        if future is None:
+            logging.debug(f'Ignoring late answer to shuffle {msg.get_id()}')
+            return
+        self.view.merge(sampling.unpack_entries(msg.payload), sent)
+        if not future.done():
+            future.set_result(True)
+
+    def handle_heartbeat(self, msg: Message, ingress: Peer):
+        """
+        Answers a heartbeat over the connection it arrived on, whether or not heartbeats are enabled. A node lacking
+        neighbours keeps the sender as a candidate, since it is alive and the ping-pong discovery only reaches nodes
+        downstream of the own outbound neighbours.
+        """
+        ingress.send(Message(types.MsgType.BACK, self.host_addr, msg_id=msg.get_id(), payload=msg.payload))
+        sender = msg.get_sender()
+        if len(self.outbound_neighbours) < Config.neighbours and not self.neighbours.outbound_to(sender):
+            self.keep_candidates([sender])
+
+    def handle_heartbeat_answer(self, msg: Message, ingress: Peer):
+        """Records that the outbound neighbour behind `ingress` is alive and how long the heartbeat took."""
+        now = monotonic()
+        self.detector.heartbeat(ingress, now)
+        self.backoff.succeeded(ingress.addr)
+        sent_at = utils.unpack_timestamp(msg.payload)
+        if sent_at is not None:
+            ingress.sample_rtt(now - sent_at)
@@ -1,7 +1,14 @@
 import logging
+from collections import deque
+from threading import Condition, Thread
 from p2p_messenger.protocol.message import Message
 import socket
-from ..protocol import utils
+from typing import Optional
+from ..config import Config
+from ..protocol import types, utils
+
+RTT_GAIN = 0.125
+"""Weight of a new round-trip time sample in the smoothed round-trip time of a connection, as in TCP."""
 
 
 class Peer:
@@ -12,7 +19,6 @@ class Peer:
 		s: socket.socket = None
 	):
 		self.peer_id = peer_id
-		self.pub_key = utils.peer_id_to_pub_key(self.peer_id) if peer_id else None
 		self.addr = addr
 
 		if s:
@@ -24,23 +30,137 @@ class Peer:
 			logging.debug(f"Established peer connection to node {self.peer_id} with address: {self.addr}")
 			logging.debug(f"Socket printout: {self.socket}")
 
+		# the writer batches queued messages itself, Nagle's algorithm would only hold back acknowledgements
+		self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 		self.sock_name = self.socket.getsockname()
 		self.peer_name = self.socket.getpeername()
 
+		self.control_queue: deque[bytes] = deque()
+		"""Outbound control messages, written before any flood message."""
+
+		self.flood_queue: deque[bytes] = deque()
+		"""Outbound flood messages, dropped first when the queue is full."""
+
+		self.queued_bytes = 0
+		"""Number of bytes waiting in both outbound queues."""
+
+		self.dropped_flood = 0
+		"""Number of flood messages dropped because the outbound queue was full."""
+
+		self.dropped_control = 0
+		"""Number of control messages dropped because the outbound queue was full or the connection failed."""
+
+		self.closed = False
+		"""Whether the connection was disconnected or failed, in which case nothing is sent anymore."""
+
+		self.rtt: Optional[float] = None
+		"""Smoothed round-trip time of the heartbeats over this connection in seconds, None until the first answer."""
+
+		self._queue_changed = Condition()
+		self._writer: Thread = None
+
+	@property
+	def pub_key(self):
+		"""Public key of the peer, parsed from its peer id on first use."""
+		return utils.peer_id_to_pub_key(self.peer_id) if self.peer_id else None
+
 	def __repr__(self) -> str:
 		return format('Peer connection %s, socket printout %s' % (str(self.addr), self.socket))
 
+	def sample_rtt(self, rtt: float):
+		"""Folds a round-trip time sample into the smoothed round-trip time."""
+		self.rtt = rtt if self.rtt is None else self.rtt + RTT_GAIN * (rtt - self.rtt)
+
 	def send(self, msg: Message):
-		logging.debug("Sending message of type %s to %s:%d" % (msg.header.msg_type.name, self.addr[0], self.addr[1]))
-		logging.debug(f"Message printout: {msg}")
-		logging.debug(f"Socket printout: {self.socket}")
-		self.socket.send(msg.bytes())
+		"""
+		Queues a message to be written by the writer thread of this connection without blocking.
+		If the queue is full, flood messages are dropped to make room for control messages.
+		"""
+		logging.debug('Sending message of type %s to %s:%d', msg.header.msg_type.name, *self.addr)
+		logging.debug('Message printout: %s', msg)
+		data = msg.bytes()
+		is_flood = msg.header.msg_type in types.FLOOD_TYPES
+		with self._queue_changed:
+			if self.closed:
+				logging.debug(
+					'Dropping message of type %s: connection to %s is closed', msg.header.msg_type.name, self.addr
+				)
+				self.dropped_control += not is_flood
+				self.dropped_flood += is_flood
+				return
+			if self.queued_bytes + len(data) > Config.send_queue_bytes:
+				if is_flood:
+					self.dropped_flood += 1
+					return
+				while self.flood_queue and self.queued_bytes + len(data) > Config.send_queue_bytes:
+					self.queued_bytes -= len(self.flood_queue.popleft())
+					self.dropped_flood += 1
+				if self.queued_bytes + len(data) > Config.send_queue_bytes:
+					logging.warning(f"Dropping message of type {msg.header.msg_type.name}: send queue to {self.addr} is full")
+					self.dropped_control += 1
+					return
+			(self.flood_queue if is_flood else self.control_queue).append(data)
+			self.queued_bytes += len(data)
+			if self._writer is None:
+				self._writer = Thread(target=self._write, daemon=True)
+				self._writer.start()
+			self._queue_changed.notify()
+
+	def _write(self):
+		"""Writes queued messages to the socket, batching everything queued so far into a single syscall."""
+		while True:
+			with self._queue_changed:
+				while not self.control_queue and not self.flood_queue and not self.closed:
+					self._queue_changed.wait()
+				if not self.control_queue and not self.flood_queue:
+					return
+				batch = list(self.control_queue) + list(self.flood_queue)
+				self.control_queue.clear()
+				self.flood_queue.clear()
+				self.queued_bytes = 0
+			try:
+				self._send_all(batch)
+			except OSError as e:
+				logging.debug(f"Connection to {self.addr} failed while sending: {e}")
+				with self._queue_changed:
+					self.closed = True
+					self.dropped_control += len(self.control_queue)
+					self.dropped_flood += len(self.flood_queue)
+					self.control_queue.clear()
+					self.flood_queue.clear()
+					self.queued_bytes = 0
+				return
+
+	def _send_all(self, batch: list[bytes]):
+		"""Writes all buffers of `batch`, continuing after partial sends."""
+		while batch:
+			sent = self.socket.sendmsg(batch)
+			while batch and sent >= len(batch[0]):
+				sent -= len(batch[0])
+				batch.pop(0)
+			if sent:
+				batch[0] = memoryview(batch[0])[sent:]
+
+	def stats(self) -> dict[str, int]:
+		"""Returns outbound queue depth and drop counters of this connection."""
+		return {
+			'queued_bytes': self.queued_bytes,
+			'dropped_flood': self.dropped_flood,
+			'dropped_control': self.dropped_control
+		}
 
 	def disconnect(self):
+		"""Closes the connection after writing the messages already queued."""
 		logging.debug("Disconnecting %s:%d" % self.addr)
 		logging.debug(self.socket)
+		with self._queue_changed:
+			self.closed = True
+			self._queue_changed.notify()
+			writer = self._writer
+		if writer is not None and writer.is_alive():
+			writer.join(Config.send_flush_timeout)
 		try:
 			self.socket.shutdown(socket.SHUT_RDWR)
 			self.socket.close()
 		except OSError as e:
-			logging.warning(e)
+			logging.debug(e)
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from ..config import Config
+from ..protocol import dht
+
+Contact = tuple[bytes, tuple[str, int]]
+"""Key and address of a node taking part in the DHT."""
+
+
+class RoutingTable:
+	"""
+	Kademlia routing table of the DHT, kept alongside the neighbour connections.
+
+	Contacts are sorted into one k-bucket per bit of XOR distance to the own key, each holding at most `Config.dht_k`
+	contacts with the most recently seen last. A full bucket keeps its contacts, since long-lived nodes are the most
+	likely to stay, and remembers the newcomer as a replacement for the first contact that fails.
+	"""
+
+	def __init__(self, own_key: bytes):
+		self.own_key = own_key
+		self.buckets: list[OrderedDict[bytes, tuple[str, int]]] = [OrderedDict() for _ in range(dht.KEY_BITS)]
+		self.replacements: list[OrderedDict[bytes, tuple[str, int]]] = [OrderedDict() for _ in range(dht.KEY_BITS)]
+		self._lock = Lock()
+
+	def __len__(self) -> int:
+		return sum(len(bucket) for bucket in self.buckets)
+
+	def _index(self, key: bytes) -> int:
+		return dht.distance(self.own_key, key).bit_length() - 1
+
+	def update(self, key: bytes, addr: tuple[str, int]):
+		"""Records that the node with the given key was seen at `addr`."""
+		if key == self.own_key:
+			return
+		index = self._index(key)
+		with self._lock:
+			bucket = self.buckets[index]
+			if key in bucket or len(bucket) < Config.dht_k:
+				bucket[key] = addr
+				bucket.move_to_end(key)
+			else:
+				replacements = self.replacements[index]
+				replacements[key] = addr
+				replacements.move_to_end(key)
+				if len(replacements) > Config.dht_k:
+					replacements.popitem(last=False)
+
+	def remove(self, key: bytes):
+		"""Drops a contact that did not respond, replacing it with the most recently seen replacement."""
+		index = self._index(key)
+		with self._lock:
+			bucket = self.buckets[index]
+			if bucket.pop(key, None) is not None and self.replacements[index]:
+				replacement, addr = self.replacements[index].popitem()
+				bucket[replacement] = addr
+
+	def closest(self, target: bytes, count: int) -> list[Contact]:
+		"""Returns up to `count` contacts closest to `target`, closest first."""
+		with self._lock:
+			contacts = [contact for bucket in self.buckets for contact in bucket.items()]
+		contacts.sort(key=lambda contact: dht.distance(contact[0], target))
+		return contacts[:count]
+
+	def get(self, key: bytes) -> Optional[tuple[str, int]]:
+		"""Returns the address of the contact with the given key, or None."""
+		with self._lock:
+			return self.buckets[self._index(key)].get(key) if key != self.own_key else None
+
+
+class Lookup:
+	"""
+	Iterative lookup of a key, converging on the `Config.dht_k` nodes closest to it in O(log N) rounds.
+
+	The lookup asks up to `Config.dht_alpha` of the closest known contacts at a time for contacts even closer to
+	the target, until the closest contacts have all been asked. A lookup for a record stops early once a node returns
+	the address of the target. The lookup does not do any I/O, it is driven by the node, so it works with both engines.
+	"""
+
+	def __init__(self, own_key: bytes, target: bytes, contacts: list[Contact], find_record: bool = True):
+		self.own_key = own_key
+		self.target = target
+
+		self.find_record = find_record
+		"""Whether the lookup stops at the record of the target, rather than finding the nodes to store it at."""
+
+		self.candidates: dict[bytes, tuple[str, int]] = dict(contacts)
+		"""Contacts learned so far, by key."""
+
+		self.queried: set[bytes] = set()
+		"""Keys of the contacts asked already."""
+
+		self.responded: set[bytes] = set()
+		"""Keys of the contacts that answered."""
+
+		self.failed: set[bytes] = set()
+		"""Keys of the contacts that did not answer, which are not taken up again when other contacts return them."""
+
+		self.in_flight = 0
+		"""Number of requests without answer or failure."""
+
+		self.record: Optional[tuple[str, int]] = self.candidates.get(target)
+		"""Address of the node with the target key, once found."""
+
+		self.rounds = 0
+		"""Number of batches of requests sent."""
+
+	def _closest(self) -> list[bytes]:
+		return sorted(self.candidates, key=lambda key: dht.distance(key, self.target))[:Config.dht_k]
+
+	def next_batch(self) -> list[Contact]:
+		"""Returns the contacts to ask next and counts them as in flight."""
+		batch = []
+		for key in self._closest():
+			if self.in_flight + len(batch) >= Config.dht_alpha:
+				break
+			if key not in self.queried:
+				self.queried.add(key)
+				batch.append((key, self.candidates[key]))
+		self.in_flight += len(batch)
+		self.rounds += bool(batch)
+		return batch
+
+	def on_reply(self, key: bytes, record: Optional[tuple[str, int]], contacts: list[Contact]):
+		"""Merges the answer of the contact with the given key."""
+		self.in_flight -= 1
+		self.responded.add(key)
+		for contact_key, addr in contacts:
+			if contact_key != self.own_key and contact_key not in self.failed:
+				self.candidates.setdefault(contact_key, addr)
+		self.record = record or self.record or self.candidates.get(self.target)
+
+	def on_failure(self, key: bytes):
+		"""Forgets a contact that did not answer in time."""
+		self.in_flight -= 1
+		self.failed.add(key)
+		self.candidates.pop(key, None)
+
+	@property
+	def done(self) -> bool:
+		"""Whether the record was found or the closest contacts were all asked and answered or failed."""
+		if self.find_record and self.record is not None:
+			return True
+		return self.in_flight == 0 and all(key in self.queried for key in self._closest())
+
+	def closest(self) -> list[Contact]:
+		"""Returns the closest contacts that answered, closest first."""
+		return [(key, self.candidates[key]) for key in self._closest() if key in self.responded]
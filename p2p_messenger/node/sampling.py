@@ -0,0 +1,76 @@
+import random
+from threading import Lock
+from typing import Optional
+
+from ..config import Config
+
+Entry = tuple[tuple[str, int], int]
+"""Address of a node and the number of shuffles since the entry was created by that node."""
+
+
+class PartialView:
+	"""
+	Small random sample of the nodes in the network, maintained by periodic shuffles in the style of Cyclon.
+
+	In every shuffle a node drops its oldest entry and swaps a few entries with that node, so entries of departed
+	nodes age out, while every node keeps reappearing in the views of others with the fresh entry it hands out itself.
+	Neighbours are picked from the view, so joining and healing cost every node a constant number of messages.
+	"""
+
+	def __init__(self, own_addr: tuple[str, int]):
+		self.own_addr = own_addr
+		self.entries: dict[tuple[str, int], int] = {}
+		"""Addresses in the view mapped to their age."""
+		self._lock = Lock()
+
+	def __len__(self) -> int:
+		return len(self.entries)
+
+	def add(self, addrs: list[tuple[str, int]]):
+		"""Adds fresh entries, e.g. the bootstrapping peers, as long as the view has room."""
+		with self._lock:
+			for addr in addrs:
+				if addr != self.own_addr and len(self.entries) < Config.sampling_view_size:
+					self.entries.setdefault(addr, 0)
+
+	def remove(self, addr: tuple[str, int]):
+		"""Drops the entry of a node that turned out to be unreachable."""
+		with self._lock:
+			self.entries.pop(addr, None)
+
+	def addrs(self) -> list[tuple[str, int]]:
+		"""Returns the addresses in the view."""
+		with self._lock:
+			return list(self.entries)
+
+	def oldest(self) -> Optional[tuple[str, int]]:
+		"""Ages all entries and removes and returns the oldest one, which is the next node to shuffle with."""
+		with self._lock:
+			if not self.entries:
+				return None
+			for addr in self.entries:
+				self.entries[addr] += 1
+			addr = max(self.entries, key=self.entries.get)
+			del self.entries[addr]
+			return addr
+
+	def sample(self, count: int, exclude: tuple[str, int] = None) -> list[Entry]:
+		"""Returns up to `count` random entries, leaving out the node at `exclude`."""
+		with self._lock:
+			entries = [(addr, age) for addr, age in self.entries.items() if addr != exclude]
+		return random.sample(entries, min(count, len(entries)))
+
+	def merge(self, received: list[Entry], sent: list[Entry]):
+		"""Adds the entries received in a shuffle, filling free slots first and then replacing the entries sent."""
+		with self._lock:
+			replaceable = [addr for addr, _ in sent if addr in self.entries]
+			for addr, age in received:
+				if addr == self.own_addr:
+					continue
+				if addr in self.entries:
+					self.entries[addr] = min(self.entries[addr], age)
+				elif len(self.entries) < Config.sampling_view_size:
+					self.entries[addr] = age
+				elif replaceable:
+					del self.entries[replaceable.pop()]
+					self.entries[addr] = age
@@ -0,0 +1,104 @@
+import logging
+from collections import OrderedDict, deque
+from concurrent import futures
+from threading import Lock
+from time import monotonic
+
+from ..config import Config
+from ..protocol import Message
+from ..protocol.compression import Compressor
+
+
+class PostSession:
+	"""
+	Direct connection to a single recipient carrying any number of POST messages.
+
+	At most `Config.post_window` posts are in flight without an ACK, further posts wait in a backlog and are sent as
+	ACKs come in. Each post is completed with True once it was acknowledged or with False if it could not be delivered.
+	The session does not block, so it can be driven by threads as well as by an event loop.
+	"""
+
+	def __init__(self, peer):
+		self.peer = peer
+		"""Connection to the recipient."""
+
+		self.unacked: OrderedDict[bytes, tuple[float, futures.Future]] = OrderedDict()
+		"""Message IDs of posts in flight mapped to their ACK deadline and future, oldest first."""
+
+		self.backlog: deque[tuple[Message, futures.Future]] = deque()
+		"""Posts waiting for a free slot in the window."""
+
+		self.last_active = monotonic()
+		"""Time of the last post or ACK."""
+
+		self.closed = False
+		"""Whether the session was closed, in which case further posts fail right away."""
+
+		self.key_id: bytes = None
+		"""Id of the session key handed to the recipient over this connection."""
+
+		self.compressor: Compressor = None
+		"""Compressor for posts to the recipient, or None if it accepts none of our codecs or did not tell yet."""
+
+		self.negotiated = False
+		"""Whether the recipient told which codecs it accepts, which it does with every acknowledgement."""
+
+		self._lock = Lock()
+
+	def post(self, msg: Message) -> futures.Future:
+		"""Sends `msg` or queues it until the window has room. Returns the future completed on delivery."""
+		future = futures.Future()
+		with self._lock:
+			if self.closed:
+				future.set_result(False)
+			elif len(self.backlog) >= Config.post_backlog:
+				logging.warning(f'Dropping post to {self.peer.addr}: {len(self.backlog)} posts are waiting already')
+				future.set_result(False)
+			elif len(self.unacked) < Config.post_window:
+				self._send(msg, future)
+			else:
+				self.backlog.append((msg, future))
+		return future
+
+	def ack(self, msg_id: bytes) -> bool:
+		"""Completes the post with the given message ID and fills the window. Returns whether the post was in flight."""
+		with self._lock:
+			entry = self.unacked.pop(msg_id, None)
+			if entry is None:
+				return False
+			self.last_active = monotonic()
+			while self.backlog and len(self.unacked) < Config.post_window:
+				self._send(*self.backlog.popleft())
+		entry[1].set_result(True)
+		return True
+
+	def expired(self, now: float) -> bool:
+		"""Returns whether the session should be closed because an ACK is overdue or the session is idle."""
+		with self._lock:
+			if self.unacked:
+				deadline, _ = next(iter(self.unacked.values()))
+				return deadline <= now
+			return not self.backlog and self.last_active + Config.post_idle_timeout <= now
+
+	def close(self):
+		"""Closes the connection and fails all posts that were not acknowledged."""
+		with self._lock:
+			self.closed = True
+			pending = [future for _, future in self.unacked.values()] + [future for _, future in self.backlog]
+			self.unacked.clear()
+			self.backlog.clear()
+		for future in pending:
+			future.set_result(False)
+		self.peer.disconnect()
+
+	def _send(self, msg: Message, future: futures.Future):
+		self.last_active = monotonic()
+		self.unacked[msg.get_id()] = (self.last_active + Config.post_ack_timeout, future)
+		self.peer.send(msg)
+
+
+def failed_post() -> futures.Future:
+	"""Returns the future of a post that could not be sent at all."""
+	future = futures.Future()
+	future.set_result(False)
+	return future
@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Optional
+
+import rsa
+from pyasn1.error import PyAsn1Error
+from .cache import SeenCache
+
+
+class NodeState:
+	"""
+	On-disk state of a node that survives restarts: the key pair (and thereby the peer ID),
+	the last known neighbours and the cache of recipient addresses.
+	"""
+
+	def __init__(self, directory: str):
+		self.directory = directory
+		"""Directory holding the state files of a single node."""
+
+		os.makedirs(directory, exist_ok=True)
+
+	def _path(self, name: str) -> str:
+		return os.path.join(self.directory, name)
+
+	def _read_json(self, name: str) -> Any:
+		try:
+			with open(self._path(name), 'r') as f:
+				return json.load(f)
+		except FileNotFoundError:
+			return None
+		except (OSError, ValueError) as e:
+			logging.warning(f'Ignoring unreadable state file {name}: {e}')
+			return None
+
+	def _write(self, name: str, data: bytes, mode: int = 0o644):
+		"""
+		Replaces a state file atomically so a crash never leaves a half written file behind.
+		The file gets permissions `mode` regardless of the umask.
+		"""
+		tmp_path = self._path(name + '.tmp')
+		fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+		with os.fdopen(fd, 'wb') as f:
+			# a leftover temporary file keeps its permissions when opened
+			os.fchmod(f.fileno(), mode)
+			f.write(data)
+		os.replace(tmp_path, self._path(name))
+
+	def load_keys(self) -> Optional[tuple[rsa.PublicKey, rsa.PrivateKey]]:
+		"""
+		Returns the stored key pair or None if there is none. An unreadable key file is moved aside to
+		`key.pem.corrupt`, so that the node starts with a new identity instead of failing.
+		"""
+		path = self._path('key.pem')
+		try:
+			with open(path, 'rb') as f:
+				private_key = rsa.PrivateKey.load_pkcs1(f.read())
+		except FileNotFoundError:
+			return None
+		except (ValueError, PyAsn1Error) as e:
+			logging.error(f'Stored key {path} is corrupt, moving it to {path}.corrupt and creating a new identity: {e}')
+			os.replace(path, path + '.corrupt')
+			return None
+		if os.stat(path).st_mode & 0o077:
+			# key files written by earlier versions were readable by everyone
+			os.chmod(path, 0o600)
+		return rsa.PublicKey(private_key.n, private_key.e), private_key
+
+	def save_keys(self, private_key: rsa.PrivateKey):
+		self._write('key.pem', private_key.save_pkcs1(), mode=0o600)
+
+	def load_neighbours(self) -> list[tuple[str, int]]:
+		"""Returns the addresses of the neighbours the node was connected to before."""
+		return [(ip, port) for ip, port in self._read_json('neighbours.json') or []]
+
+	def save_neighbours(self, addrs: list[tuple[str, int]]):
+		self._write('neighbours.json', json.dumps(addrs).encode('utf-8'))
+
+	def load_addresses(self, cache: SeenCache):
+		"""Restores resolved recipient addresses that have not expired yet into `cache`."""
+		now = time.time()
+		for peer_id, (ip, port, expires_at) in (self._read_json('addresses.json') or {}).items():
+			if expires_at > now:
+				cache.add(peer_id, (ip, port), expiry=expires_at - now)
+
+	def save_addresses(self, cache: SeenCache):
+		now = time.time()
+		addresses = {
+			peer_id: (addr[0], addr[1], now + remaining)
+			for peer_id, addr, remaining in cache.items()
+			if addr is not None
+		}
+		self._write('addresses.json', json.dumps(addresses).encode('utf-8'))
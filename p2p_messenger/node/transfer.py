@@ -0,0 +1,186 @@
+import logging
+import math
+import os
+from concurrent import futures
+from threading import Lock
+from time import monotonic
+
+from .session import PostSession
+from ..config import Config
+from ..protocol import Message, stream, types
+from ..protocol.compression import Compressor
+from ..protocol.framing import HEADER_SIZE
+
+
+class OutgoingTransfer:
+	"""
+	File streamed to a recipient in sequenced chunks over its post session.
+
+	At most `Config.transfer_window` chunks are sent ahead of the last acknowledgement and the file is read chunk by
+	chunk, so it is never held in memory. When the transfer is offered again after a reconnect, the recipient answers
+	with the chunk it expects next and the transfer resumes from there.
+	"""
+
+	def __init__(self, path: str, peer_id: str, name: str, sender: tuple[str, int]):
+		self.transfer_id = os.urandom(8)
+		"""Random id identifying the transfer across reconnects."""
+
+		self.path = path
+		self.peer_id = peer_id
+		self.name = name
+		self.sender = sender
+
+		self.chunk_size = min(Config.transfer_chunk_size, stream.MAX_CHUNK_SIZE)
+		self.chunks = max(1, math.ceil(os.path.getsize(path) / self.chunk_size))
+		"""Number of chunks of the file, an empty file is sent as a single empty chunk."""
+
+		frame_size = HEADER_SIZE + stream.CHUNK_STRUCT.size + self.chunk_size
+		self.window = max(1, min(Config.transfer_window, Config.send_queue_bytes // frame_size - 1))
+		"""Number of chunks sent ahead, bounded so that they never overflow the send queue of the connection."""
+
+		self.acked = 0
+		"""Sequence number of the next chunk the recipient expects."""
+
+		self.sent = 0
+		"""Sequence number of the next chunk to send."""
+
+		self.session: PostSession = None
+		"""Session the transfer is currently offered on."""
+
+		self.compressor: Compressor = None
+		"""Compressor for the chunks, or None if the recipient accepts none of our codecs."""
+
+		self.attempts = 0
+		"""Number of times the transfer was offered."""
+
+		self.last_progress = monotonic()
+		"""Time of the last offer or acknowledgement."""
+
+		self.future = futures.Future()
+		"""Future completed with whether the whole file was acknowledged."""
+
+		self._resuming = False
+		self._file = open(path, 'rb')
+		self._lock = Lock()
+
+	def offer(self, session: PostSession):
+		"""Offers the transfer over `session` and waits for the recipient to tell where to resume."""
+		with self._lock:
+			self.session = session
+			self.attempts += 1
+			self.last_progress = monotonic()
+			self._resuming = True
+		payload = stream.pack_offer(self.transfer_id, self.chunk_size, self.peer_id, self.name)
+		session.peer.send(Message(types.MsgType.XFER, self.sender, payload=payload))
+
+	def on_ack(self, next_seq: int, codecs: bytes = b''):
+		"""
+		Slides the window to the chunk the recipient expects next and sends the chunks that fit into it.
+		`codecs` are the compression codecs the recipient accepts.
+		"""
+		with self._lock:
+			if self.future.done() or self._file.closed or (not self._resuming and next_seq <= self.acked):
+				return
+			if self._resuming:
+				# the recipient may have kept fewer chunks than we know were acknowledged
+				self._resuming = False
+				self.compressor = Compressor.negotiate(codecs)
+				self.sent = next_seq
+				self._file.seek(next_seq * self.chunk_size)
+			self.acked = next_seq
+			self.last_progress = self.session.last_active = monotonic()
+			if self.acked >= self.chunks:
+				self._file.close()
+				done = True
+			else:
+				done = False
+				while self.sent < min(self.acked + self.window, self.chunks):
+					data = self._file.read(self.chunk_size)
+					last = self.sent == self.chunks - 1
+					payload = stream.pack_chunk(self.transfer_id, self.sent, last, data)
+					codec_id, payload = self.compressor.compress(payload) if self.compressor else (0, payload)
+					chunk_msg = Message(types.MsgType.CHUNK, self.sender, payload=payload)
+					chunk_msg.header.codec = codec_id
+					self.session.peer.send(chunk_msg)
+					self.sent += 1
+		if done:
+			logging.info(f'Sent file {self.path} to {self.peer_id}')
+			self.future.set_result(True)
+
+	def stalled(self, now: float) -> bool:
+		"""Returns whether the recipient did not acknowledge anything for `Config.transfer_timeout` seconds."""
+		return not self.future.done() and self.last_progress + Config.transfer_timeout <= now
+
+	def fail(self):
+		"""Gives up on the transfer."""
+		with self._lock:
+			self._file.close()
+		if not self.future.done():
+			logging.warning(f'Failed to send file {self.path} to {self.peer_id}')
+			self.future.set_result(False)
+
+
+class IncomingTransfer:
+	"""
+	File received in sequenced chunks, appended to a partial file that is renamed once the last chunk arrived.
+	The partial file is named after the transfer id, so a transfer offered again resumes after the chunks it holds.
+	"""
+
+	def __init__(self, transfer_id: bytes, name: str, chunk_size: int, directory: str):
+		self.transfer_id = transfer_id
+		self.chunk_size = chunk_size
+
+		os.makedirs(directory, exist_ok=True)
+		self.path = os.path.join(directory, name)
+		"""Path of the complete file, numbered once it is complete if a file of that name exists already."""
+
+		self.part_path = os.path.join(directory, transfer_id.hex() + '.part')
+		"""Path of the partial file chunks are appended to."""
+
+		self._file = open(self.part_path, 'r+b' if os.path.exists(self.part_path) else 'w+b')
+		self.next_seq = self._file.seek(0, os.SEEK_END) // chunk_size
+		"""Sequence number of the next expected chunk, chunks after a torn write are dropped."""
+		self._file.truncate(self.next_seq * chunk_size)
+		self._file.seek(self.next_seq * chunk_size)
+
+		self.done = False
+		"""Whether the last chunk was written."""
+
+		self.last_active = monotonic()
+		"""Time of the last chunk."""
+
+	def write(self, seq: int, last: bool, data) -> int:
+		"""Appends the chunk if it is the expected one. Returns the sequence number of the next expected chunk."""
+		if seq == self.next_seq and not self.done:
+			self._file.write(data)
+			# the transfer may be resumed by another worker process of the node, which goes by the size of the file
+			self._file.flush()
+			self.next_seq += 1
+			self.last_active = monotonic()
+			if last:
+				self._file.close()
+				self.path = reserve_path(self.path)
+				os.replace(self.part_path, self.path)
+				self.done = True
+		return self.next_seq
+
+	def close(self):
+		"""Closes the partial file, keeping it to resume from."""
+		self._file.close()
+
+
+def reserve_path(path: str) -> str:
+	"""
+	Creates an empty file at `path`, or at `path` numbered like `name (1).ext` if a file of that name exists, and
+	returns its path. The file is created exclusively, so no existing or concurrently received file is overwritten.
+	"""
+	root, ext = os.path.splitext(path)
+	candidate = path
+	number = 0
+	while True:
+		try:
+			open(candidate, 'xb').close()
+			return candidate
+		except FileExistsError:
+			number += 1
+			candidate = f'{root} ({number}){ext}'
@@ -0,0 +1,110 @@
+import logging
+import multiprocessing
+import os
+import socket
+from threading import Thread
+
+from .node import Node
+from .peer import Peer
+from ..config import Config
+from ..protocol import Header, Message, types
+from ..protocol.framing import HEADER_SIZE
+
+PEEK_TIMEOUT = 5
+"""Seconds a worker waits for the first header of an accepted connection before closing it."""
+
+
+class SessionWorker(Node):
+	"""
+	Additional process of a node that shares its peer id and listening port through `SO_REUSEPORT`, so that the
+	kernel spreads the accepted connections across the processes of the node.
+
+	A worker serves post sessions itself, since posts, session keys and file transfers need no state of the overlay,
+	which lets encrypted posts of different senders be opened on different cores. Any other connection is handed to
+	the primary process over `channel` before a single byte of it is read, so the primary remains the only owner of
+	neighbours, duplicate caches and routing state. Floods are therefore still parsed, deduplicated and forwarded by
+	the primary alone, and workers only add throughput for post sessions and file transfers. The worker persists
+	nothing, the state directory belongs to the primary. It exits once the primary closes the channel.
+	"""
+
+	def __init__(self, port: int, keys, channel: socket.socket):
+		super().__init__(port, [], keys=keys, persist=False)
+
+		self.channel = channel
+		"""Socket to the primary process connections other than sessions are handed over on."""
+
+	def run(self):
+		"""Serves post sessions on the shared port until the primary process goes away."""
+		self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+		self.s.bind((socket.gethostname(), self.port))
+		self.s.listen(Config.max_connections)
+		Thread(target=self.watch_primary, daemon=True).start()
+		# closes idle sessions and the files of abandoned incoming transfers
+		Thread(target=self.sweep_sessions_forever, daemon=True).start()
+		logging.info(f'Worker {os.getpid()} of node <{self.peer_id}> serving sessions on port {self.port}...')
+
+		while True:
+			(client, addr) = self.s.accept()
+			logging.debug(f'Accept connection from {addr}, socket {client}')
+			Thread(target=self.serve_connection, args=[client, addr]).start()
+
+	def watch_primary(self):
+		"""Exits the worker process once the primary process closed the channel."""
+		try:
+			self.channel.recv(1)
+		finally:
+			os._exit(0)
+
+	def serve_connection(self, client: socket.socket, addr: tuple[str, int]):
+		"""Handles an accepted connection if it is a post session and hands it over to the primary process otherwise."""
+		try:
+			# peek, so that the primary process reads the connection from its first byte
+			client.settimeout(PEEK_TIMEOUT)
+			head = client.recv(HEADER_SIZE, socket.MSG_PEEK | socket.MSG_WAITALL)
+			client.settimeout(None)
+			msg_type = Header.from_bytes(head).msg_type if len(head) == HEADER_SIZE else None
+		except (OSError, ValueError) as e:
+			logging.debug(f'Dropping connection from {addr}: {e}')
+			client.close()
+			return
+		if msg_type in types.SESSION_TYPES:
+			self.reply(Peer(addr, s=client))
+			return
+		if msg_type is not None:
+			try:
+				socket.send_fds(self.channel, [b'\0'], [client.fileno()])
+			except OSError as e:
+				logging.warning(f'Cannot hand over connection from {addr}: {e}')
+		# the primary process holds a duplicate of the socket
+		client.close()
+
+	def dispatch(self, msg: Message, peer) -> bool:
+		"""Passes a message of a post session to its handler, the worker holds no state to handle any other."""
+		if msg.header.msg_type not in types.SESSION_TYPES:
+			logging.warning(f'Ignoring message of type {msg.header.msg_type.name} on the session from {peer.addr}')
+			return True
+		return super().dispatch(msg, peer)
+
+
+def start_workers(node: Node, count: int):
+	"""
+	Forks `count` worker processes serving post sessions on the port of `node`, which has to be started afterwards.
+	Forking before the node runs any thread keeps the worker processes free of copies of its locks in use.
+	"""
+	context = multiprocessing.get_context('fork')
+	keys = (node.pub_key, node.private_key)
+	for _ in range(count):
+		channel, worker_channel = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+		inherited = list(node.worker_channels) + [channel]
+		context.Process(target=_run_worker, args=[node.port, keys, worker_channel, inherited], daemon=True).start()
+		worker_channel.close()
+		node.worker_channels.append(channel)
+
+
+def _run_worker(port: int, keys, channel: socket.socket, inherited: list[socket.socket]):
+	# the channels of the primary process would keep other workers from noticing that it exited
+	for s in inherited:
+		s.close()
+	SessionWorker(port, keys, channel).run()
@@ -1,10 +1,12 @@
 from ..config import Config
 from .header import Header
 from .message import *
+from .framing import FrameDecoder
 
 __all__ = [
 	'Header',
-	'Message'
+	'Message',
+	'FrameDecoder'
 ]
 
 Config.load()
@@ -0,0 +1,103 @@
+import hashlib
+import struct
+
+from ..config import Config
+
+# =======================================================
+# Attenuated Bloom filter updates:
+#
+# FILTER: | Size in bits (4) | Hashes (1) | Levels (1) | Level 0 | Level 1 | ... |
+#
+# Every level is the XOR of the new and the previously sent bits of that level, encoded as:
+#   | 0 |                                         unchanged
+#   | 1 | Bits (size / 8)                         dense, big endian
+#   | 2 | Count (2) | Bit Positions (4 each)      sparse
+# =======================================================
+
+FILTER_STRUCT = struct.Struct('!IBB')
+"""Precompiled layout of the fixed part of a FILTER payload."""
+
+COUNT_STRUCT = struct.Struct('!H')
+
+UNCHANGED, DENSE, SPARSE = range(3)
+
+
+def positions(peer_id: bytes, size: int, hashes: int) -> list[int]:
+	"""Returns the bit positions of a peer id in a filter, derived from its SHA-1 hash by double hashing."""
+	digest = hashlib.sha1(peer_id).digest()
+	h1 = int.from_bytes(digest[:8], 'big')
+	h2 = int.from_bytes(digest[8:16], 'big') | 1
+	return [(h1 + i * h2) % size for i in range(hashes)]
+
+
+def mask(peer_id: bytes, size: int, hashes: int) -> int:
+	"""Returns a filter containing nothing but the given peer id, as an integer bit set."""
+	bits = 0
+	for position in positions(peer_id, size, hashes):
+		bits |= 1 << position
+	return bits
+
+
+def pack_filter(deltas: list[int], size: int, hashes: int) -> bytes:
+	"""Encodes changes to the levels of a filter, given as the XOR of the new and the old bits of every level."""
+	parts = [FILTER_STRUCT.pack(size, hashes, len(deltas))]
+	for delta in deltas:
+		if not delta:
+			parts.append(bytes([UNCHANGED]))
+			continue
+		if bin(delta).count('1') * 4 >= size // 8:
+			parts.append(bytes([DENSE]) + delta.to_bytes(size // 8, 'big'))
+			continue
+		flipped = []
+		while delta:
+			lowest = delta & -delta
+			flipped.append(lowest.bit_length() - 1)
+			delta ^= lowest
+		parts.append(bytes([SPARSE]) + COUNT_STRUCT.pack(len(flipped)) + struct.pack(f'!{len(flipped)}I', *flipped))
+	return b''.join(parts)
+
+
+def unpack_filter(payload) -> list[int]:
+	"""
+	Returns the XOR deltas of the levels of a FILTER payload. Raises `ValueError` unless the filter has the size and
+	number of hashes of `Config` and at most `Config.bloom_depth` levels, which are checked before any level is
+	decoded, or if a level is truncated or flips a bit beyond the size.
+	"""
+	if len(payload) < FILTER_STRUCT.size:
+		raise ValueError('Filter payload is truncated')
+	size, hashes, levels = FILTER_STRUCT.unpack_from(payload)
+	if (size, hashes) != (Config.bloom_size, Config.bloom_hashes):
+		raise ValueError(f'Filter has {size} bits and {hashes} hashes')
+	if levels > Config.bloom_depth:
+		raise ValueError(f'Filter has {levels} levels')
+	offset = FILTER_STRUCT.size
+	deltas = []
+	for _ in range(levels):
+		if offset >= len(payload):
+			raise ValueError('Filter payload is truncated')
+		encoding = payload[offset]
+		offset += 1
+		if encoding == UNCHANGED:
+			deltas.append(0)
+		elif encoding == DENSE:
+			if offset + size // 8 > len(payload):
+				raise ValueError('Filter payload is truncated')
+			deltas.append(int.from_bytes(payload[offset:offset + size // 8], 'big'))
+			offset += size // 8
+		elif encoding == SPARSE:
+			if offset + COUNT_STRUCT.size > len(payload):
+				raise ValueError('Filter payload is truncated')
+			count, = COUNT_STRUCT.unpack_from(payload, offset)
+			offset += COUNT_STRUCT.size
+			if offset + 4 * count > len(payload):
+				raise ValueError('Filter payload is truncated')
+			delta = 0
+			for position in struct.unpack_from(f'!{count}I', payload, offset):
+				if position >= size:
+					raise ValueError(f'Filter bit position {position} exceeds the size of {size} bits')
+				delta |= 1 << position
+			deltas.append(delta)
+			offset += 4 * count
+		else:
+			raise ValueError(f'Unknown filter level encoding {encoding}')
+	return deltas
@@ -0,0 +1,159 @@
+import zlib
+from abc import ABC, abstractmethod
+from threading import Lock
+from time import perf_counter
+from typing import Optional
+
+from ..config import Config
+
+
+class Codec(ABC):
+	"""Compression algorithm that payloads can be compressed with, identified on the wire by its 4 bit id."""
+
+	def __init__(self, codec_id: int, name: str):
+		self.codec_id = codec_id
+		self.name = name
+
+		self.compressed = 0
+		"""Number of payloads sent compressed."""
+
+		self.rejected = 0
+		"""Number of payloads compressed but sent raw because they did not shrink enough."""
+
+		self.bytes_in = 0
+		"""Number of payload bytes sent compressed, before compression."""
+
+		self.bytes_out = 0
+		"""Number of payload bytes sent compressed, after compression."""
+
+		self.compress_seconds = 0.0
+		"""CPU time spent compressing, including rejected payloads."""
+
+		self.decompress_seconds = 0.0
+		"""CPU time spent decompressing."""
+
+	@abstractmethod
+	def compress(self, data) -> bytes:
+		"""Returns the compressed data."""
+
+	@abstractmethod
+	def decompress(self, data, max_size: int) -> bytes:
+		"""Returns the decompressed data. Raises `ValueError` if it is invalid or larger than `max_size`."""
+
+	def stats(self) -> dict[str, float]:
+		"""Returns bandwidth saved and CPU time spent by this codec."""
+		return {
+			'compressed': self.compressed,
+			'rejected': self.rejected,
+			'bytes_saved': self.bytes_in - self.bytes_out,
+			'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+			'compress_seconds': round(self.compress_seconds, 6),
+			'decompress_seconds': round(self.decompress_seconds, 6)
+		}
+
+
+class ZlibCodec(Codec):
+	def __init__(self):
+		super().__init__(1, 'zlib')
+
+	def compress(self, data) -> bytes:
+		return zlib.compress(data, Config.compression_level)
+
+	def decompress(self, data, max_size: int) -> bytes:
+		decompressor = zlib.decompressobj()
+		try:
+			result = decompressor.decompress(data, max_size)
+		except zlib.error as e:
+			raise ValueError(e)
+		if decompressor.unconsumed_tail or not decompressor.eof:
+			raise ValueError(f'Compressed payload is truncated or exceeds {max_size} bytes')
+		return result
+
+
+MAX_SIZE = 0xFFFF
+"""Maximum size of a decompressed payload, the largest payload that could have been sent uncompressed."""
+
+CODECS: dict[int, Codec] = {}
+"""Registered codecs by id."""
+
+
+def register_codec(codec: Codec):
+	"""Makes a codec available. Nodes accept and prefer the codecs listed in `Config.compression_codecs`."""
+	if not 0 < codec.codec_id <= 0x0F:
+		raise ValueError(f'Codec id {codec.codec_id} does not fit into 4 bits')
+	CODECS[codec.codec_id] = codec
+
+
+register_codec(ZlibCodec())
+
+
+def accepted_codecs() -> bytes:
+	"""Returns the ids of the configured codecs in order of preference, as announced to senders."""
+	return bytes(codec.codec_id for codec in CODECS.values() if codec.name in Config.compression_codecs)
+
+
+def decompress(codec_id: int, data, max_size: int) -> bytes:
+	"""Decompresses a payload. Raises `ValueError` if the codec is unknown, the data invalid or too large."""
+	codec = CODECS.get(codec_id)
+	if codec is None:
+		raise ValueError(f'Unknown compression codec {codec_id}')
+	started = perf_counter()
+	try:
+		return codec.decompress(data, max_size)
+	finally:
+		codec.decompress_seconds += perf_counter() - started
+
+
+class Compressor:
+	"""
+	Compresses the payloads sent to a single recipient with the codec both sides accept.
+
+	Payloads smaller than `Config.compression_min_size` are sent raw, as are payloads that do not shrink below
+	`Config.compression_max_ratio` of their size. After such a rejection, the following payloads are sent raw
+	without trying, for a number of payloads doubling with every further rejection, so that incompressible data
+	like encrypted or already compressed files costs hardly any CPU.
+	"""
+
+	MAX_BACKOFF = 64
+	"""Maximum number of payloads sent raw without trying after a rejection."""
+
+	def __init__(self, codec: Codec):
+		self.codec = codec
+		self._backoff = 0
+		self._skip = 0
+		self._lock = Lock()
+
+	@classmethod
+	def negotiate(cls, accepted: bytes) -> Optional['Compressor']:
+		"""Returns a compressor for the first of our codecs the recipient accepts, or None if there is none."""
+		for codec_id in accepted_codecs():
+			if codec_id in accepted:
+				return cls(CODECS[codec_id])
+		return None
+
+	def compress(self, data) -> tuple[int, bytes]:
+		"""Returns the codec id to put into the header and the payload, which may not have been compressed."""
+		if len(data) < Config.compression_min_size:
+			return 0, data
+		with self._lock:
+			if self._skip:
+				self._skip -= 1
+				return 0, data
+		started = perf_counter()
+		compressed = self.codec.compress(data)
+		self.codec.compress_seconds += perf_counter() - started
+		rejected = len(compressed) > len(data) * Config.compression_max_ratio
+		# posts to the same recipient may be compressed by several threads at once
+		with self._lock:
+			if rejected:
+				self._backoff = min(max(1, 2 * self._backoff), self.MAX_BACKOFF)
+				self._skip = self._backoff
+			else:
+				self._backoff = 0
+		if rejected:
+			self.codec.rejected += 1
+			return 0, data
+		self.codec.compressed += 1
+		self.codec.bytes_in += len(data)
+		self.codec.bytes_out += len(compressed)
+		return self.codec.codec_id, compressed
@@ -0,0 +1,80 @@
+import os
+import struct
+from time import monotonic
+
+import rsa
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# =======================================================
+# Encrypted post payloads:
+#
+# KEY:   | Key ID (8) | Session Key encrypted with the public key of the recipient (RSA PKCS#1 v1.5) |
+# SPOST: | Key ID (8) | Nonce (12) | Chat Message encrypted with AES-GCM, including the 16 byte tag |
+# =======================================================
+
+KEY_ID_SIZE = 8
+"""Size of the random id naming a session key."""
+
+KEY_SIZE = 32
+"""Size of a session key in bytes (AES-256)."""
+
+NONCE_SIZE = 12
+"""Size of the random nonce sealed messages are prefixed with."""
+
+SEALED_STRUCT = struct.Struct(f'!{KEY_ID_SIZE}s{NONCE_SIZE}s')
+"""Precompiled layout of the fixed part of an SPOST payload."""
+
+MIN_RSA_KEY_SIZE = (KEY_SIZE + 11) * 8
+"""Smallest RSA key size able to wrap a session key, PKCS#1 v1.5 padding takes 11 bytes."""
+
+
+class DecryptionError(ValueError):
+	"""Raised if a sealed message cannot be opened, because its key is unknown or it was tampered with."""
+
+
+class SessionKey:
+	"""Symmetric key shared by two peers, used to seal any number of messages with AES-GCM."""
+
+	def __init__(self, key: bytes = None, key_id: bytes = None):
+		self.key = key or AESGCM.generate_key(bit_length=KEY_SIZE * 8)
+		self.key_id = key_id or os.urandom(KEY_ID_SIZE)
+		self.created = monotonic()
+		"""Time the key was created or received."""
+		self.uses = 0
+		"""Number of messages sealed with the key."""
+		self._aead = AESGCM(self.key)
+
+	def wrap(self, pub_key: rsa.PublicKey) -> bytes:
+		"""Returns the KEY payload handing this key to the owner of `pub_key`."""
+		return self.key_id + rsa.encrypt(self.key, pub_key)
+
+	@classmethod
+	def unwrap(cls, payload, private_key: rsa.PrivateKey) -> 'SessionKey':
+		"""Recovers a key from a KEY payload. Raises `DecryptionError` if it was not meant for `private_key`."""
+		try:
+			key = rsa.decrypt(bytes(payload[KEY_ID_SIZE:]), private_key)
+		except rsa.DecryptionError as e:
+			raise DecryptionError(e)
+		if len(key) != KEY_SIZE:
+			raise DecryptionError(f'Session key has {len(key)} bytes')
+		return cls(key, bytes(payload[:KEY_ID_SIZE]))
+
+	def seal(self, plaintext: bytes) -> bytes:
+		"""Returns the SPOST payload of `plaintext`, authenticated together with the key id."""
+		self.uses += 1
+		nonce = os.urandom(NONCE_SIZE)
+		return SEALED_STRUCT.pack(self.key_id, nonce) + self._aead.encrypt(nonce, plaintext, self.key_id)
+
+	def open(self, payload) -> bytes:
+		"""Returns the plaintext of an SPOST payload sealed with this key."""
+		_, nonce = SEALED_STRUCT.unpack_from(payload)
+		try:
+			return self._aead.decrypt(nonce, bytes(payload[SEALED_STRUCT.size:]), self.key_id)
+		except InvalidTag:
+			raise DecryptionError('Message was not sealed with this key or was modified')
+
+
+def key_id_of(payload) -> bytes:
+	"""Returns the id of the session key a KEY or SPOST payload refers to."""
+	return bytes(payload[:KEY_ID_SIZE])
@@ -0,0 +1,71 @@
+import hashlib
+import socket
+import struct
+from typing import Optional
+
+# =======================================================
+# DHT payloads, nodes and records are addressed by the SHA-1 hash of a peer id:
+#
+# FIND:  | Sender Key (20) | Target Key (20) |
+# NODES: | Sender Key (20) | Record IP (4) | Record Port (2) | Contacts: Key (20) | IP (4) | Port (2) | ... |
+# STORE: | Peer ID of the sender |
+#
+# A record port of 0 means that the sender holds no record for the target key.
+# =======================================================
+
+KEY_SIZE = 20
+"""Size of a key in the DHT keyspace in bytes."""
+
+KEY_BITS = KEY_SIZE * 8
+"""Size of a key in the DHT keyspace in bits, which is also the number of k-buckets of a routing table."""
+
+FIND_STRUCT = struct.Struct(f'!{KEY_SIZE}s{KEY_SIZE}s')
+"""Precompiled layout of a FIND payload."""
+
+NODES_STRUCT = struct.Struct(f'!{KEY_SIZE}s4sH')
+"""Precompiled layout of the fixed part of a NODES payload."""
+
+CONTACT_STRUCT = struct.Struct(f'!{KEY_SIZE}s4sH')
+"""Precompiled layout of a single contact in a NODES payload."""
+
+
+def node_key(peer_id) -> bytes:
+	"""Returns the key of a peer id, given as string or bytes, in the DHT keyspace."""
+	return hashlib.sha1(peer_id.encode('utf-8') if isinstance(peer_id, str) else peer_id).digest()
+
+
+def distance(a: bytes, b: bytes) -> int:
+	"""Returns the XOR distance of two keys."""
+	return int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')
+
+
+def pack_find(sender_key: bytes, target: bytes) -> bytes:
+	return FIND_STRUCT.pack(sender_key, target)
+
+
+def unpack_find(payload) -> tuple[bytes, bytes]:
+	"""Returns sender key and target key of a FIND payload."""
+	return FIND_STRUCT.unpack_from(payload)
+
+
+def pack_nodes(
+	sender_key: bytes,
+	record: Optional[tuple[str, int]],
+	contacts: list[tuple[bytes, tuple[str, int]]]
+) -> bytes:
+	ip, port = record or ('0.0.0.0', 0)
+	return NODES_STRUCT.pack(sender_key, socket.inet_aton(ip), port) + b''.join(
+		CONTACT_STRUCT.pack(key, socket.inet_aton(addr[0]), addr[1]) for key, addr in contacts
+	)
+
+
+def unpack_nodes(payload) -> tuple[bytes, Optional[tuple[str, int]], list[tuple[bytes, tuple[str, int]]]]:
+	"""Returns sender key, the record for the target key if the sender holds one, and the contacts of a NODES payload."""
+	sender_key, ip, port = NODES_STRUCT.unpack_from(payload)
+	record = (socket.inet_ntoa(ip), port) if port else None
+	end = len(payload) - (len(payload) - NODES_STRUCT.size) % CONTACT_STRUCT.size
+	contacts = [
+		(key, (socket.inet_ntoa(contact_ip), contact_port))
+		for key, contact_ip, contact_port in CONTACT_STRUCT.iter_unpack(payload[NODES_STRUCT.size:end])
+	]
+	return sender_key, record, contacts
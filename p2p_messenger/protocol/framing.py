@@ -0,0 +1,65 @@
+import socket
+from typing import Iterator
+from .header import HEADER_STRUCT, Header
+
+HEADER_SIZE = HEADER_STRUCT.size
+"""Size of the protocol header in bytes."""
+
+MAX_FRAME_SIZE = HEADER_SIZE + 0xFFFF
+"""Size of the largest possible message, bounded by the 16 bit payload length field."""
+
+
+class FrameDecoder:
+	"""
+	Receive buffer of a single connection that splits the TCP byte stream into messages.
+
+	Bytes are received straight into a preallocated buffer and every complete frame is handed out as a `Header`
+	and a `memoryview` of the whole frame including the header, so the decoder never copies a frame. The views
+	point into the buffer and are only valid until the next call to `recv_into` or `feed`.
+	"""
+
+	def __init__(self, capacity: int = 2 * MAX_FRAME_SIZE):
+		self.buffer = bytearray(capacity)
+		self.view = memoryview(self.buffer)
+		self.start = 0
+		"""Offset of the first byte not yet parsed."""
+		self.end = 0
+		"""Offset behind the last received byte."""
+
+	def _reserve(self) -> memoryview:
+		"""Moves a pending partial frame to the front of the buffer if needed and returns the free space."""
+		if self.start == self.end:
+			self.start = self.end = 0
+		elif len(self.buffer) - self.end < MAX_FRAME_SIZE:
+			pending = self.end - self.start
+			self.buffer[:pending] = self.view[self.start:self.end]
+			self.start, self.end = 0, pending
+		return self.view[self.end:]
+
+	def recv_into(self, s: socket.socket) -> int:
+		"""Reads as many bytes as available from the socket. Returns 0 if the connection was closed."""
+		n = s.recv_into(self._reserve())
+		self.end += n
+		return n
+
+	def feed(self, data: bytes):
+		"""
+		Appends data received by other means, e.g. from an `asyncio.StreamReader`.
+		At most `MAX_FRAME_SIZE` bytes may be fed before `frames` is drained, more raise a ValueError.
+		"""
+		free = self._reserve()
+		if len(data) > len(free):
+			raise ValueError(f'Cannot buffer {len(data)} bytes, only {len(free)} are free')
+		free[:len(data)] = data
+		self.end += len(data)
+
+	def frames(self) -> Iterator[tuple[Header, memoryview]]:
+		"""Yields header and raw bytes of every complete frame in the buffer."""
+		while self.end - self.start >= HEADER_SIZE:
+			header = Header.from_bytes(self.buffer, self.start)
+			frame_end = self.start + HEADER_SIZE + header.length
+			if frame_end > self.end:
+				return
+			frame = self.view[self.start:frame_end]
+			self.start = frame_end
+			yield header, frame
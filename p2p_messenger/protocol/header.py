@@ -1,17 +1,14 @@
-from p2p_messenger import node
 import struct
-import time
-import hashlib
 import binascii
 import socket
-from . import types, utils
+from . import ids, types
 from ..config import Config
 
 # =======================================================
 # Protocol header:
 # 0                         16                        32
 # +------------+------------+------------+------------+
-# |   Version  |  Msg Type  |     TTL    |  Hop Count |
+# |Codec|Versn |  Msg Type  |     TTL    |  Hop Count |
 # +------------+------------+------------+------------+
 # |        Sender Port      |      Payload length     |
 # +------------+------------+------------+------------+
@@ -22,14 +19,30 @@ from ..config import Config
 # =======================================================
 
 
+HEADER_STRUCT = struct.Struct('!BBBBHH4s4s')
+"""Precompiled layout of the protocol header. The IP address is kept in its packed 4 byte form."""
+
+TTL_OFFSET = 2
+"""Offset of the TTL byte within the header."""
+
+HOP_COUNT_OFFSET = 3
+"""Offset of the hop count byte within the header."""
+
+VERSION_MASK = 0x0F
+"""Bits of the first header byte holding the protocol version, the upper 4 bits hold the compression codec id."""
+
+_MSG_TYPES = {t.value: t for t in types.MsgType}
+
+_HOST_IP = socket.inet_aton(socket.gethostbyname(socket.gethostname()))
+
+
 class Header:
 	"""Structure of the protocol header included in the first 16 bytes of every message."""
 
-	sequence_id = 0
-	"""
-	This value is part of the message id hash input and gets incremented continuously.
-	This is crucial for when multiple messages of the same type get created at the same time.
-	"""
+	__slots__ = ('version', 'msg_type', 'ttl', 'hop_count', 'port', 'length', 'packed_ip', 'message_id', 'codec')
+
+	id_generator: ids.MessageIdGenerator = ids.CounterIdGenerator()
+	"""Generator of new message ids, may be replaced by any other `MessageIdGenerator`."""
 
 	def __init__(
 		self,
@@ -39,8 +52,10 @@ class Header:
 		hop_count=0,
 		port=None,
 		length=0,
-		ip=socket.gethostbyname(socket.gethostname()),
-		message_id=None
+		ip: str = None,
+		message_id=None,
+		codec=0,
+		packed_ip: bytes = None
 	):
 		self.version = version
 		self.msg_type = msg_type
@@ -48,8 +63,11 @@ class Header:
 		self.hop_count = hop_count
 		self.port = port
 		self.length = length
-		self.ip = ip
+		self.packed_ip = packed_ip if packed_ip is not None else socket.inet_aton(ip) if ip is not None else _HOST_IP
+		"""Original sender IP address in its packed 4 byte form, `ip` converts it to a dotted string when needed."""
 		self.message_id = message_id if message_id else self.gen_message_id()
+		self.codec = codec
+		"""Id of the compression codec the payload was compressed with, 0 if it is not compressed."""
 
 	def __repr__(self) -> str:
 		return '|{}|{}|{}|{}|{}|{}|{}|{}|'.format(
@@ -63,38 +81,39 @@ class Header:
 			binascii.hexlify(self.message_id).decode('utf-8') if self.message_id else ''
 		)
 
+	@property
+	def ip(self) -> str:
+		"""Original sender IP address as a dotted string."""
+		return socket.inet_ntoa(self.packed_ip)
+
+	@ip.setter
+	def ip(self, ip: str):
+		self.packed_ip = socket.inet_aton(ip)
+
 	def gen_message_id(self) -> bytes:
 		"""Creates a new unique message id for this header."""
-		hash_input = str(self.ip) + str(self.port) + str(time.time() + Header.sequence_id)
-		Header.sequence_id += 1
-		hash_value = hashlib.sha1(hash_input.encode('utf-8')).hexdigest()[:8]
-		return binascii.unhexlify(hash_value)
+		return Header.id_generator.next_id()
 
 	def bytes(self) -> bytes:
 		"""Returns header as bytes. A message id will be generated if value was not already set."""
-		return struct.pack(
-			'!BBBBHHI4s',
-			self.version,
+		return HEADER_STRUCT.pack(
+			self.codec << 4 | self.version,
 			self.msg_type.value,
 			self.ttl,
 			self.hop_count,
 			self.port,
 			self.length,
-			utils.ip_to_num(self.ip),
+			self.packed_ip,
 			self.message_id
 		)
 
 	@staticmethod
-	def from_bytes(header_bytes):
-		"""Instantiates a new Header from bytes."""
-		(version, msg_type_val, ttl, hop_count, port, length, ip_num, message_id) = struct.unpack('!BBBBHHI4s', header_bytes)
+	def from_bytes(header_bytes, offset: int = 0):
+		"""Instantiates a new Header from bytes or any other buffer, starting at `offset`."""
+		(version, msg_type_val, ttl, hop_count, port, length, ip, message_id) = HEADER_STRUCT.unpack_from(header_bytes, offset)
+		msg_type = _MSG_TYPES.get(msg_type_val)
+		if msg_type is None:
+			raise ValueError(f'{msg_type_val} is not a valid MsgType')
 		return Header(
-			version=version,
-			msg_type=types.MsgType(msg_type_val),
-			ttl=ttl,
-			hop_count=hop_count,
-			port=port,
-			length=length,
-			ip=utils.num_to_ip(ip_num),
-			message_id=message_id
+			version & VERSION_MASK, msg_type, ttl, hop_count, port, length, None, message_id, version >> 4, ip
 		)
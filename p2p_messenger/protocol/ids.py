@@ -0,0 +1,61 @@
+import binascii
+import hashlib
+import itertools
+import random
+import struct
+import time
+from abc import ABC, abstractmethod
+from threading import Lock
+
+_ID_STRUCT = struct.Struct('!I')
+
+
+class MessageIdGenerator(ABC):
+	"""Source of the 4 byte message ids put into the protocol header."""
+
+	@abstractmethod
+	def next_id(self) -> bytes:
+		"""Returns a new message id."""
+
+
+class CounterIdGenerator(MessageIdGenerator):
+	"""
+	Generates ids from a random per-node prefix followed by a counter, packed straight into 4 bytes.
+
+	Ids of a single node never repeat before the counter wraps around after `2 ** (32 - prefix_bits)` messages,
+	ids of different nodes only collide if their random prefixes match and their counters overlap. With the default
+	8 bit prefix, a pair of nodes shares the prefix with probability 1/256. Their 24 bit counters start at random
+	values, so if two nodes with the same prefix sent `n` messages each, their ids overlap with probability about
+	`2 * n / 2 ** 24`. Drawing from the counter is thread-safe as `itertools.count` is advanced atomically.
+	"""
+
+	def __init__(self, prefix_bits: int = 8):
+		counter_bits = 32 - prefix_bits
+		self._prefix = random.getrandbits(prefix_bits) << counter_bits if prefix_bits else 0
+		self._mask = (1 << counter_bits) - 1
+		self._counter = itertools.count(random.getrandbits(counter_bits))
+
+	def next_id(self) -> bytes:
+		return _ID_STRUCT.pack(self._prefix | (next(self._counter) & self._mask))
+
+
+class HashIdGenerator(MessageIdGenerator):
+	"""Generates ids by hashing the sender address together with the current time and a sequence number."""
+
+	def __init__(self, ip: str = '', port: int = 0):
+		self.ip = ip
+		self.port = port
+		self.sequence_id = 0
+		"""
+		This value is part of the message id hash input and gets incremented continuously.
+		This is crucial for when multiple messages get created at the same time.
+		"""
+		self._lock = Lock()
+
+	def next_id(self) -> bytes:
+		with self._lock:
+			sequence_id = self.sequence_id
+			self.sequence_id += 1
+		hash_input = str(self.ip) + str(self.port) + str(time.time() + sequence_id)
+		hash_value = hashlib.sha1(hash_input.encode('utf-8')).hexdigest()[:8]
+		return binascii.unhexlify(hash_value)
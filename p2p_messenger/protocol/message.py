@@ -4,17 +4,49 @@ from . import types, header
 class Message:
 	"""Structure of a message including the protocol header and the payload."""
 
-	def __init__(self, msg_type: types.MsgType, sender: tuple[str, int], msg_id=None, payload=''):
-		"""Initiate a new message."""
+	__slots__ = ('header', 'payload', 'frame')
+
+	def __init__(self, msg_type: types.MsgType, sender: tuple[str, int], msg_id=None, payload: bytes = b''):
+		"""Initiate a new message. The payload is raw bytes, text has to be encoded by the caller."""
 		self.header = header.Header(msg_type=msg_type, ip=sender[0], port=sender[1], length=len(payload), message_id=msg_id)
 		self.payload = payload
+		self.frame = None
+		"""Raw bytes of a received message, reused when the message is forwarded."""
 
 	def __repr__(self) -> str:
-		return format('%s%s|' % (str(self.header), self.payload))
+		if self.header.msg_type in types.BINARY_TYPES:
+			return format('%s<%d bytes>|' % (str(self.header), len(self.payload)))
+		return format('%s%s|' % (str(self.header), str(self.payload, 'utf-8', 'replace')))
+
+	@classmethod
+	def from_frame(cls, msg_header: header.Header, frame) -> 'Message':
+		"""
+		Instantiates a received message from its decoded header and the raw frame including the header.
+		The frame is copied once, since it outlives the receive buffer when it is queued for forwarding.
+		"""
+		msg = cls.__new__(cls)
+		msg.header = msg_header
+		msg.frame = bytearray(frame)
+		msg.payload = memoryview(msg.frame)[header.HEADER_STRUCT.size:]
+		return msg
+
+	def forward(self):
+		"""Counts a hop by decrementing the TTL and incrementing the hop count, patching the raw frame in place."""
+		self.header.ttl -= 1
+		self.header.hop_count += 1
+		if self.frame is not None:
+			self.frame[header.TTL_OFFSET] = max(self.header.ttl, 0)
+			self.frame[header.HOP_COUNT_OFFSET] = min(self.header.hop_count, 0xFF)
 
 	def bytes(self) -> bytes:
 		"""Returns message as bytes."""
-		return self.header.bytes() + bytes(self.payload.encode('utf-8'))
+		if self.frame is not None:
+			return self.frame
+		return self.header.bytes() + self.payload
+
+	def text(self) -> str:
+		"""Returns the payload decoded as UTF-8 text, for handlers of messages carrying text."""
+		return str(self.payload, 'utf-8')
 
 	def get_id(self) -> str:
 		"""Returns message id from header."""
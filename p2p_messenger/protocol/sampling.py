@@ -0,0 +1,24 @@
+import socket
+import struct
+
+# =======================================================
+# Peer sampling payloads:
+#
+# SHUF, SREP: | Entries: IP (4) | Port (2) | Age (2) | ... |
+# =======================================================
+
+ENTRY_STRUCT = struct.Struct('!4sHH')
+"""Precompiled layout of a single entry of a partial view."""
+
+MAX_AGE = 0xFFFF
+"""Largest age an entry can be sent with."""
+
+
+def pack_entries(entries: list[tuple[tuple[str, int], int]]) -> bytes:
+	return b''.join(ENTRY_STRUCT.pack(socket.inet_aton(ip), port, min(age, MAX_AGE)) for (ip, port), age in entries)
+
+
+def unpack_entries(payload) -> list[tuple[tuple[str, int], int]]:
+	"""Returns the addresses and ages of the entries of a SHUF or SREP payload."""
+	end = len(payload) - len(payload) % ENTRY_STRUCT.size
+	return [((socket.inet_ntoa(ip), port), age) for ip, port, age in ENTRY_STRUCT.iter_unpack(payload[:end])]
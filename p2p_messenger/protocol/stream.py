@@ -0,0 +1,56 @@
+import struct
+
+# =======================================================
+# Stream transfer payloads:
+#
+# XFER:  | Transfer ID (8) | Chunk Size (4) | Peer ID Length (2) | Recipient Peer ID | File Name |
+# CHUNK: | Transfer ID (8) | Sequence Number (4) | Flags (1) | Data |
+# XACK:  | Transfer ID (8) | Next Expected Sequence Number (4) | Accepted Compression Codec IDs (1 each) |
+# =======================================================
+
+OFFER_STRUCT = struct.Struct('!8sIH')
+"""Precompiled layout of the fixed part of an XFER payload."""
+
+CHUNK_STRUCT = struct.Struct('!8sIB')
+"""Precompiled layout of the fixed part of a CHUNK payload."""
+
+ACK_STRUCT = struct.Struct('!8sI')
+"""Precompiled layout of an XACK payload."""
+
+LAST_CHUNK = 0x01
+"""Chunk flag marking the end of the stream."""
+
+MAX_CHUNK_SIZE = 0xFFFF - CHUNK_STRUCT.size
+"""Largest amount of data fitting into a single CHUNK message."""
+
+
+def pack_offer(transfer_id: bytes, chunk_size: int, peer_id: str, name: str) -> bytes:
+	peer_id_bytes = peer_id.encode('utf-8')
+	return OFFER_STRUCT.pack(transfer_id, chunk_size, len(peer_id_bytes)) + peer_id_bytes + name.encode('utf-8')
+
+
+def unpack_offer(payload) -> tuple[bytes, int, str, str]:
+	"""Returns transfer id, chunk size, recipient peer id and file name of an XFER payload."""
+	transfer_id, chunk_size, peer_id_length = OFFER_STRUCT.unpack_from(payload)
+	peer_id_end = OFFER_STRUCT.size + peer_id_length
+	peer_id = str(payload[OFFER_STRUCT.size:peer_id_end], 'utf-8')
+	return transfer_id, chunk_size, peer_id, str(payload[peer_id_end:], 'utf-8')
+
+
+def pack_chunk(transfer_id: bytes, seq: int, last: bool, data: bytes) -> bytes:
+	return CHUNK_STRUCT.pack(transfer_id, seq, LAST_CHUNK if last else 0) + data
+
+
+def unpack_chunk(payload) -> tuple[bytes, int, bool, memoryview]:
+	"""Returns transfer id, sequence number, whether it is the last chunk and the data of a CHUNK payload."""
+	transfer_id, seq, flags = CHUNK_STRUCT.unpack_from(payload)
+	return transfer_id, seq, bool(flags & LAST_CHUNK), memoryview(payload)[CHUNK_STRUCT.size:]
+
+
+def pack_ack(transfer_id: bytes, next_seq: int) -> bytes:
+	return ACK_STRUCT.pack(transfer_id, next_seq)
+
+
+def unpack_ack(payload) -> tuple[bytes, int]:
+	"""Returns transfer id and next expected sequence number of an XACK payload."""
+	return ACK_STRUCT.unpack_from(payload)
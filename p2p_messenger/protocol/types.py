@@ -10,3 +10,31 @@ class MsgType(Enum):
 	QUERY = 0x10  # Search for recipient, payload is recipient peer id (which is also the public key)
 	QHIT = 0x11  # Response to query with recipient address in sender field
 	POST = 0x12  # Chat message
+	ACK = 0x13  # Delivery acknowledgement of a POST, message id is the id of the POST, payload the accepted codecs
+	XFER = 0x14  # Offer to start or resume a stream transfer, payload is a `stream` offer
+	CHUNK = 0x15  # Sequenced piece of a stream transfer, payload is a `stream` chunk
+	XACK = 0x16  # Acknowledgement of a stream transfer, payload carries the next expected chunk
+	KEY = 0x17  # Session key for encrypted posts, encrypted with the public key of the recipient
+	SPOST = 0x18  # Chat message encrypted with a session key
+	FIND = 0x19  # DHT request for the contacts closest to a key and its address record, payload is a `dht` find
+	NODES = 0x1A  # Answer to a FIND, message id is the id of the FIND, payload lists `dht` contacts
+	STORE = 0x1B  # Request to store the address record of the sender in the DHT, payload is sender peer id
+	FSUB = 0x1C  # Subscription to the routing filter of the receiver
+	FILTER = 0x1D  # Update of the routing filter of the sender, payload is a `bloom` filter update
+	SHUF = 0x1E  # Offer to swap entries of the partial views for peer sampling, payload lists `sampling` entries
+	SREP = 0x1F  # Answer to a SHUF, message id is the id of the SHUF, payload lists `sampling` entries
+	BEAT = 0x20  # Heartbeat over an outbound neighbour connection, payload is the send time of the sender
+	BACK = 0x21  # Answer to a BEAT over the same connection, message id and payload are those of the BEAT
+
+
+FLOOD_TYPES = frozenset({MsgType.PING, MsgType.PONG, MsgType.QUERY})
+"""Message types of network-wide floods, which are dropped first when a connection is overloaded."""
+
+SESSION_TYPES = frozenset({MsgType.KEY, MsgType.POST, MsgType.SPOST, MsgType.XFER, MsgType.CHUNK})
+"""Message types sent to a recipient over a post session, which need no state of the overlay to be handled."""
+
+BINARY_TYPES = frozenset({
+	MsgType.XFER, MsgType.CHUNK, MsgType.XACK, MsgType.KEY, MsgType.SPOST, MsgType.FIND, MsgType.NODES, MsgType.FILTER,
+	MsgType.SHUF, MsgType.SREP, MsgType.BEAT, MsgType.BACK
+})
+"""Message types whose payload is binary rather than text, which is never decoded, e.g. for logging."""
@@ -1,12 +1,20 @@
+import functools
 import logging
 import struct
 import socket
 import rsa
 import base64
+from typing import Optional
 
 RSA_PREFIX = base64.standard_b64encode(b'-----BEGIN RSA PUBLIC KEY-----').decode("utf-8")
 RSA_SUFFIX = base64.standard_b64encode(b'-----END RSA PUBLIC KEY-----').decode("utf-8")
 
+KEY_CACHE_SIZE = 1024
+"""Maximum number of parsed public keys kept by `peer_id_to_pub_key`."""
+
+TIMESTAMP_STRUCT = struct.Struct('!d')
+"""Layout of the send time a BEAT carries and its answer echoes."""
+
 def ip_to_num(ip):
 	"""Convert IP address of sender as single number IP address of sender as single number."""
 	return struct.unpack('>L', socket.inet_aton(ip))[0]
@@ -17,18 +25,31 @@ def num_to_ip(num) -> str:
 	return socket.inet_ntoa(struct.pack('>L', num))
 
 
+def pack_timestamp(timestamp: float) -> bytes:
+	"""Returns the payload of a BEAT carrying its send time."""
+	return TIMESTAMP_STRUCT.pack(timestamp)
+
+
+def unpack_timestamp(payload) -> Optional[float]:
+	"""Returns the send time echoed in the answer to a BEAT, or None if the answer carries none."""
+	return TIMESTAMP_STRUCT.unpack_from(payload)[0] if len(payload) >= TIMESTAMP_STRUCT.size else None
+
+
 def pub_key_to_peer_id(pub_key: rsa.PublicKey) -> str:
 	"""Formats public key as peer id string."""
 
 	pem = pub_key._save_pkcs1_pem()
 	peer_id_bytes = base64.standard_b64encode(pem)
 	peer_id = peer_id_bytes.decode('utf-8')
-	print('Complete rsa: ', peer_id)
 	return peer_id[len(RSA_PREFIX):-len(RSA_SUFFIX)]
 
 
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
 def peer_id_to_pub_key(peer_id: str) -> rsa.PublicKey:
-	"""Convert peer id string to public key."""
+	"""
+	Convert peer id string to public key.
+	Parsed keys are cached, callers must not modify the returned key.
+	"""
 
 	logging.debug(f"Converting peer id string <{peer_id}> (length: {len(peer_id)}) to public key")
 
@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+from p2p_messenger.config import Config
+from p2p_messenger.node.admission import AdmissionControl, TokenBucket
+from p2p_messenger.protocol import types
+
+
+class TokenBucketTest(unittest.TestCase):
+	def test_starts_full_with_burst(self):
+		bucket = TokenBucket(rate=1, burst=3, now=0)
+		self.assertEqual([bucket.take(0) for _ in range(4)], [True, True, True, False])
+
+	def test_refills_at_rate(self):
+		bucket = TokenBucket(rate=2, burst=3, now=0)
+		for _ in range(3):
+			bucket.take(0)
+		self.assertFalse(bucket.take(0.4))
+		self.assertTrue(bucket.take(0.5))
+		self.assertFalse(bucket.take(0.5))
+
+	def test_refill_is_capped_at_burst(self):
+		bucket = TokenBucket(rate=10, burst=2, now=0)
+		self.assertEqual([bucket.take(100) for _ in range(3)], [True, True, False])
+
+
+class AdmissionControlTest(unittest.TestCase):
+	def setUp(self):
+		limits = {'PING': {'rate': 1, 'burst': 2}, 'QUERY': {'rate': 10, 'burst': 1}}
+		for name, value in [('admission', True), ('admission_max_handlers', 3), ('admission_limits', limits)]:
+			patcher = mock.patch.object(Config, name, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		self.admission = AdmissionControl()
+
+	def admit(self, peer, msg_type: types.MsgType, now: float) -> bool:
+		admitted = self.admission.admit(peer, msg_type, now)
+		if admitted:
+			self.admission.done(msg_type)
+		return admitted
+
+	def test_limits_each_type_on_its_own(self):
+		self.assertEqual([self.admit('a', types.MsgType.PING, 0) for _ in range(3)], [True, True, False])
+		self.assertTrue(self.admit('a', types.MsgType.QUERY, 0))
+		self.assertFalse(self.admit('a', types.MsgType.QUERY, 0))
+		self.assertTrue(self.admit('a', types.MsgType.QUERY, 0.1))
+		self.assertTrue(self.admit('a', types.MsgType.PING, 1))
+		self.assertEqual(self.admission.stats()['rate_limited'], 2)
+
+	def test_limits_each_connection_on_its_own(self):
+		for _ in range(2):
+			self.admit('a', types.MsgType.PING, 0)
+		self.assertFalse(self.admit('a', types.MsgType.PING, 0))
+		self.assertTrue(self.admit('b', types.MsgType.PING, 0))
+
+	def test_unlimited_types_are_always_admitted(self):
+		self.assertTrue(all(self.admit('a', types.MsgType.POST, 0) for _ in range(100)))
+		self.assertEqual(self.admission.stats()['rate_limited'], 0)
+
+	def test_running_handlers_are_limited(self):
+		peers = ['a', 'b', 'c', 'd']
+		admitted = [self.admission.admit(peer, types.MsgType.PING, 0) for peer in peers]
+		self.assertEqual(admitted, [True, True, True, False])
+		self.assertEqual(self.admission.stats(), {'running': 3, 'rate_limited': 0, 'overloaded': 1})
+		self.admission.done(types.MsgType.PING)
+		self.assertTrue(self.admission.admit('d', types.MsgType.PING, 0))
+
+	def test_disabled(self):
+		Config.admission = False
+		self.assertTrue(all(self.admit('a', types.MsgType.PING, 0) for _ in range(10)))
+
+	def test_removed_connection_starts_with_a_full_bucket(self):
+		for _ in range(2):
+			self.admit('a', types.MsgType.PING, 0)
+		self.admission.remove('a')
+		self.assertTrue(self.admit('a', types.MsgType.PING, 0))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,41 @@
+import struct
+import unittest
+
+from p2p_messenger.config import Config
+from p2p_messenger.protocol import bloom
+
+
+class UnpackFilterTest(unittest.TestCase):
+	def test_round_trip(self):
+		deltas = [0, bloom.mask(b'peer', Config.bloom_size, Config.bloom_hashes), (1 << Config.bloom_size) - 1]
+		payload = bloom.pack_filter(deltas, Config.bloom_size, Config.bloom_hashes)
+		self.assertEqual(bloom.unpack_filter(payload), deltas)
+
+	def test_rejects_other_size_or_hashes(self):
+		for size, hashes in [(Config.bloom_size * 2, Config.bloom_hashes), (Config.bloom_size, Config.bloom_hashes + 1)]:
+			with self.assertRaises(ValueError):
+				bloom.unpack_filter(bloom.FILTER_STRUCT.pack(size, hashes, 0))
+
+	def test_rejects_position_beyond_size(self):
+		payload = b''.join([
+			bloom.FILTER_STRUCT.pack(Config.bloom_size, Config.bloom_hashes, 1),
+			bytes([bloom.SPARSE]), bloom.COUNT_STRUCT.pack(1), struct.pack('!I', 0xFFFFFFFF)
+		])
+		with self.assertRaises(ValueError):
+			bloom.unpack_filter(payload)
+
+	def test_rejects_too_many_levels(self):
+		levels = Config.bloom_depth + 1
+		payload = bloom.FILTER_STRUCT.pack(Config.bloom_size, Config.bloom_hashes, levels) + bytes(levels)
+		with self.assertRaises(ValueError):
+			bloom.unpack_filter(payload)
+
+	def test_rejects_truncated_payload(self):
+		payload = bloom.pack_filter([1 << 3], Config.bloom_size, Config.bloom_hashes)
+		for end in range(len(payload)):
+			with self.assertRaises(ValueError):
+				bloom.unpack_filter(payload[:end])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,82 @@
+import threading
+import unittest
+from unittest import mock
+
+from p2p_messenger.node.cache import SeenCache
+
+
+class SeenCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.now = 100.0
+		patcher = mock.patch('p2p_messenger.node.cache.monotonic', lambda: self.now)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_entries_expire(self):
+		cache = SeenCache(10, expiry=5)
+		cache.add('a', 1)
+		cache.add('b', 2, expiry=20)
+		self.now += 4.9
+		self.assertEqual(cache.get('a'), 1)
+		self.now += 0.1
+		self.assertNotIn('a', cache)
+		self.assertEqual(cache.get('b'), 2)
+		self.assertEqual(cache.stats()['expirations'], 1)
+
+	def test_oldest_entry_is_evicted_at_capacity(self):
+		cache = SeenCache(2, expiry=60)
+		cache.add('a')
+		cache.add('b')
+		self.assertIn('a', cache)
+		cache.add('c')
+		self.assertNotIn('a', cache)
+		self.assertEqual(len(cache), 2)
+		self.assertEqual(cache.stats()['evictions'], 1)
+
+	def test_least_recently_used_entry_is_evicted(self):
+		cache = SeenCache(2, expiry=60, lru=True)
+		cache.add('a')
+		cache.add('b')
+		self.assertIn('a', cache)
+		cache.add('c')
+		self.assertIn('a', cache)
+		self.assertNotIn('b', cache)
+
+	def test_counters(self):
+		cache = SeenCache(1, expiry=5)
+		cache.add('a')
+		self.assertIn('a', cache)
+		self.assertNotIn('b', cache)
+		cache.add('b')
+		self.now += 5
+		self.assertNotIn('b', cache)
+		self.assertEqual(cache.stats(), {'size': 0, 'hits': 1, 'misses': 2, 'evictions': 1, 'expirations': 1})
+
+	def test_add_if_absent(self):
+		cache = SeenCache(10, expiry=5)
+		self.assertTrue(cache.add_if_absent('a', 1))
+		self.assertFalse(cache.add_if_absent('a', 2))
+		self.assertEqual(cache.get('a'), 1)
+		self.now += 5
+		self.assertTrue(cache.add_if_absent('a', 3))
+		self.assertEqual(cache.get('a'), 3)
+
+	def test_add_if_absent_admits_one_of_concurrent_callers(self):
+		cache = SeenCache(1000, expiry=60)
+		inserted = []
+		barrier = threading.Barrier(8)
+
+		def insert():
+			barrier.wait()
+			inserted.extend(key for key in range(1000) if cache.add_if_absent(key))
+
+		threads = [threading.Thread(target=insert) for _ in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(sorted(inserted), list(range(1000)))
+
+
+if __name__ == '__main__':
+	unittest.main()
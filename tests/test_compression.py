@@ -0,0 +1,86 @@
+import os
+import unittest
+import zlib
+
+from p2p_messenger.config import Config
+from p2p_messenger.protocol import Header, compression, types
+
+TEXT = b'the quick brown fox jumps over the lazy dog ' * 20
+
+
+class CodecTest(unittest.TestCase):
+	def test_codec_is_abstract(self):
+		with self.assertRaises(TypeError):
+			compression.Codec(2, 'none')
+
+	def test_round_trip(self):
+		self.assertEqual(compression.decompress(1, zlib.compress(TEXT), compression.MAX_SIZE), TEXT)
+
+	def test_decompressed_size_is_capped(self):
+		self.assertEqual(len(compression.decompress(1, zlib.compress(bytes(0xFFFF)), compression.MAX_SIZE)), 0xFFFF)
+		with self.assertRaises(ValueError):
+			compression.decompress(1, zlib.compress(bytes(0x10000)), compression.MAX_SIZE)
+
+	def test_invalid_data_is_rejected(self):
+		for codec_id, data in [(1, b'not zlib'), (1, zlib.compress(TEXT)[:-4]), (0x0F, zlib.compress(TEXT))]:
+			with self.assertRaises(ValueError):
+				compression.decompress(codec_id, data, compression.MAX_SIZE)
+
+
+class CompressorTest(unittest.TestCase):
+	def setUp(self):
+		codecs = Config.compression_codecs
+		Config.compression_codecs = ['zlib']
+		self.addCleanup(setattr, Config, 'compression_codecs', codecs)
+
+	def test_negotiate(self):
+		self.assertEqual(compression.Compressor.negotiate(bytes([0x0F, 1])).codec.name, 'zlib')
+		self.assertIsNone(compression.Compressor.negotiate(b''))
+		self.assertIsNone(compression.Compressor.negotiate(bytes([0x0F])))
+		Config.compression_codecs = []
+		self.assertIsNone(compression.Compressor.negotiate(bytes([1])))
+
+	def test_compresses_text(self):
+		codec_id, payload = compression.Compressor(compression.CODECS[1]).compress(TEXT)
+		self.assertEqual(codec_id, 1)
+		self.assertEqual(zlib.decompress(payload), TEXT)
+
+	def test_small_payload_is_sent_raw(self):
+		data = TEXT[:Config.compression_min_size - 1]
+		self.assertEqual(compression.Compressor(compression.CODECS[1]).compress(data), (0, data))
+
+	def test_incompressible_payload_is_sent_raw_and_backs_off(self):
+		compressor = compression.Compressor(compression.CODECS[1])
+		data = os.urandom(1000)
+		self.assertEqual(compressor.compress(data), (0, data))
+		# the next payload is not even tried, however well it compresses
+		self.assertEqual(compressor.compress(TEXT), (0, TEXT))
+		self.assertEqual(compressor.compress(TEXT)[0], 1)
+
+	def test_backoff_doubles_up_to_its_maximum(self):
+		compressor = compression.Compressor(compression.CODECS[1])
+		data = os.urandom(1000)
+		skipped = []
+		for _ in range(8):
+			self.assertEqual(compressor.compress(data), (0, data))
+			skipped.append(compressor._skip)
+			for _ in range(compressor._skip):
+				compressor.compress(data)
+		self.assertEqual(skipped, [1, 2, 4, 8, 16, 32, 64, 64])
+
+
+class HeaderCodecTest(unittest.TestCase):
+	def test_codec_id_is_stored_in_the_upper_bits_of_the_version_byte(self):
+		header = Header(version=1, msg_type=types.MsgType.POST, port=1, codec=0x0F)
+		data = header.bytes()
+		self.assertEqual(data[0], 0xF1)
+		decoded = Header.from_bytes(data)
+		self.assertEqual((decoded.version, decoded.codec), (1, 0x0F))
+
+	def test_uncompressed_header_keeps_the_version_byte(self):
+		data = Header(version=1, msg_type=types.MsgType.POST, port=1).bytes()
+		self.assertEqual(data[0], 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+import rsa
+
+from p2p_messenger.config import Config
+from p2p_messenger.node import Node
+from p2p_messenger.protocol.crypto import KEY_ID_SIZE, DecryptionError, SessionKey, key_id_of
+
+
+class SessionKeyTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.pub_key, cls.private_key = rsa.newkeys(512)
+
+	def test_seal_and_open(self):
+		key = SessionKey()
+		payload = key.seal(b'hello')
+		self.assertEqual(key_id_of(payload), key.key_id)
+		self.assertEqual(key.open(payload), b'hello')
+		self.assertEqual(key.open(memoryview(payload)), b'hello')
+
+	def test_nonces_differ(self):
+		key = SessionKey()
+		self.assertNotEqual(key.seal(b'hello'), key.seal(b'hello'))
+
+	def test_flipped_ciphertext_byte_is_rejected(self):
+		key = SessionKey()
+		payload = bytearray(key.seal(b'hello'))
+		payload[-1] ^= 1
+		with self.assertRaises(DecryptionError):
+			key.open(payload)
+
+	def test_flipped_key_id_byte_is_rejected(self):
+		key = SessionKey()
+		payload = bytearray(key.seal(b'hello'))
+		payload[0] ^= 1
+		# the key id is authenticated, so a key with the modified id cannot open the message either
+		with self.assertRaises(DecryptionError):
+			SessionKey(key.key, bytes(payload[:KEY_ID_SIZE])).open(payload)
+
+	def test_other_key_is_rejected(self):
+		with self.assertRaises(DecryptionError):
+			SessionKey().open(SessionKey().seal(b'hello'))
+
+	def test_wrap_and_unwrap(self):
+		key = SessionKey()
+		wrapped = key.wrap(self.pub_key)
+		self.assertEqual(key_id_of(wrapped), key.key_id)
+		unwrapped = SessionKey.unwrap(wrapped, self.private_key)
+		self.assertEqual((unwrapped.key, unwrapped.key_id), (key.key, key.key_id))
+		self.assertEqual(unwrapped.open(key.seal(b'hello')), b'hello')
+
+	def test_unwrap_with_other_key_is_rejected(self):
+		_, other_private_key = rsa.newkeys(512)
+		with self.assertRaises(DecryptionError):
+			SessionKey.unwrap(SessionKey().wrap(self.pub_key), other_private_key)
+
+
+class NodeKeyTest(unittest.TestCase):
+	def test_small_key_is_refused(self):
+		keys = rsa.newkeys(512)
+		with self.assertRaises(ValueError):
+			Node(0, [], keys=keys, persist=False)
+
+	def test_small_key_is_replaced_on_request(self):
+		keys = rsa.newkeys(512)
+		replace_small_key = Config.replace_small_key
+		Config.replace_small_key = True
+		try:
+			node = Node(0, [], keys=keys, persist=False)
+		finally:
+			Config.replace_small_key = replace_small_key
+		self.assertGreaterEqual(node.pub_key.n.bit_length(), Config.key_size)
+		self.assertNotEqual(node.pub_key, keys[0])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,100 @@
+import random
+import unittest
+
+from p2p_messenger.protocol import FrameDecoder, Message, types
+from p2p_messenger.protocol.framing import HEADER_SIZE, MAX_FRAME_SIZE
+
+
+def frame(payload: bytes, msg_type: types.MsgType = types.MsgType.POST) -> bytes:
+	return bytes(Message(msg_type, ('10.0.0.1', 1337), payload=payload).bytes())
+
+
+def drain(decoder: FrameDecoder) -> list[bytes]:
+	# the views are only valid until the next feed
+	return [bytes(raw) for _, raw in decoder.frames()]
+
+
+class FrameDecoderTest(unittest.TestCase):
+	def test_partial_header(self):
+		decoder = FrameDecoder()
+		data = frame(b'hello')
+		decoder.feed(data[:HEADER_SIZE - 1])
+		self.assertEqual(drain(decoder), [])
+		decoder.feed(data[HEADER_SIZE - 1:])
+		self.assertEqual(drain(decoder), [data])
+
+	def test_partial_payload(self):
+		decoder = FrameDecoder()
+		data = frame(b'hello world')
+		decoder.feed(data[:HEADER_SIZE + 3])
+		self.assertEqual(drain(decoder), [])
+		decoder.feed(data[HEADER_SIZE + 3:])
+		self.assertEqual(drain(decoder), [data])
+
+	def test_byte_by_byte(self):
+		decoder = FrameDecoder()
+		data = frame(b'hello')
+		received = []
+		for i in range(len(data)):
+			decoder.feed(data[i:i + 1])
+			received.extend(drain(decoder))
+		self.assertEqual(received, [data])
+
+	def test_coalesced_frames(self):
+		decoder = FrameDecoder()
+		frames = [frame(b''), frame(b'a' * 100), frame(b'b', types.MsgType.QUERY)]
+		decoder.feed(b''.join(frames) + frames[0][:5])
+		self.assertEqual(drain(decoder), frames)
+		decoder.feed(frames[0][5:])
+		self.assertEqual(drain(decoder), [frames[0]])
+
+	def test_headers_are_decoded(self):
+		decoder = FrameDecoder()
+		decoder.feed(frame(b'abc', types.MsgType.QUERY))
+		[(header, raw)] = decoder.frames()
+		self.assertEqual(header.msg_type, types.MsgType.QUERY)
+		self.assertEqual(header.length, 3)
+		self.assertEqual(bytes(raw[HEADER_SIZE:]), b'abc')
+
+	def test_frames_across_compaction(self):
+		rnd = random.Random(1)
+		decoder = FrameDecoder()
+		frames = [frame(rnd.randbytes(rnd.choice([0, 7, 1000, 40000, 0xFFFF]))) for _ in range(40)]
+		stream = b''.join(frames)
+		self.assertGreater(len(stream), 4 * len(decoder.buffer))
+		received = []
+		offset = 0
+		while offset < len(stream):
+			size = rnd.randint(1, MAX_FRAME_SIZE)
+			decoder.feed(stream[offset:offset + size])
+			offset += size
+			received.extend(drain(decoder))
+		self.assertEqual(received, frames)
+		self.assertEqual(decoder.start, decoder.end)
+
+	def test_largest_frame(self):
+		decoder = FrameDecoder()
+		data = frame(bytes(0xFFFF))
+		self.assertEqual(len(data), MAX_FRAME_SIZE)
+		decoder.feed(data)
+		self.assertEqual(drain(decoder), [data])
+
+	def test_rejects_oversize_feed(self):
+		decoder = FrameDecoder()
+		with self.assertRaises(ValueError):
+			decoder.feed(bytes(len(decoder.buffer) + 1))
+		decoder.feed(frame(b'a')[:HEADER_SIZE])
+		with self.assertRaises(ValueError):
+			decoder.feed(bytes(len(decoder.buffer)))
+
+	def test_rejects_unknown_type(self):
+		decoder = FrameDecoder()
+		data = bytearray(frame(b''))
+		data[1] = 0xFF
+		decoder.feed(data)
+		with self.assertRaises(ValueError):
+			drain(decoder)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,68 @@
+import threading
+import unittest
+
+from p2p_messenger.protocol.ids import CounterIdGenerator, HashIdGenerator, MessageIdGenerator
+
+
+class MessageIdGeneratorTest(unittest.TestCase):
+	def test_is_abstract(self):
+		with self.assertRaises(TypeError):
+			MessageIdGenerator()
+
+
+class CounterIdGeneratorTest(unittest.TestCase):
+	def test_ids_are_four_bytes(self):
+		self.assertEqual(len(CounterIdGenerator().next_id()), 4)
+
+	def test_no_duplicates_across_threads(self):
+		generator = CounterIdGenerator()
+		results = [[] for _ in range(8)]
+
+		def generate(out: list):
+			out.extend(generator.next_id() for _ in range(50000))
+
+		threads = [threading.Thread(target=generate, args=[out]) for out in results]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		ids = [message_id for out in results for message_id in out]
+		self.assertEqual(len(ids), len(set(ids)))
+
+	def test_no_duplicates_until_counter_wraps(self):
+		generator = CounterIdGenerator(prefix_bits=20)
+		ids = [generator.next_id() for _ in range(1 << 12)]
+		self.assertEqual(len(set(ids)), 1 << 12)
+
+	def test_ids_repeat_after_counter_wraps(self):
+		generator = CounterIdGenerator(prefix_bits=24)
+		ids = [generator.next_id() for _ in range(512)]
+		self.assertEqual(len(set(ids)), 256)
+		self.assertEqual(ids[:256], ids[256:])
+
+	def test_prefix_is_kept_when_counter_wraps(self):
+		generator = CounterIdGenerator(prefix_bits=24)
+		prefixes = {generator.next_id()[:3] for _ in range(300)}
+		self.assertEqual(len(prefixes), 1)
+
+	def test_counter_only(self):
+		generator = CounterIdGenerator(prefix_bits=0)
+		first, second = generator.next_id(), generator.next_id()
+		self.assertEqual((int.from_bytes(first, 'big') + 1) & 0xFFFFFFFF, int.from_bytes(second, 'big'))
+
+
+class HashIdGeneratorTest(unittest.TestCase):
+	def test_sequence_is_not_lost_across_threads(self):
+		generator = HashIdGenerator('10.0.0.1', 1337)
+		threads = [
+			threading.Thread(target=lambda: [generator.next_id() for _ in range(10000)]) for _ in range(4)
+		]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(generator.sequence_id, 40000)
+
+
+if __name__ == '__main__':
+	unittest.main()
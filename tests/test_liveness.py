@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+
+from p2p_messenger.config import Config
+from p2p_messenger.node.liveness import Backoff, FailureDetector
+
+
+class FailureDetectorTest(unittest.TestCase):
+	def setUp(self):
+		settings = [
+			('heartbeat_interval', 1), ('heartbeat_phi_threshold', 8), ('heartbeat_window', 100), ('heartbeat_min_std', 0.2)
+		]
+		for name, value in settings:
+			patcher = mock.patch.object(Config, name, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		self.detector = FailureDetector()
+
+	def beat(self, peer, times: list[float]):
+		self.detector.watch(peer, times[0])
+		for now in times[1:]:
+			self.detector.heartbeat(peer, now)
+
+	def crossing(self, peer, last: float) -> float:
+		"""Returns the first time in steps of 10 ms at which phi exceeds the threshold."""
+		now = last
+		while self.detector.phi(peer, now) <= Config.heartbeat_phi_threshold:
+			now = round(now + 0.01, 2)
+		return now
+
+	def test_phi_grows_with_missed_heartbeats(self):
+		self.beat('a', [float(t) for t in range(20)])
+		phis = [self.detector.phi('a', 19 + missed) for missed in (0.5, 1, 1.5, 2, 3)]
+		self.assertEqual(phis, sorted(phis))
+		self.assertLess(phis[1], 1)
+		self.assertGreater(phis[-1], Config.heartbeat_phi_threshold)
+
+	def test_threshold_is_crossed_after_missed_heartbeats(self):
+		self.beat('a', [float(t) for t in range(20)])
+		self.assertFalse(self.detector.suspect('a', 20))
+		crossed = self.crossing('a', 19)
+		self.assertTrue(20 < crossed < 22)
+		self.assertFalse(self.detector.suspect('a', crossed - 0.01))
+		self.assertTrue(self.detector.suspect('a', crossed))
+		# a suspected connection is no longer watched
+		self.assertEqual(self.detector.phi('a', crossed + 10), 0)
+		self.assertFalse(self.detector.suspect('a', crossed + 10))
+		self.assertEqual(self.detector.stats()['suspected'], 1)
+		self.assertAlmostEqual(self.detector.stats()['mean_detection_latency'], crossed - 19)
+
+	def test_jitter_delays_suspicion(self):
+		self.beat('steady', [float(t) for t in range(21)])
+		self.beat('jittery', [t + (0.8 if t % 2 else 0) for t in range(21)])
+		self.assertGreater(self.crossing('jittery', 20), self.crossing('steady', 20))
+
+	def test_silent_connection_is_suspected(self):
+		self.detector.watch('a', 0)
+		self.assertFalse(self.detector.suspect('a', 1))
+		self.assertTrue(self.detector.suspect('a', 3))
+
+	def test_unwatched_connection_is_never_suspected(self):
+		self.detector.heartbeat('a', 1)
+		self.assertFalse(self.detector.suspect('a', 100))
+		self.beat('b', [0, 1])
+		self.detector.remove('b')
+		self.assertFalse(self.detector.suspect('b', 100))
+
+
+class BackoffTest(unittest.TestCase):
+	def setUp(self):
+		for name, value in [('replace_backoff', 1), ('replace_max_backoff', 8)]:
+			patcher = mock.patch.object(Config, name, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		self.backoff = Backoff()
+
+	def test_delay_doubles_up_to_its_cap(self):
+		now = 0
+		delays = []
+		for _ in range(6):
+			self.backoff.failed('a', now)
+			next_attempt, delay = self.backoff.retries['a']
+			delays.append(delay)
+			self.assertFalse(self.backoff.ready('a', next_attempt - 0.001))
+			self.assertTrue(self.backoff.ready('a', next_attempt))
+			now = next_attempt
+		self.assertEqual(delays, [1, 2, 4, 8, 8, 8])
+
+	def test_success_resets_the_delay(self):
+		self.backoff.failed('a', 0)
+		self.backoff.failed('a', 1)
+		self.backoff.succeeded('a')
+		self.assertTrue(self.backoff.ready('a', 1))
+		self.backoff.failed('a', 10)
+		self.assertEqual(self.backoff.retries['a'], (11, 1))
+
+	def test_keys_back_off_independently(self):
+		self.backoff.failed('a', 0)
+		self.assertFalse(self.backoff.ready('a', 0.5))
+		self.assertTrue(self.backoff.ready('b', 0.5))
+
+
+if __name__ == '__main__':
+	unittest.main()
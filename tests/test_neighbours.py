@@ -0,0 +1,42 @@
+import threading
+import unittest
+
+from p2p_messenger.node.neighbours import NeighbourTable
+
+
+class FakePeer:
+	def __init__(self, addr: tuple[str, int]):
+		self.addr = addr
+		self.peer_id = None
+		self.socket = object()
+
+
+class NeighbourTableTest(unittest.TestCase):
+	def test_refuses_second_outbound_link_to_address(self):
+		table = NeighbourTable()
+		first, second = FakePeer(('10.0.0.1', 1337)), FakePeer(('10.0.0.1', 1337))
+		self.assertTrue(table.add(first, outbound=True))
+		self.assertFalse(table.add(second, outbound=True))
+		self.assertEqual(table.outbound, (first,))
+		self.assertIsNone(table.by_socket(second.socket))
+
+	def test_inbound_link_to_outbound_address_is_kept(self):
+		table = NeighbourTable()
+		outbound, inbound = FakePeer(('10.0.0.1', 1337)), FakePeer(('10.0.0.1', 1337))
+		self.assertTrue(table.add(outbound, outbound=True))
+		self.assertTrue(table.add(inbound, outbound=False))
+		self.assertEqual(table.inbound, (inbound,))
+
+	def test_concurrent_adds_register_one_link(self):
+		table = NeighbourTable()
+		peers = [FakePeer(('10.0.0.1', 1337)) for _ in range(8)]
+		threads = [threading.Thread(target=table.add, args=[peer]) for peer in peers]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(len(table.outbound), 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,127 @@
+import random
+import unittest
+from unittest import mock
+
+from p2p_messenger.config import Config
+from p2p_messenger.node.routing import Lookup, RoutingTable
+from p2p_messenger.protocol import dht
+
+
+def key(n: int) -> bytes:
+	return n.to_bytes(dht.KEY_SIZE, 'big')
+
+
+def addr(n: int) -> tuple[str, int]:
+	return '10.0.0.1', 1000 + n
+
+
+class RoutingTableTest(unittest.TestCase):
+	def setUp(self):
+		for name, value in [('dht_k', 2), ('dht_alpha', 3)]:
+			patcher = mock.patch.object(Config, name, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		self.table = RoutingTable(key(0))
+
+	def test_contacts_go_to_the_bucket_of_their_distance(self):
+		for n in (1, 2, 3, 4, 1 << 100):
+			self.table.update(key(n), addr(n))
+		self.assertEqual(list(self.table.buckets[0]), [key(1)])
+		self.assertEqual(list(self.table.buckets[1]), [key(2), key(3)])
+		self.assertEqual(list(self.table.buckets[2]), [key(4)])
+		self.assertEqual(list(self.table.buckets[100]), [key(1 << 100)])
+		self.assertEqual(len(self.table), 5)
+
+	def test_own_key_is_ignored(self):
+		self.table.update(key(0), addr(0))
+		self.assertEqual(len(self.table), 0)
+		self.assertIsNone(self.table.get(key(0)))
+
+	def test_seen_contact_moves_to_the_end(self):
+		self.table.update(key(4), addr(4))
+		self.table.update(key(5), addr(5))
+		self.table.update(key(4), addr(40))
+		self.assertEqual(list(self.table.buckets[2].items()), [(key(5), addr(5)), (key(4), addr(40))])
+
+	def test_full_bucket_keeps_its_contacts(self):
+		for n in (4, 5, 6, 7):
+			self.table.update(key(n), addr(n))
+		self.assertEqual(list(self.table.buckets[2]), [key(4), key(5)])
+		self.assertEqual(list(self.table.replacements[2]), [key(6), key(7)])
+		self.assertIsNone(self.table.get(key(6)))
+
+	def test_replacements_are_bounded(self):
+		for n in range(8, 16):
+			self.table.update(key(n), addr(n))
+		self.assertEqual(list(self.table.replacements[3]), [key(14), key(15)])
+
+	def test_removed_contact_is_replaced_by_the_latest_replacement(self):
+		for n in (4, 5, 6, 7):
+			self.table.update(key(n), addr(n))
+		self.table.remove(key(4))
+		self.assertEqual(list(self.table.buckets[2]), [key(5), key(7)])
+		self.assertEqual(list(self.table.replacements[2]), [key(6)])
+		self.table.remove(key(1))
+		self.assertEqual(len(self.table), 2)
+
+	def test_closest_orders_by_xor_distance(self):
+		for n in (16, 1, 2, 4, 8, 9):
+			self.table.update(key(n), addr(n))
+		self.assertEqual([contact for contact, _ in self.table.closest(key(9), 4)], [key(9), key(8), key(1), key(2)])
+		self.assertEqual(len(self.table.closest(key(9), 100)), 6)
+
+
+class LookupTest(unittest.TestCase):
+	def setUp(self):
+		for name, value in [('dht_k', 4), ('dht_alpha', 2)]:
+			patcher = mock.patch.object(Config, name, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		rnd = random.Random(1)
+		self.keys = [rnd.randbytes(dht.KEY_SIZE) for _ in range(200)]
+		self.addrs = {k: ('10.0.0.1', 1000 + i) for i, k in enumerate(self.keys)}
+		# every node has seen every other node, in random order, but the buckets keep only k of them each
+		self.tables = {}
+		for k in self.keys:
+			table = self.tables[k] = RoutingTable(k)
+			for other in rnd.sample(self.keys, len(self.keys)):
+				table.update(other, self.addrs[other])
+
+	def run_lookup(self, own_key: bytes, target: bytes, find_record: bool, failing: frozenset = frozenset()) -> Lookup:
+		lookup = Lookup(own_key, target, self.tables[own_key].closest(target, Config.dht_k), find_record)
+		while not lookup.done:
+			batch = lookup.next_batch()
+			self.assertTrue(batch, 'lookup stalled')
+			for contact_key, _ in batch:
+				if contact_key in failing:
+					lookup.on_failure(contact_key)
+					continue
+				table = self.tables[contact_key]
+				record = self.addrs[target] if contact_key == target or table.get(target) else None
+				lookup.on_reply(contact_key, record, table.closest(target, Config.dht_k))
+		return lookup
+
+	def test_converges_on_the_closest_nodes(self):
+		own_key = self.keys[0]
+		target = bytes(dht.KEY_SIZE)
+		lookup = self.run_lookup(own_key, target, find_record=False)
+		expected = sorted((k for k in self.keys if k != own_key), key=lambda k: dht.distance(k, target))[:Config.dht_k]
+		self.assertEqual([k for k, _ in lookup.closest()], expected)
+		self.assertLessEqual(lookup.rounds, 10)
+
+	def test_finds_the_record_of_a_node(self):
+		target = self.keys[-1]
+		lookup = self.run_lookup(self.keys[0], target, find_record=True)
+		self.assertEqual(lookup.record, self.addrs[target])
+
+	def test_failed_contacts_are_dropped(self):
+		own_key = self.keys[0]
+		target = bytes(dht.KEY_SIZE)
+		closest = sorted((k for k in self.keys if k != own_key), key=lambda k: dht.distance(k, target))
+		lookup = self.run_lookup(own_key, target, find_record=False, failing=frozenset(closest[:1]))
+		self.assertEqual([k for k, _ in lookup.closest()], closest[1:Config.dht_k + 1])
+		self.assertEqual(lookup.in_flight, 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
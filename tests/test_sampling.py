@@ -0,0 +1,69 @@
+import random
+import unittest
+from unittest import mock
+
+from p2p_messenger.config import Config
+from p2p_messenger.node.sampling import PartialView
+
+OWN_ADDR = ('10.0.0.1', 1000)
+
+
+def addr(n: int) -> tuple[str, int]:
+	return '10.0.0.2', 1000 + n
+
+
+class PartialViewMergeTest(unittest.TestCase):
+	def setUp(self):
+		patcher = mock.patch.object(Config, 'sampling_view_size', 4)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.view = PartialView(OWN_ADDR)
+
+	def test_free_slots_are_filled_first(self):
+		self.view.add([addr(1), addr(2)])
+		self.view.merge([(addr(3), 1), (addr(4), 2)], sent=[(addr(1), 0)])
+		self.assertEqual(self.view.entries, {addr(1): 0, addr(2): 0, addr(3): 1, addr(4): 2})
+
+	def test_sent_entries_are_replaced_when_full(self):
+		self.view.add([addr(n) for n in range(1, 5)])
+		self.view.merge([(addr(5), 1), (addr(6), 1), (addr(7), 1)], sent=[(addr(2), 0), (addr(4), 0)])
+		self.assertEqual(set(self.view.entries), {addr(1), addr(3), addr(5), addr(6)})
+
+	def test_known_entry_keeps_the_lower_age(self):
+		self.view.add([addr(1)])
+		self.view.entries[addr(1)] = 5
+		self.view.merge([(addr(1), 2)], sent=[])
+		self.assertEqual(self.view.entries[addr(1)], 2)
+		self.view.merge([(addr(1), 7)], sent=[])
+		self.assertEqual(self.view.entries[addr(1)], 2)
+
+	def test_own_address_is_never_added(self):
+		self.view.merge([(OWN_ADDR, 0)], sent=[])
+		self.assertNotIn(OWN_ADDR, self.view.entries)
+
+	def test_entries_that_were_not_sent_are_kept(self):
+		self.view.add([addr(n) for n in range(1, 5)])
+		# an entry that is no longer in the view cannot make room
+		self.view.merge([(addr(5), 0)], sent=[(addr(9), 0)])
+		self.assertEqual(set(self.view.entries), {addr(n) for n in range(1, 5)})
+
+	def test_random_shuffles_keep_the_invariants(self):
+		rnd = random.Random(1)
+		random.seed(1)
+		self.view.add([addr(n) for n in range(1, 3)])
+		for _ in range(500):
+			before = dict(self.view.entries)
+			sent = self.view.sample(3) + ([(addr(50), 0)] if rnd.random() < 0.2 else [])
+			received = [(addr(rnd.randrange(20)), rnd.randrange(5)) for _ in range(rnd.randrange(5))]
+			if rnd.random() < 0.3:
+				received.append((OWN_ADDR, 0))
+			self.view.merge(received, sent)
+			self.assertLessEqual(len(self.view), Config.sampling_view_size)
+			self.assertNotIn(OWN_ADDR, self.view.entries)
+			# only entries that were sent make room
+			dropped = set(before) - set(self.view.entries)
+			self.assertLessEqual(dropped, {a for a, _ in sent})
+
+
+if __name__ == '__main__':
+	unittest.main()
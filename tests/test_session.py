@@ -0,0 +1,97 @@
+import unittest
+from unittest import mock
+
+from p2p_messenger.config import Config
+from p2p_messenger.node import Node
+from p2p_messenger.node.session import PostSession
+from p2p_messenger.protocol import Message, types
+
+
+class FakePeer:
+	def __init__(self):
+		self.addr = ('10.0.0.1', 1337)
+		self.sent = []
+		self.disconnected = False
+
+	def send(self, msg: Message):
+		self.sent.append(msg)
+
+	def disconnect(self):
+		self.disconnected = True
+
+
+def post() -> Message:
+	return Message(types.MsgType.POST, ('10.0.0.2', 1337), payload=b'hello')
+
+
+class PostSessionTest(unittest.TestCase):
+	def setUp(self):
+		self.now = 100.0
+		for name in ('p2p_messenger.node.session.monotonic', 'p2p_messenger.node.node.monotonic'):
+			patcher = mock.patch(name, lambda: self.now)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		for name, value in [('post_window', 2), ('post_backlog', 2), ('post_ack_timeout', 5)]:
+			patcher = mock.patch.object(Config, name, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		self.peer = FakePeer()
+		self.session = PostSession(self.peer)
+
+	def test_full_window_queues_posts_in_backlog(self):
+		messages = [post() for _ in range(3)]
+		futures = [self.session.post(msg) for msg in messages]
+		self.assertEqual(self.peer.sent, messages[:2])
+		self.assertEqual(len(self.session.backlog), 1)
+		self.assertFalse(any(future.done() for future in futures))
+
+	def test_full_backlog_fails_posts(self):
+		futures = [self.session.post(post()) for _ in range(5)]
+		self.assertEqual([future.done() for future in futures], [False] * 4 + [True])
+		self.assertFalse(futures[4].result())
+
+	def test_ack_frees_the_window(self):
+		messages = [post() for _ in range(3)]
+		futures = [self.session.post(msg) for msg in messages]
+		self.assertTrue(self.session.ack(messages[0].get_id()))
+		self.assertTrue(futures[0].result())
+		self.assertEqual(self.peer.sent, messages)
+		self.assertEqual(len(self.session.backlog), 0)
+		self.assertEqual(list(self.session.unacked), [messages[1].get_id(), messages[2].get_id()])
+
+	def test_ack_of_unknown_post(self):
+		msg = post()
+		future = self.session.post(msg)
+		self.assertFalse(self.session.ack(b'\x00\x00\x00\x00'))
+		self.assertTrue(self.session.ack(msg.get_id()))
+		self.assertFalse(self.session.ack(msg.get_id()))
+		self.assertTrue(future.result())
+
+	def test_overdue_ack_expires_the_session(self):
+		self.session.post(post())
+		self.now += 4.9
+		self.assertFalse(self.session.expired(self.now))
+		self.now += 0.1
+		self.assertTrue(self.session.expired(self.now))
+
+	def test_close_fails_pending_posts(self):
+		futures = [self.session.post(post()) for _ in range(3)]
+		self.session.close()
+		self.assertEqual([future.result() for future in futures], [False] * 3)
+		self.assertTrue(self.peer.disconnected)
+		self.assertFalse(self.session.post(post()).result())
+
+	def test_sweep_fails_posts_after_ack_timeout(self):
+		node = Node(0, [], persist=False)
+		node.sessions['peer'] = self.session
+		futures = [self.session.post(post()) for _ in range(3)]
+		node.sweep_sessions()
+		self.assertIn('peer', node.sessions)
+		self.now += Config.post_ack_timeout
+		node.sweep_sessions()
+		self.assertNotIn('peer', node.sessions)
+		self.assertEqual([future.result(timeout=1) for future in futures], [False] * 3)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+
+from p2p_messenger.node.transfer import IncomingTransfer
+from p2p_messenger.protocol import stream
+
+TRANSFER_ID = bytes(range(8))
+
+
+class IncomingTransferTest(unittest.TestCase):
+	def setUp(self):
+		directory = tempfile.TemporaryDirectory()
+		self.addCleanup(directory.cleanup)
+		self.directory = directory.name
+
+	def receive(self, name: str = 'file.txt') -> IncomingTransfer:
+		incoming = IncomingTransfer(TRANSFER_ID, name, 4, self.directory)
+		self.addCleanup(incoming.close)
+		return incoming
+
+	def read(self, name: str) -> bytes:
+		with open(os.path.join(self.directory, name), 'rb') as f:
+			return f.read()
+
+	def test_chunks_are_assembled(self):
+		incoming = self.receive()
+		self.assertEqual(incoming.write(0, False, b'abcd'), 1)
+		self.assertEqual(incoming.write(1, True, b'ef'), 2)
+		self.assertTrue(incoming.done)
+		self.assertEqual(self.read('file.txt'), b'abcdef')
+		self.assertFalse(os.path.exists(incoming.part_path))
+
+	def test_out_of_order_chunk_is_dropped(self):
+		incoming = self.receive()
+		self.assertEqual(incoming.write(1, False, b'efgh'), 0)
+		self.assertEqual(incoming.write(0, False, b'abcd'), 1)
+		self.assertEqual(incoming.write(2, True, b'ij'), 1)
+		self.assertEqual(incoming.write(1, True, b'ef'), 2)
+		self.assertEqual(self.read('file.txt'), b'abcdef')
+
+	def test_duplicate_chunk_is_dropped(self):
+		incoming = self.receive()
+		incoming.write(0, False, b'abcd')
+		self.assertEqual(incoming.write(0, False, b'abcd'), 1)
+		incoming.write(1, True, b'ef')
+		self.assertEqual(incoming.write(1, True, b'ef'), 2)
+		self.assertEqual(self.read('file.txt'), b'abcdef')
+
+	def test_resumes_from_partial_file(self):
+		incoming = self.receive()
+		incoming.write(0, False, b'abcd')
+		incoming.write(1, False, b'efgh')
+		incoming.close()
+		resumed = self.receive()
+		self.assertEqual(resumed.next_seq, 2)
+		resumed.write(2, True, b'ij')
+		self.assertEqual(self.read('file.txt'), b'abcdefghij')
+
+	def test_torn_chunk_is_dropped_when_resuming(self):
+		incoming = self.receive()
+		with open(incoming.part_path, 'ab') as f:
+			f.write(b'abcdef')
+		incoming.close()
+		resumed = self.receive()
+		self.assertEqual(resumed.next_seq, 1)
+		self.assertEqual(os.path.getsize(resumed.part_path), 4)
+
+	def test_existing_file_is_not_overwritten(self):
+		with open(os.path.join(self.directory, 'file.txt'), 'wb') as f:
+			f.write(b'mine')
+		with open(os.path.join(self.directory, 'file (1).txt'), 'wb') as f:
+			f.write(b'mine too')
+		incoming = self.receive()
+		incoming.write(0, True, b'new')
+		self.assertEqual(incoming.path, os.path.join(self.directory, 'file (2).txt'))
+		self.assertEqual(self.read('file.txt'), b'mine')
+		self.assertEqual(self.read('file (1).txt'), b'mine too')
+		self.assertEqual(self.read('file (2).txt'), b'new')
+
+
+class StreamLayoutTest(unittest.TestCase):
+	def test_offer(self):
+		payload = stream.pack_offer(TRANSFER_ID, 32768, 'peer', 'file.txt')
+		self.assertEqual(payload, TRANSFER_ID + b'\x00\x00\x80\x00' + b'\x00\x04' + b'peer' + b'file.txt')
+		self.assertEqual(stream.unpack_offer(memoryview(payload)), (TRANSFER_ID, 32768, 'peer', 'file.txt'))
+
+	def test_chunk(self):
+		payload = stream.pack_chunk(TRANSFER_ID, 258, True, b'data')
+		self.assertEqual(payload, TRANSFER_ID + b'\x00\x00\x01\x02' + b'\x01' + b'data')
+		transfer_id, seq, last, data = stream.unpack_chunk(payload)
+		self.assertEqual((transfer_id, seq, last, bytes(data)), (TRANSFER_ID, 258, True, b'data'))
+		self.assertFalse(stream.unpack_chunk(stream.pack_chunk(TRANSFER_ID, 0, False, b''))[2])
+
+	def test_ack(self):
+		payload = stream.pack_ack(TRANSFER_ID, 7)
+		self.assertEqual(payload, TRANSFER_ID + b'\x00\x00\x00\x07')
+		# accepted codecs follow the fixed part
+		self.assertEqual(stream.unpack_ack(payload + b'\x01'), (TRANSFER_ID, 7))
+
+	def test_largest_chunk_fits_a_frame(self):
+		self.assertEqual(len(stream.pack_chunk(TRANSFER_ID, 0, True, bytes(stream.MAX_CHUNK_SIZE))), 0xFFFF)
+
+
+if __name__ == '__main__':
+	unittest.main()